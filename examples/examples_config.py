@@ -19,6 +19,7 @@ FOLDER_CONFIG = "config"
 #       examples_voxel/anisotropic
 #       examples_voxel/distributed
 #       examples_voxel/logo
+#       examples_voxel/symmetry
 #   examples_shape
 #       examples_shape/coplanar
 #       examples_shape/parallel
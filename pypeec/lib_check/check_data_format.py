@@ -6,6 +6,10 @@ Module for the checking the data format:
     - Check the viewer data (for the viewer).
     - Check the plotter data (for the plotter).
 
+The optional entries of the problem and tolerance data are completed:
+    - The default values are defined in the JSON schemas ("default" keyword).
+    - The missing entries are added (the provided data are not modified).
+
 Warning
 -------
     - The JSON schemas will detect 99% of the problems.
@@ -16,6 +20,7 @@ __author__ = "Thomas Guillod"
 __copyright__ = "Thomas Guillod - Dartmouth College"
 __license__ = "Mozilla Public License Version 2.0"
 
+import copy
 import importlib.resources
 import scisave
 
@@ -30,6 +35,37 @@ SCHEMA_VIEWER = scisave.load_config(folder.joinpath("schema_list_viewer.yaml"))
 SCHEMA_PLOTTER = scisave.load_config(folder.joinpath("schema_list_plotter.yaml"))
 
 
+def _get_default(data, schema):
+    """
+    Add the missing entries with the default values of the schema (recursive function).
+    The containers are recreated (the provided data are not modified).
+    """
+
+    if isinstance(data, dict):
+        # extract the schema
+        properties = schema.get("properties", {})
+        additional = schema.get("additionalProperties", {})
+
+        # add the default values
+        data = dict(data)
+        for tag, schema_tmp in properties.items():
+            if (tag not in data) and ("default" in schema_tmp):
+                data[tag] = copy.deepcopy(schema_tmp["default"])
+
+        # complete the entries
+        for tag, val in data.items():
+            if tag in properties:
+                data[tag] = _get_default(val, properties[tag])
+            elif isinstance(additional, dict):
+                data[tag] = _get_default(val, additional)
+    elif isinstance(data, list):
+        # complete the items
+        items = schema.get("items", {})
+        data = [_get_default(val, items) for val in data]
+
+    return data
+
+
 def check_data_geometry(data_geometry):
     """
     Check the mesher geometry data.
@@ -41,17 +77,25 @@ def check_data_geometry(data_geometry):
 def check_data_problem(data_problem):
     """
     Check the solver problem data.
+    The problem data with the default values are returned.
     """
 
     scisave.validate_schema(data_problem, SCHEMA_PROBLEM)
+    data_problem = _get_default(data_problem, SCHEMA_PROBLEM)
+
+    return data_problem
 
 
 def check_data_tolerance(data_tolerance):
     """
     Check the solver tolerance data.
+    The tolerance data with the default values are returned.
     """
 
     scisave.validate_schema(data_tolerance, SCHEMA_TOLERANCE)
+    data_tolerance = _get_default(data_tolerance, SCHEMA_TOLERANCE)
+
+    return data_tolerance
 
 
 def check_data_viewer(data_viewer):
@@ -0,0 +1,141 @@
+"""
+Module for caching the results of expensive matrix computations.
+
+The cache is used to share results between solver sweeps with identical inputs:
+    - The inputs are identified with a hash of the provided data (see pypeec.utils.hashing).
+    - The hash is computed with the content of arrays and sparse matrices.
+    - The cache is stored in a global variable (one cache per process).
+    - The entries are stored in separate namespaces (given by the tag of the key).
+    - The cache accesses are protected by a lock (concurrent factorizations).
+
+The memory consumption of the cache is bounded (separately for each namespace):
+    - The number of cached entries is limited.
+    - The estimated memory footprint of the cached entries is limited.
+    - The least recently used entries are evicted first.
+"""
+
+__author__ = "Thomas Guillod"
+__copyright__ = "Thomas Guillod - Dartmouth College"
+__license__ = "Mozilla Public License Version 2.0"
+
+import threading
+import collections
+import scilogger
+import numpy as np
+import scipy.sparse as sps
+
+# get a logger
+LOGGER = scilogger.get_logger(__name__, "pypeec")
+
+# global cache (one per process, one namespace per tag)
+CACHE = {}
+
+# lock protecting the cache (thread pool)
+LOCK = threading.Lock()
+
+
+def get_footprint(data):
+    """
+    Get the memory footprint (in bytes) of the provided data (recursive function).
+    The data can contain arrays, sparse matrices, lists, and dicts.
+    """
+
+    if isinstance(data, dict):
+        footprint = sum(get_footprint(data_tmp) for data_tmp in data.values())
+    elif isinstance(data, (list, tuple)):
+        footprint = sum(get_footprint(data_tmp) for data_tmp in data)
+    elif sps.issparse(data):
+        data = data.tocsc()
+        footprint = data.data.nbytes + data.indices.nbytes + data.indptr.nbytes
+    elif isinstance(data, np.ndarray):
+        footprint = data.nbytes
+    else:
+        footprint = 0
+
+    return footprint
+
+
+def _get_evict(namespace, n_max, size_max):
+    """
+    Remove the least recently used entries until the namespace is within the bounds.
+    """
+
+    # get the memory footprint of the namespace
+    size = sum(footprint for (_, footprint) in namespace.values())
+
+    # remove the oldest entries
+    while (len(namespace) > n_max) or (size > size_max):
+        (_, (_, footprint)) = namespace.popitem(last=False)
+        size -= footprint
+
+
+def get_cache(key, cache_options):
+    """
+    Get an entry from the cache (None if the entry is not found).
+    """
+
+    # extract the options
+    cache = cache_options["cache"]
+
+    # check if the cache is used
+    if not cache:
+        return None
+
+    # get the namespace
+    (tag, _) = key
+
+    # find the entry and mark the entry as recently used
+    with LOCK:
+        namespace = CACHE.get(tag, {})
+        if key in namespace:
+            namespace.move_to_end(key)
+            (value, footprint) = namespace[key]
+        else:
+            (value, footprint) = (None, None)
+
+    # check if the data is cached
+    if footprint is None:
+        LOGGER.debug("cache / %s / miss", tag)
+        return None
+
+    # display
+    LOGGER.debug("cache / %s / hit", tag)
+
+    return value
+
+
+def set_cache(key, value, footprint, cache_options):
+    """
+    Add an entry to the cache.
+    The memory footprint (in bytes) of the retained data should be provided.
+    """
+
+    # extract the options
+    cache = cache_options["cache"]
+    n_max = cache_options["n_max"]
+    size_max = cache_options["size_max"]
+
+    # check if the cache is used
+    if not cache:
+        return
+
+    # get the memory bound (in bytes)
+    size_max = size_max * (1024**2)
+
+    # get the namespace
+    (tag, _) = key
+
+    # display the footprint
+    LOGGER.debug("cache / %s / footprint = %.2f MB", tag, footprint / (1024**2))
+
+    # entries exceeding the memory bound are not cached
+    if footprint > size_max:
+        LOGGER.debug("cache / %s / skip", tag)
+        return
+
+    # add the entry and evict the old entries
+    with LOCK:
+        namespace = CACHE.setdefault(tag, collections.OrderedDict())
+        namespace[key] = (value, footprint)
+        namespace.move_to_end(key)
+        _get_evict(namespace, n_max, size_max)
@@ -1,5 +1,11 @@
 """
 Module for estimating the condition number of sparse matrices.
+
+The norm of the inverse is estimated with an inverse operator:
+    - If available, the existing factorization of the matrix is reused.
+    - Otherwise, the matrix is factorized with SuperLU.
+
+The condition numbers are cached (one cache per process).
 """
 
 __author__ = "Thomas Guillod"
@@ -9,25 +15,34 @@ __license__ = "Mozilla Public License Version 2.0"
 import scilogger
 import numpy as np
 import scipy.sparse.linalg as sla
+from pypeec.lib_matrix import matrix_cache
+from pypeec.utils import hashing
 
 # get a logger
 LOGGER = scilogger.get_logger(__name__, "pypeec")
 
 
-def _get_inverse_operator(mat, decomposition):
+def _get_inverse_operator(mat, fct_inv):
     """
-    Get an inverse operator (with LU decomposition) for the provided matrix and the Hermitian matrix.
+    Get an inverse operator for the provided matrix and the Hermitian matrix.
+    If the solvers are not provided, the matrix is factorized with SuperLU.
     """
 
-    # get the function for the linear operator (original matrix)
-    def fct_matvec(rhs):
-        sol = decomposition.solve(rhs, trans="N")
-        return sol
+    # get the solvers for the matrix and the Hermitian matrix
+    if fct_inv is None:
+        LOGGER.debug("compute LU decomposition")
+        decomposition = sla.splu(mat)
 
-    # get the function for the linear operator (transposed matrix)
-    def fct_rmatvec(rhs):
-        sol = decomposition.solve(rhs, trans="H")
-        return sol
+        def fct_matvec(rhs):
+            sol = decomposition.solve(rhs, trans="N")
+            return sol
+
+        def fct_rmatvec(rhs):
+            sol = decomposition.solve(rhs, trans="H")
+            return sol
+    else:
+        LOGGER.debug("reuse the factorization")
+        (fct_matvec, fct_rmatvec) = fct_inv
 
     # assign linear operator for inversion
     op = sla.LinearOperator(mat.shape, matvec=fct_matvec, rmatvec=fct_rmatvec, dtype=np.complex128)
@@ -35,9 +50,10 @@ def _get_inverse_operator(mat, decomposition):
     return op
 
 
-def get_condition_matrix(mat, norm_options):
+def get_condition_matrix(mat, fct_inv, norm_options, cache_options):
     """
     Compute an estimate of the condition number (norm 1) of a sparse matrix.
+    The solvers for the matrix and the Hermitian matrix are optional (None).
     """
 
     # check shape
@@ -56,12 +72,18 @@ def get_condition_matrix(mat, norm_options):
     if (nx, ny) == (0, 0):
         return 0.0
 
-    # get LU decomposition
-    LOGGER.debug("compute LU decomposition")
-    decomposition = sla.splu(mat)
+    # reuse a cached condition number (if available)
+    #   - the cache key is computed with the matrix and the norm options
+    #   - the key is only computed if the cache is used (hashing the matrix is expensive)
+    cache = cache_options["cache"]
+    if cache:
+        key = hashing.get_key("condition", [mat, norm_options])
+        cond = matrix_cache.get_cache(key, cache_options)
+        if cond is not None:
+            return cond
 
     # get the inverse operator
-    op = _get_inverse_operator(mat, decomposition)
+    op = _get_inverse_operator(mat, fct_inv)
 
     # compute the norm of the matrix inverse (estimate)
     LOGGER.debug("estimate norm of the inverse")
@@ -75,4 +97,8 @@ def get_condition_matrix(mat, norm_options):
     LOGGER.debug("compute condition estimate")
     cond = nrm_ori * nrm_inv
 
+    # add the condition number to the cache (negligible memory footprint)
+    if cache:
+        matrix_cache.set_cache(key, cond, 0, cache_options)
+
     return cond
@@ -9,6 +9,18 @@ This module is used as a common interface for different matrix solvers:
 
 This module is only importing the required matrix solver.
 This means that the unused matrix solvers are not required.
+
+For exact factorizations (SuperLU and PARDISO), solvers for the Hermitian matrix are provided.
+These solvers are used to estimate the condition number without a new factorization.
+
+The factorizations are cached (one cache per process):
+    - Sweeps with identical preconditioner matrices share the factorization.
+    - The memory footprint of the cache is bounded (estimated with the factors, including fill-in).
+
+The factorizations can be computed concurrently (thread pool):
+    - The PARDISO/MKL thread settings are process-global.
+    - Therefore, concurrent factorizations are not supported for PARDISO.
+    - PARDISO is multithreaded, the factorizations are computed sequentially.
 """
 
 __author__ = "Thomas Guillod"
@@ -20,10 +32,33 @@ import warnings
 import scilogger
 import numpy as np
 import scipy.sparse as sps
+from pypeec.lib_matrix import matrix_cache
+from pypeec.utils import hashing
 
 # get a logger
 LOGGER = scilogger.get_logger(__name__, "pypeec")
 
+# memory footprint of a non-zero element of the factors (complex value and index)
+ITEMSIZE = np.dtype(np.complex128).itemsize + np.dtype(np.int64).itemsize
+
+
+def _get_thread(n_thread):
+    """
+    Find the number of threads (negative values are counted from the number of cores).
+    """
+
+    # keep the default value
+    if n_thread is None:
+        return None
+
+    # find the number of threads
+    if n_thread < 0:
+        n_thread = os.cpu_count() + n_thread + 1
+    if n_thread <= 0:
+        n_thread = 1
+
+    return n_thread
+
 
 def _get_fact_superlu(mat):
     """
@@ -46,7 +81,15 @@ def _get_fact_superlu(mat):
         sol = mat_factor.solve(rhs)
         return sol
 
-    return factor
+    # matrix solver (Hermitian matrix)
+    def factor_adjoint(rhs):
+        sol = mat_factor.solve(rhs, trans="H")
+        return sol
+
+    # memory footprint of the factors (L and U)
+    footprint = ITEMSIZE * mat_factor.nnz
+
+    return factor, factor_adjoint, footprint
 
 
 def _get_fact_pardiso(pardiso_options, mat):
@@ -64,16 +107,10 @@ def _get_fact_pardiso(pardiso_options, mat):
     thread_mkl = pardiso_options["thread_mkl"]
 
     # find the number of threads
-    if thread_pardiso < 0:
-        thread_pardiso = os.cpu_count() + thread_pardiso + 1
-    if thread_mkl < 0:
-        thread_mkl = os.cpu_count() + thread_mkl + 1
-    if thread_pardiso == 0:
-        thread_pardiso = 1
-    if thread_mkl == 0:
-        thread_mkl = 1
-
-    # set number of threads
+    thread_pardiso = _get_thread(thread_pardiso)
+    thread_mkl = _get_thread(thread_mkl)
+
+    # set number of threads (process-global settings)
     if thread_pardiso is not None:
         lib.set_mkl_pardiso_threads(thread_pardiso)
     if thread_mkl is not None:
@@ -91,7 +128,15 @@ def _get_fact_pardiso(pardiso_options, mat):
         sol = mat_factor.solve(rhs)
         return sol
 
-    return factor
+    # matrix solver (Hermitian matrix)
+    def factor_adjoint(rhs):
+        sol = np.conj(mat_factor.solve(np.conj(rhs), transpose=True))
+        return sol
+
+    # memory footprint of the factors (reported by PARDISO in iparm(18))
+    footprint = ITEMSIZE * abs(mat_factor.get_iparm(17))
+
+    return factor, factor_adjoint, footprint
 
 
 def _get_fact_pyamg(pyamg_options, mat):
@@ -126,7 +171,13 @@ def _get_fact_pyamg(pyamg_options, mat):
         sol = solver.solve(rhs, tol=tol, accel=krylov)
         return sol
 
-    return factor
+    # memory footprint of the multigrid hierarchy (operators of the levels)
+    footprint = 0
+    for level in solver.levels:
+        for name in ["A", "P", "R"]:
+            footprint += matrix_cache.get_footprint(getattr(level, name, None))
+
+    return factor, None, footprint
 
 
 def _get_fact_dummy():
@@ -137,12 +188,15 @@ def _get_fact_dummy():
     def factor(rhs):
         return rhs
 
-    return factor
+    return factor, None, 0
 
 
 def _get_factorize_sub(mat, library, pyamg_options, pardiso_options):
     """
     Factorize a sparse matrix (main function).
+    For exact factorizations, a solver for the Hermitian matrix is also returned.
+    For approximate factorizations, the Hermitian solver is None.
+    The memory footprint (in bytes) of the factorization is also returned.
     """
 
     # check shape
@@ -160,20 +214,35 @@ def _get_factorize_sub(mat, library, pyamg_options, pardiso_options):
     # factorize the matrix
     LOGGER.debug("compute factorization")
     if library == "SuperLU":
-        fct = _get_fact_superlu(mat)
+        (fct, fct_adj, footprint) = _get_fact_superlu(mat)
     elif library == "PARDISO":
-        fct = _get_fact_pardiso(pardiso_options, mat)
+        (fct, fct_adj, footprint) = _get_fact_pardiso(pardiso_options, mat)
     elif library == "PyAMG":
-        fct = _get_fact_pyamg(pyamg_options, mat)
+        (fct, fct_adj, footprint) = _get_fact_pyamg(pyamg_options, mat)
     elif library == "Identity":
-        fct = _get_fact_dummy()
+        (fct, fct_adj, footprint) = _get_fact_dummy()
     else:
         raise ValueError("invalid factorization library")
 
     # display the status
     LOGGER.debug("factorization success")
+    LOGGER.debug("factorization / footprint = %.2f MB", footprint / (1024**2))
 
-    return fct
+    return fct, fct_adj, footprint
+
+
+def _get_schur_check(mat_11):
+    """
+    Check if the Schur complement can be used (diagonal matrix).
+    """
+
+    # get the off-diagonal elements
+    mat_off = mat_11 - sps.diags(mat_11.diagonal(), format="csc")
+
+    # check that the matrix is diagonal
+    is_diag = mat_off.count_nonzero() == 0
+
+    return is_diag
 
 
 def _get_schur_extract(mat_11, mat_22, mat_12, mat_21):
@@ -216,6 +285,11 @@ def _get_schur_solve(fct_fact, mat_diag, mat_12, mat_21):
 def get_factorize(mat, factorization_options):
     """
     Factorize a sparse matrix (with or without Schur complement).
+
+    The following data are returned:
+        - A solver for the complete matrix (with or without Schur complement).
+        - The factorized matrix (complete matrix or Schur complement).
+        - Solvers for the factorized matrix and its Hermitian (None if not exact).
     """
 
     # extract the data
@@ -229,14 +303,43 @@ def get_factorize(mat, factorization_options):
     library = factorization_options["library"]
     pyamg_options = factorization_options["pyamg_options"]
     pardiso_options = factorization_options["pardiso_options"]
+    cache_options = factorization_options["cache_options"]
+
+    # reuse a cached factorization (if available)
+    #   - the cache key is computed with the matrices and the factorization options
+    #   - the key is only computed if the cache is used (hashing the matrices is expensive)
+    cache = cache_options["cache"]
+    if cache:
+        key = hashing.get_key("factorization", [mat, schur, library, pyamg_options, pardiso_options])
+        value = matrix_cache.get_cache(key, cache_options)
+        if value is not None:
+            return value
+
+    # the Schur complement is only available for diagonal matrices
+    if schur and (not _get_schur_check(mat_11)):
+        LOGGER.debug("Schur complement / disabled / non-diagonal matrix")
+        schur = False
 
     # factorize the matrix
     if schur:
         (mat_fact, mat_diag) = _get_schur_extract(mat_11, mat_22, mat_12, mat_21)
-        fct_fact = _get_factorize_sub(mat_fact, library, pyamg_options, pardiso_options)
+        (fct_fact, fct_adj, footprint) = _get_factorize_sub(mat_fact, library, pyamg_options, pardiso_options)
         fct_sol = _get_schur_solve(fct_fact, mat_diag, mat_12, mat_21)
     else:
         mat_fact = sps.bmat([[mat_11, mat_12], [mat_21, mat_22]], format="csc")
-        fct_sol = _get_factorize_sub(mat_fact, library, pyamg_options, pardiso_options)
+        (fct_fact, fct_adj, footprint) = _get_factorize_sub(mat_fact, library, pyamg_options, pardiso_options)
+        fct_sol = fct_fact
+
+    # get the solvers for the factorized matrix (only for exact factorizations)
+    if fct_adj is None:
+        fct_inv = None
+    else:
+        fct_inv = (fct_fact, fct_adj)
+
+    # add the factorization to the cache
+    #   - the factors, the factorized matrix, and the input matrices are retained
+    if cache:
+        footprint += matrix_cache.get_footprint([mat, mat_fact])
+        matrix_cache.set_cache(key, (fct_sol, mat_fact, fct_inv), footprint, cache_options)
 
-    return fct_sol, mat_fact
+    return fct_sol, mat_fact, fct_inv
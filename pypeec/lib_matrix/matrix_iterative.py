@@ -1,18 +1,187 @@
 """
-Module for solving a dense equation system with GMRES or GCROT.
+Module for solving a dense equation system with GMRES, GCROT, or FGMRES.
+
+The GMRES and GCROT solvers are provided by SciPy.
+The FGMRES solver is implemented in this module:
+    - Restarted flexible GMRES with right preconditioning.
+    - The Krylov basis is preallocated and limited by a memory budget.
+    - The residuum is obtained from the Givens rotations (no matrix-vector multiplication).
+    - The solution is only reconstructed for the callback (every N iterations).
 """
 
 __author__ = "Thomas Guillod"
 __copyright__ = "Thomas Guillod - Dartmouth College"
 __license__ = "Mozilla Public License Version 2.0"
 
+import numpy as np
+import scipy.linalg as lna
 import scipy.sparse.linalg as sla
 
 
+def _get_givens(val_a, val_b):
+    """
+    Get a complex Givens rotation eliminating the second value.
+    """
+
+    # get the norm
+    val_abs = np.abs(val_a)
+    val_norm = np.hypot(val_abs, np.abs(val_b))
+
+    # get the rotation
+    if val_norm == 0:
+        cs = 1.0
+        sn = 0.0
+    elif val_abs == 0:
+        cs = 0.0
+        sn = 1.0
+    else:
+        cs = val_abs / val_norm
+        sn = (val_a / val_abs) * np.conj(val_b) / val_norm
+
+    return cs, sn
+
+
+def _get_restart(n_dof, n_inner, size_max):
+    """
+    Get the restart length of the FGMRES solver with respect to the memory budget.
+    Two vectors are stored per iteration (Krylov and preconditioned vectors).
+    """
+
+    # check if the memory budget is used
+    if size_max is None:
+        return max(1, n_inner)
+
+    # get the memory footprint of a vector
+    size_vec = n_dof * np.dtype(np.complex128).itemsize
+    size_max = size_max * (1024**2)
+
+    # get the maximum number of iterations
+    n_mem = int(np.floor((size_max / max(1, size_vec) - 1) / 2))
+
+    # get the restart length
+    n_restart = max(1, min(n_inner, n_mem))
+
+    return n_restart
+
+
+def _get_solve_fgmres(sol_init, op_sys, op_pcd, rhs, fct_callback, iter_options):
+    """
+    Solve a dense equation system with a restarted flexible GMRES.
+    The preconditioner is applied on the right (and may vary between iterations).
+    """
+
+    # get the options
+    rel_tol = iter_options["rel_tol"]
+    abs_tol = iter_options["abs_tol"]
+    n_inner = iter_options["n_inner"]
+    n_outer = iter_options["n_outer"]
+    n_callback = iter_options["n_callback"]
+    size_max = iter_options["size_max"]
+
+    # get the problem size and the restart length
+    n_dof = len(rhs)
+    n_restart = _get_restart(n_dof, n_inner, size_max)
+
+    # preallocate the Krylov basis and the preconditioned vectors
+    V = np.empty((n_restart + 1, n_dof), dtype=np.complex128)
+    Z = np.empty((n_restart, n_dof), dtype=np.complex128)
+
+    # preallocate the Hessenberg matrix and the Givens rotations
+    H = np.zeros((n_restart + 1, n_restart), dtype=np.complex128)
+    g = np.zeros(n_restart + 1, dtype=np.complex128)
+    cs = np.zeros(n_restart, dtype=np.float64)
+    sn = np.zeros(n_restart, dtype=np.complex128)
+
+    # get the residuum threshold
+    res_thr = np.maximum(rel_tol * lna.norm(rhs), abs_tol)
+
+    # init the solution
+    sol = np.array(sol_init, dtype=np.complex128)
+    n_iter = 0
+
+    for _ in range(n_outer):
+        # get the residuum
+        res = rhs - op_sys(sol)
+        beta = lna.norm(res)
+
+        # check for convergence
+        if beta <= res_thr:
+            return True, sol
+
+        # init the Krylov basis
+        V[0] = res / beta
+        H[:] = 0
+        g[:] = 0
+        g[0] = beta
+
+        # run the Arnoldi process
+        for j in range(n_restart):
+            # apply the preconditioner and the system
+            Z[j] = op_pcd(V[j])
+            w = op_sys(Z[j])
+
+            # orthogonalize with modified Gram-Schmidt
+            for i in range(j + 1):
+                H[i, j] = np.vdot(V[i], w)
+                w -= H[i, j] * V[i]
+            H[j + 1, j] = lna.norm(w)
+
+            # check for breakdown (invariant subspace)
+            breakdown = H[j + 1, j] == 0
+            if not breakdown:
+                V[j + 1] = w / H[j + 1, j]
+
+            # apply the previous Givens rotations
+            for i in range(j):
+                tmp = cs[i] * H[i, j] + sn[i] * H[i + 1, j]
+                H[i + 1, j] = -np.conj(sn[i]) * H[i, j] + cs[i] * H[i + 1, j]
+                H[i, j] = tmp
+
+            # apply the new Givens rotation
+            (cs[j], sn[j]) = _get_givens(H[j, j], H[j + 1, j])
+            H[j, j] = cs[j] * H[j, j] + sn[j] * H[j + 1, j]
+            H[j + 1, j] = 0
+            g[j + 1] = -np.conj(sn[j]) * g[j]
+            g[j] = cs[j] * g[j]
+
+            # get the residuum estimate
+            n_iter += 1
+            converged = np.abs(g[j + 1]) <= res_thr
+
+            # check if the Arnoldi process is finished
+            finished = converged or breakdown or (j == n_restart - 1)
+
+            # get the update (if required)
+            if finished or ((fct_callback is not None) and (n_iter % n_callback == 0)):
+                y = lna.solve_triangular(H[: j + 1, : j + 1], g[: j + 1])
+                sol_tmp = sol + Z[: j + 1].transpose() @ y
+            else:
+                sol_tmp = None
+
+            # call the callback (with the residuum estimate of the Givens rotations)
+            if (fct_callback is not None) and (n_iter % n_callback == 0):
+                fct_callback(sol_tmp, np.abs(g[j + 1]))
+
+            # update the solution
+            if finished:
+                sol = sol_tmp
+                break
+
+        # check for convergence
+        if converged:
+            return True, sol
+
+    return False, sol
+
+
 def get_solve(sol_init, op_sys, op_pcd, rhs, fct_callback, iter_options):
     """
     Solve a sparse equation system with GMRES or GCROT (main function).
     The equation system and the preconditioner are described with linear operator.
+
+    The callback is called with the solution and the residuum estimate:
+        - For FGMRES, the residuum estimate is obtained from the Givens rotations.
+        - For GMRES and GCROT (SciPy), the residuum estimate is not available (None).
     """
 
     # get the options
@@ -22,6 +191,14 @@ def get_solve(sol_init, op_sys, op_pcd, rhs, fct_callback, iter_options):
     n_inner = iter_options["n_inner"]
     n_outer = iter_options["n_outer"]
 
+    # get the callback for the SciPy solvers (without residuum estimate)
+    if fct_callback is None:
+        fct_callback_x = None
+    else:
+
+        def fct_callback_x(sol_tmp):
+            fct_callback(sol_tmp, None)
+
     # call the solver
     if solver == "gmres":
         (sol, flag) = sla.gmres(
@@ -33,7 +210,7 @@ def get_solve(sol_init, op_sys, op_pcd, rhs, fct_callback, iter_options):
             atol=abs_tol,
             restart=n_inner,
             maxiter=n_outer,
-            callback=fct_callback,
+            callback=fct_callback_x,
             callback_type="x",
         )
     elif solver == "gcrot":
@@ -46,8 +223,18 @@ def get_solve(sol_init, op_sys, op_pcd, rhs, fct_callback, iter_options):
             atol=abs_tol,
             m=n_inner,
             maxiter=n_outer,
-            callback=fct_callback,
+            callback=fct_callback_x,
+        )
+    elif solver == "fgmres":
+        (status, sol) = _get_solve_fgmres(
+            sol_init,
+            op_sys,
+            op_pcd,
+            rhs,
+            fct_callback,
+            iter_options,
         )
+        flag = 0 if status else 1
     else:
         raise ValueError("invalid matrix solver")
 
@@ -3,7 +3,7 @@ Module for doing matrix-vector multiplication:
     - Using standard matrix multiplication.
     - Using circulant tensors and FFTs.
 
-Three different types of matrices are supported:
+Four different types of matrices are supported:
     - Tensor representing a simple potential matrix.
         - Size of the last dimension of the input tensor: 1.
         - Number of dimensions of the input vector: 1.
@@ -16,10 +16,22 @@ Three different types of matrices are supported:
         - Size of the last dimension of the input tensor: 3.
         - Number of dimensions of the input vector: 3.
         - Number of dimensions of the output vector: 3.
+    - Tensor representing a block column gradient matrix.
+        - Size of the last dimension of the input tensor: 3.
+        - Number of dimensions of the input vector: 1.
+        - Number of dimensions of the output vector: 3.
+
+For problems with symmetry planes, image tensors can be added to the matrix:
+    - The image tensors describe the coupling with the mirrored elements.
+    - The signs of the mirrored input elements are given with the image tensors.
 
 A matrix-vector operator is returned for performing the matrix-vector multiplication:
     - For standard multiplication, the full matrix is constructed and stored.
     - For FFT multiplication, the full matrix is never constructed nor stored.
+
+For FFT multiplication, the voxel structure can be decomposed into dense sub-boxes:
+    - The FFT convolutions are computed between the pairs of sub-boxes.
+    - This reduces the FFT volume for sparse geometries (thin shells, separated layers).
 """
 
 __author__ = "Thomas Guillod"
@@ -51,7 +63,7 @@ def _get_multiply(data, vec_in, dense_options, flip):
     return res_out
 
 
-def _get_prepare(name, idx_out, idx_in, mat, dense_options):
+def _get_prepare(name, idx_out, idx_in, mat, img, dense_options):
     """
     Prepare the matrix for the multiplication.
     """
@@ -59,26 +71,27 @@ def _get_prepare(name, idx_out, idx_in, mat, dense_options):
     # extract the data
     split = dense_options["split"]
     method = dense_options["method"]
+    box_options = dense_options["box_options"]
     fft_options = dense_options["fft_options"]
 
     # prepare the matrix
     if method == "fft":
-        data = multiply_fft.get_prepare(name, idx_out, idx_in, mat, split, fft_options)
+        data = multiply_fft.get_prepare(name, idx_out, idx_in, mat, img, split, box_options, fft_options)
     elif method == "dense":
-        data = multiply_dense.get_prepare(name, idx_out, idx_in, mat)
+        data = multiply_dense.get_prepare(name, idx_out, idx_in, mat, img)
     else:
         raise ValueError("invalid multiplication library")
 
     return data
 
 
-def get_operator_potential(idx, mat, dense_options):
+def get_operator_potential(idx, mat, img, dense_options):
     """
     Get the linear matrix-vector operator for a simple potential matrix.
     """
 
     # prepare the matrix
-    data = _get_prepare("potential", idx, idx, mat, dense_options)
+    data = _get_prepare("potential", idx, idx, mat, img, dense_options)
 
     # function describing the matrix-vector multiplication
     def op(vec_in):
@@ -88,13 +101,13 @@ def get_operator_potential(idx, mat, dense_options):
     return op
 
 
-def get_operator_inductance(idx, mat, dense_options):
+def get_operator_inductance(idx, mat, img, dense_options):
     """
     Get the linear matrix-vector operator for a block diagonal inductance matrix.
     """
 
     # prepare the matrix
-    data = _get_prepare("inductance", idx, idx, mat, dense_options)
+    data = _get_prepare("inductance", idx, idx, mat, img, dense_options)
 
     # function describing the matrix-vector multiplication
     def op(vec_in):
@@ -104,13 +117,13 @@ def get_operator_inductance(idx, mat, dense_options):
     return op
 
 
-def get_operator_coupling(idx_out, idx_in, mat, dense_options):
+def get_operator_coupling(idx_out, idx_in, mat, img, dense_options):
     """
     Get the linear matrix-vector operator for a block off-diagonal coupling matrix.
     """
 
     # prepare the matrix
-    data = _get_prepare("coupling", idx_out, idx_in, mat, dense_options)
+    data = _get_prepare("coupling", idx_out, idx_in, mat, img, dense_options)
 
     # function describing the matrix-vector multiplication
     def op_for(vec_in):
@@ -123,3 +136,19 @@ def get_operator_coupling(idx_out, idx_in, mat, dense_options):
         return res_out
 
     return op_for, op_rev
+
+
+def get_operator_gradient(idx_out, idx_in, mat, img, dense_options):
+    """
+    Get the linear matrix-vector operator for a block column gradient matrix.
+    """
+
+    # prepare the matrix
+    data = _get_prepare("gradient", idx_out, idx_in, mat, img, dense_options)
+
+    # function describing the matrix-vector multiplication
+    def op(vec_in):
+        res_out = _get_multiply(data, vec_in, dense_options, False)
+        return res_out
+
+    return op
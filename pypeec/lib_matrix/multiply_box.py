@@ -0,0 +1,197 @@
+"""
+Module for decomposing a voxel structure into dense sub-boxes (used for the FFT multiplication).
+
+For sparse geometries, the bounding box of the voxel structure is mostly empty:
+    - The occupied voxels are split into several dense sub-boxes.
+    - The FFT convolutions are computed between the pairs of sub-boxes.
+    - The FFT size of a pair is given by the sum of the sizes of the sub-boxes.
+
+The sub-boxes are obtained with a recursive bisection:
+    - The sub-boxes are shrunk to the bounding box of the occupied voxels.
+    - The sub-boxes are split at the largest gap (empty planes) or at the middle.
+    - The splitting stops if the fill ratio or the volume of the sub-box is sufficient.
+
+The decomposition is only used if the FFT volume is reduced (with respect to the full structure).
+"""
+
+__author__ = "Thomas Guillod"
+__copyright__ = "Thomas Guillod - Dartmouth College"
+__license__ = "Mozilla Public License Version 2.0"
+
+import scilogger
+import numpy as np
+
+# get a logger
+LOGGER = scilogger.get_logger(__name__, "pypeec")
+
+
+def _get_box_shrink(occupancy, lo, hi):
+    """
+    Shrink a box to the bounding box of the occupied voxels.
+    """
+
+    # get the occupancy of the box
+    occupancy_box = occupancy[lo[0] : hi[0], lo[1] : hi[1], lo[2] : hi[2]]
+
+    # check for empty boxes
+    if not np.any(occupancy_box):
+        return None, None
+
+    # find the bounding box along the different dimensions
+    lo_new = np.zeros(3, dtype=np.int64)
+    hi_new = np.zeros(3, dtype=np.int64)
+    for dim in range(3):
+        axis = tuple(dim_tmp for dim_tmp in range(3) if dim_tmp != dim)
+        idx = np.flatnonzero(np.any(occupancy_box, axis=axis))
+        lo_new[dim] = lo[dim] + idx[0]
+        hi_new[dim] = lo[dim] + idx[-1] + 1
+
+    return lo_new, hi_new
+
+
+def _get_box_gap(occupancy, lo, hi):
+    """
+    Find the largest gap (consecutive empty planes) inside a box.
+    The dimension, the position, and the length of the gap are returned.
+    """
+
+    # get the occupancy of the box
+    occupancy_box = occupancy[lo[0] : hi[0], lo[1] : hi[1], lo[2] : hi[2]]
+
+    # find the largest gap along the different dimensions
+    (dim_gap, idx_gap, n_gap) = (None, None, 0)
+    for dim in range(3):
+        axis = tuple(dim_tmp for dim_tmp in range(3) if dim_tmp != dim)
+        empty = np.logical_not(np.any(occupancy_box, axis=axis))
+
+        # find the runs of empty planes
+        edge = np.diff(np.concatenate(([0], empty.astype(np.int64), [0])))
+        idx_start = np.flatnonzero(edge == +1)
+        idx_stop = np.flatnonzero(edge == -1)
+
+        # select the largest run
+        for start, stop in zip(idx_start, idx_stop):
+            if (stop - start) > n_gap:
+                (dim_gap, idx_gap, n_gap) = (dim, lo[dim] + start, stop - start)
+
+    return dim_gap, idx_gap, n_gap
+
+
+def _get_box_split(occupancy, lo, hi, fill_min, volume_min):
+    """
+    Split a box into dense sub-boxes (recursive function).
+    """
+
+    # shrink the box to the occupied voxels
+    (lo, hi) = _get_box_shrink(occupancy, lo, hi)
+    if (lo is None) or (hi is None):
+        return []
+
+    # get the fill ratio and the volume of the box
+    volume = np.prod(hi - lo)
+    n_voxel = np.count_nonzero(occupancy[lo[0] : hi[0], lo[1] : hi[1], lo[2] : hi[2]])
+    fill = n_voxel / volume
+
+    # check if the box should be split
+    if (fill >= fill_min) or (volume <= volume_min):
+        return [{"lo": lo, "hi": hi}]
+
+    # find the position of the split (largest gap or middle of the largest dimension)
+    (dim, idx_gap, n_gap) = _get_box_gap(occupancy, lo, hi)
+    if n_gap == 0:
+        dim = np.argmax(hi - lo)
+        idx_gap = (lo[dim] + hi[dim]) // 2
+
+    # get the bounds of the sub-boxes
+    hi_1 = hi.copy()
+    lo_2 = lo.copy()
+    hi_1[dim] = idx_gap
+    lo_2[dim] = idx_gap + n_gap
+
+    # split the sub-boxes
+    box_list = []
+    box_list += _get_box_split(occupancy, lo, hi_1, fill_min, volume_min)
+    box_list += _get_box_split(occupancy, lo_2, hi, fill_min, volume_min)
+
+    return box_list
+
+
+def _get_pair_volume(box_list, box_pair):
+    """
+    Get the total FFT volume of the pairs of sub-boxes.
+    """
+
+    volume = 0
+    for idx_out, idx_in in box_pair:
+        n_out = box_list[idx_out]["hi"] - box_list[idx_out]["lo"]
+        n_in = box_list[idx_in]["hi"] - box_list[idx_in]["lo"]
+        volume += np.prod(n_out + n_in)
+
+    return volume
+
+
+def get_box_decomposition(n, idx_vox_out, idx_vox_in, box_options):
+    """
+    Decompose a voxel structure into dense sub-boxes.
+    The sub-boxes are covering the voxels used by the input and output vectors.
+
+    The sub-boxes are defined by the lower and upper voxel indices.
+    The pairs of sub-boxes (output and input) requiring a FFT convolution are returned.
+    The pairs are selected such that the operator and the flipped operator can be computed.
+    """
+
+    # extract the data
+    decompose = box_options["decompose"]
+    fill_min = box_options["fill_min"]
+    volume_min = box_options["volume_min"]
+
+    # get the full box
+    lo = np.zeros(3, dtype=np.int64)
+    hi = np.array(n, dtype=np.int64)
+    box_full = [{"lo": lo, "hi": hi}]
+    pair_full = [(0, 0)]
+
+    # check if the decomposition is required
+    if not decompose:
+        return box_full, pair_full
+
+    # get the occupancy of the input and output voxels
+    occupancy_out = np.zeros(n, dtype=bool)
+    occupancy_in = np.zeros(n, dtype=bool)
+    occupancy_out[np.unravel_index(idx_vox_out, n, order="F")] = True
+    occupancy_in[np.unravel_index(idx_vox_in, n, order="F")] = True
+    occupancy = occupancy_out | occupancy_in
+
+    # split the voxel structure into sub-boxes
+    box_list = _get_box_split(occupancy, lo, hi, fill_min, volume_min)
+
+    # find the boxes containing input and output voxels
+    has_out = []
+    has_in = []
+    for box in box_list:
+        (lo_box, hi_box) = (box["lo"], box["hi"])
+        has_out.append(np.any(occupancy_out[lo_box[0] : hi_box[0], lo_box[1] : hi_box[1], lo_box[2] : hi_box[2]]))
+        has_in.append(np.any(occupancy_in[lo_box[0] : hi_box[0], lo_box[1] : hi_box[1], lo_box[2] : hi_box[2]]))
+
+    # get the pairs of sub-boxes (operator and flipped operator)
+    box_pair = []
+    for idx_out in range(len(box_list)):
+        for idx_in in range(len(box_list)):
+            pair_for = has_out[idx_out] and has_in[idx_in]
+            pair_rev = has_in[idx_out] and has_out[idx_in]
+            if pair_for or pair_rev:
+                box_pair.append((idx_out, idx_in))
+
+    # get the FFT volume
+    volume_full = _get_pair_volume(box_full, pair_full)
+    volume_box = _get_pair_volume(box_list, box_pair)
+
+    # display the decomposition
+    LOGGER.debug("box / n_box = %d / n_pair = %d", len(box_list), len(box_pair))
+    LOGGER.debug("box / volume = %.2f", volume_box / volume_full)
+
+    # the decomposition is only used if the FFT volume is reduced
+    if volume_box >= volume_full:
+        return box_full, pair_full
+
+    return box_list, box_pair
@@ -32,13 +32,13 @@ def _get_voxel_indices(nx, ny, nz):
     return idx_x, idx_y, idx_z
 
 
-def _get_dense_zero(idx_out, idx_in, mat, idx_row, idx_col):
+def _get_dense_zero(idx_out, idx_in, n, idx_row, idx_col):
     """
     Construct a zero matrix for a given block position.
     """
 
     # extract the voxel data
-    (nx, ny, nz, nd) = mat.shape
+    (nx, ny, nz) = n
     nv = nx * ny * nz
 
     # get the matrix size
@@ -53,13 +53,17 @@ def _get_dense_zero(idx_out, idx_in, mat, idx_row, idx_col):
     return data
 
 
-def _get_dense_diag(idx_out, idx_in, mat, idx_row, idx_col, sign_type):
+def _get_dense_diag(idx_out, idx_in, n, mat, axis, shift, idx_row, idx_col, sign_type):
     """
     Construct a dense matrix from a tensor for a given block position.
+
+    The dimensions listed in axis are mirrored (image tensors):
+        - The tensor indices are given by the sum of the indices (correlation).
+        - The input elements can be shifted by one element (faces between the voxels).
     """
 
     # get the tensor size
-    (nx, ny, nz) = mat.shape
+    (nx, ny, nz) = n
     nv = nx * ny * nz
 
     # voxel index array
@@ -71,39 +75,29 @@ def _get_dense_diag(idx_out, idx_in, mat, idx_row, idx_col, sign_type):
     n_row = np.count_nonzero(idx_row)
     n_col = np.count_nonzero(idx_col)
 
-    # get the relative position between elements
-    (idx_x_1, idx_x_2) = np.meshgrid(idx_x[idx_row], idx_x[idx_col], indexing="ij")
-    (idx_y_1, idx_y_2) = np.meshgrid(idx_y[idx_row], idx_y[idx_col], indexing="ij")
-    (idx_z_1, idx_z_2) = np.meshgrid(idx_z[idx_row], idx_z[idx_col], indexing="ij")
-    idx_x_tmp = idx_x_1 - idx_x_2
-    idx_y_tmp = idx_y_1 - idx_y_2
-    idx_z_tmp = idx_z_1 - idx_z_2
-
-    # select the element with a positive sign
-    if sign_type == "abs":
-        idx_pos = np.full((n_row, n_col), True, dtype=bool)
-    elif sign_type == "x":
-        idx_pos = idx_x_tmp >= 0
-    elif sign_type == "y":
-        idx_pos = idx_y_tmp >= 0
-    elif sign_type == "z":
-        idx_pos = idx_z_tmp >= 0
-    else:
+    # check the sign type
+    if sign_type not in ["abs", "x", "y", "z"]:
         raise ValueError("invalid sign type")
 
-    # get the sign matrix
-    idx_neg = np.logical_not(idx_pos)
-    sign = np.empty((n_row, n_col), dtype=np.int64)
-    sign[idx_pos] = +1
-    sign[idx_neg] = -1
-
-    # get the tensor indices
-    idx_x_tmp = np.abs(idx_x_tmp)
-    idx_y_tmp = np.abs(idx_y_tmp)
-    idx_z_tmp = np.abs(idx_z_tmp)
+    # get the relative position between elements
+    idx_all = []
+    sign = np.ones((n_row, n_col), dtype=np.int64)
+    for dim, idx_dim in enumerate((idx_x, idx_y, idx_z)):
+        (idx_1, idx_2) = np.meshgrid(idx_dim[idx_row], idx_dim[idx_col], indexing="ij")
+        if dim in axis:
+            # mirrored dimension: sum of the indices (with the shift)
+            idx_tmp = np.mod(idx_1 + idx_2 - shift[dim], 2 * n[dim])
+        else:
+            # standard dimension: difference of the indices (with the sign)
+            idx_tmp = idx_1 - idx_2
+            if sign_type == "xyz"[dim]:
+                sign[idx_tmp < 0] = -1
+            idx_tmp = np.abs(idx_tmp)
+        idx_all.append(idx_tmp)
 
     # get the linear indices
-    idx = idx_x_tmp + idx_y_tmp * nx + idx_z_tmp * nx * ny
+    (mx, my, mz) = mat.shape
+    idx = idx_all[0] + idx_all[1] * mx + idx_all[2] * mx * my
 
     # get the coefficients
     mat_tmp = mat.flatten(order="F")
@@ -114,9 +108,77 @@ def _get_dense_diag(idx_out, idx_in, mat, idx_row, idx_col, sign_type):
     return data
 
 
-def get_prepare(name, idx_out, idx_in, mat):
+def _get_dense_matrix(name, idx_out, idx_in, n, mat, axis, shift):
+    """
+    Construct the blocks of a dense matrix from a tensor (direct or image tensor).
+    """
+
+    if name == "potential":
+        data = [
+            [_get_dense_diag(idx_out, idx_in, n, mat[:, :, :, 0], axis, shift[0], 0, 0, "abs")],
+        ]
+    elif name == "inductance":
+        # fill the diagonal blocks
+        data_xx = _get_dense_diag(idx_out, idx_in, n, mat[:, :, :, 0], axis, shift[0], 0, 0, "abs")
+        data_yy = _get_dense_diag(idx_out, idx_in, n, mat[:, :, :, 0], axis, shift[1], 1, 1, "abs")
+        data_zz = _get_dense_diag(idx_out, idx_in, n, mat[:, :, :, 0], axis, shift[2], 2, 2, "abs")
+
+        # the off-diagonal blocks are empty
+        data_xy = _get_dense_zero(idx_out, idx_in, n, 0, 1)
+        data_xz = _get_dense_zero(idx_out, idx_in, n, 0, 2)
+        data_yx = _get_dense_zero(idx_out, idx_in, n, 1, 0)
+        data_yz = _get_dense_zero(idx_out, idx_in, n, 1, 2)
+        data_zx = _get_dense_zero(idx_out, idx_in, n, 2, 0)
+        data_zy = _get_dense_zero(idx_out, idx_in, n, 2, 1)
+
+        # assemble the matrix from the blocks
+        data = [
+            [data_xx, data_xy, data_xz],
+            [data_yx, data_yy, data_yz],
+            [data_zx, data_zy, data_zz],
+        ]
+    elif name == "coupling":
+        # fill the off-diagonal blocks
+        data_xy = _get_dense_diag(idx_out, idx_in, n, mat[:, :, :, 2], axis, shift[1], 0, 1, "z")
+        data_xz = _get_dense_diag(idx_out, idx_in, n, mat[:, :, :, 1], axis, shift[2], 0, 2, "y")
+        data_yx = _get_dense_diag(idx_out, idx_in, n, mat[:, :, :, 2], axis, shift[0], 1, 0, "z")
+        data_yz = _get_dense_diag(idx_out, idx_in, n, mat[:, :, :, 0], axis, shift[2], 1, 2, "x")
+        data_zx = _get_dense_diag(idx_out, idx_in, n, mat[:, :, :, 1], axis, shift[0], 2, 0, "y")
+        data_zy = _get_dense_diag(idx_out, idx_in, n, mat[:, :, :, 0], axis, shift[1], 2, 1, "x")
+
+        # the diagonal blocks are empty
+        data_xx = _get_dense_zero(idx_out, idx_in, n, 0, 0)
+        data_yy = _get_dense_zero(idx_out, idx_in, n, 1, 1)
+        data_zz = _get_dense_zero(idx_out, idx_in, n, 2, 2)
+
+        # assemble the matrix from the blocks
+        data = [
+            [data_xx, +data_xy, +data_xz],
+            [-data_yx, data_yy, +data_yz],
+            [-data_zx, -data_zy, data_zz],
+        ]
+    elif name == "gradient":
+        # fill the column blocks
+        data_x = _get_dense_diag(idx_out, idx_in, n, mat[:, :, :, 0], axis, shift[0], 0, 0, "x")
+        data_y = _get_dense_diag(idx_out, idx_in, n, mat[:, :, :, 1], axis, shift[0], 1, 0, "y")
+        data_z = _get_dense_diag(idx_out, idx_in, n, mat[:, :, :, 2], axis, shift[0], 2, 0, "z")
+
+        # assemble the matrix from the blocks
+        data = [
+            [data_x],
+            [data_y],
+            [data_z],
+        ]
+    else:
+        raise ValueError("invalid matrix type")
+
+    return data
+
+
+def get_prepare(name, idx_out, idx_in, mat, img):
     """
     Construct a dense matrix from a 4D tensor (main function).
+    The image tensors (symmetry planes) are added to the dense matrix.
 
     The output index vector has the size: n_out.
     The input index vector has the size: n_in.
@@ -144,53 +206,32 @@ def get_prepare(name, idx_out, idx_in, mat):
     idx_out = idx_out[idx_perm_out]
     idx_in = idx_in[idx_perm_in]
 
-    # get the matrix (sorted indices)
-    if name == "potential":
-        data = _get_dense_diag(idx_out, idx_in, mat[:, :, :, 0], 0, 0, "abs")
-    elif name == "inductance":
-        # fill the diagonal blocks
-        data_xx = _get_dense_diag(idx_out, idx_in, mat[:, :, :, 0], 0, 0, "abs")
-        data_yy = _get_dense_diag(idx_out, idx_in, mat[:, :, :, 0], 1, 1, "abs")
-        data_zz = _get_dense_diag(idx_out, idx_in, mat[:, :, :, 0], 2, 2, "abs")
-
-        # the off-diagonal blocks are empty
-        data_xy = _get_dense_zero(idx_out, idx_in, mat, 0, 1)
-        data_xz = _get_dense_zero(idx_out, idx_in, mat, 0, 2)
-        data_yx = _get_dense_zero(idx_out, idx_in, mat, 1, 0)
-        data_yz = _get_dense_zero(idx_out, idx_in, mat, 1, 2)
-        data_zx = _get_dense_zero(idx_out, idx_in, mat, 2, 0)
-        data_zy = _get_dense_zero(idx_out, idx_in, mat, 2, 1)
-
-        # assemble the matrix from the blocks
-        data = [
-            [data_xx, data_xy, data_xz],
-            [data_yx, data_yy, data_yz],
-            [data_zx, data_zy, data_zz],
-        ]
-        data = np.block(data)
-    elif name == "coupling":
-        # fill the off-diagonal blocks
-        data_xy = _get_dense_diag(idx_out, idx_in, mat[:, :, :, 2], 0, 1, "z")
-        data_xz = _get_dense_diag(idx_out, idx_in, mat[:, :, :, 1], 0, 2, "y")
-        data_yx = _get_dense_diag(idx_out, idx_in, mat[:, :, :, 2], 1, 0, "z")
-        data_yz = _get_dense_diag(idx_out, idx_in, mat[:, :, :, 0], 1, 2, "x")
-        data_zx = _get_dense_diag(idx_out, idx_in, mat[:, :, :, 1], 2, 0, "y")
-        data_zy = _get_dense_diag(idx_out, idx_in, mat[:, :, :, 0], 2, 1, "x")
-
-        # the diagonal blocks are empty
-        data_xx = _get_dense_zero(idx_out, idx_in, mat, 0, 0)
-        data_yy = _get_dense_zero(idx_out, idx_in, mat, 1, 1)
-        data_zz = _get_dense_zero(idx_out, idx_in, mat, 2, 2)
+    # get the voxel structure size
+    n = mat.shape[0:3]
 
-        # assemble the matrix from the blocks
-        data = [
-            [data_xx, +data_xy, +data_xz],
-            [-data_yx, data_yy, +data_yz],
-            [-data_zx, -data_zy, data_zz],
-        ]
-        data = np.block(data)
-    else:
-        raise ValueError("invalid matrix type")
+    # get the matrix (sorted indices)
+    shift = np.zeros((3, 3), dtype=np.int64)
+    data = _get_dense_matrix(name, idx_out, idx_in, n, mat, (), shift)
+    data = np.block(data)
+
+    # add the image matrices (sorted indices)
+    for img_tmp in img:
+        # extract the data
+        axis = img_tmp["axis"]
+        sign_in = img_tmp["sign_in"]
+
+        # get the shift of the input elements (faces between the voxels)
+        shift = []
+        for dim, shift_tmp in enumerate(img_tmp["shift"]):
+            shift_dim = np.zeros(3, dtype=np.int64)
+            if shift_tmp and (dim in axis):
+                shift_dim[dim] = 1
+            shift.append(shift_dim)
+
+        # get the blocks and apply the signs of the mirrored input elements
+        data_tmp = _get_dense_matrix(name, idx_out, idx_in, n, img_tmp["mat"], axis, shift)
+        data_tmp = [[sign_in[i] * blk for (i, blk) in enumerate(row)] for row in data_tmp]
+        data += np.block(data_tmp)
 
     # restore the original indices order
     data = data[idx_rev_out, :]
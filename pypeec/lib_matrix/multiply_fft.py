@@ -17,6 +17,17 @@ This module is used as a common interface for different FFT libraries:
 
 This module is only importing the required FFT library.
 This means that the unused FFT libraries are not required.
+
+For problems with symmetry planes, the image tensors are added to the circulant tensor:
+    - The coupling with the mirrored voxels is a correlation (sum of the indices).
+    - The correlation is computed with the FFT of the input tensor (reversed frequencies).
+    - The same FFT size is used for the circulant tensor and the image tensors.
+
+For sparse geometries, the voxel structure can be decomposed into dense sub-boxes:
+    - The circulant tensors are constructed for the pairs of sub-boxes (output and input).
+    - The FFT size of a pair is given by the sum of the sizes of the sub-boxes.
+    - The contributions of the different pairs are summed.
+    - Without decomposition, a single box is used (full voxel structure).
 """
 
 __author__ = "Thomas Guillod"
@@ -25,6 +36,7 @@ __license__ = "Mozilla Public License Version 2.0"
 
 import os
 import scilogger
+from pypeec.lib_matrix import multiply_box
 
 # get a logger
 LOGGER = scilogger.get_logger(__name__, "pypeec")
@@ -215,17 +227,14 @@ def _get_fft_tensor_keep(mat, replace):
     return mat_trf
 
 
-def _get_fft_tensor_expand(mat, replace):
+def _get_fft_tensor_expand(mat, shape, replace):
     """
     Get the FFT of a 4D tensor along the first 3D.
-    The size of the output is the double the size of the input
+    The input tensor is zero-padded to the specified size.
     """
 
-    # get the tensor size
-    (nx, ny, nz) = mat.shape[0:3]
-
     # get the transform
-    mat_trf = FFTN(mat, (2 * nx, 2 * ny, 2 * nz), (0, 1, 2), replace)
+    mat_trf = FFTN(mat, shape, (0, 1, 2), replace)
 
     return mat_trf
 
@@ -241,62 +250,85 @@ def _get_ifft_tensor(mat, replace):
     return mat_trf
 
 
-def _get_tensor_sign(name, nd_in):
+def _get_tensor_sign(name, nd_in, dim):
     """
-    Get the signs for the different tensor blocks composing the circulant tensor.
+    Get the signs for the mirrored blocks composing the circulant tensor (for a given dimension).
     """
 
     if name == "potential":
-        sign = NPCP.ones((2, 2, 2, nd_in), dtype=NPCP.float64)
+        sign = NPCP.ones(nd_in, dtype=NPCP.float64)
     elif name == "inductance":
-        sign = NPCP.ones((2, 2, 2, nd_in), dtype=NPCP.float64)
-    elif name == "coupling":
-        sign = NPCP.empty((2, 2, 2, nd_in), dtype=NPCP.float64)
-        sign[0, 0, 0, :] = NPCP.array([+1, +1, +1], dtype=NPCP.float64)
-        sign[1, 0, 0, :] = NPCP.array([-1, +1, +1], dtype=NPCP.float64)
-        sign[0, 1, 0, :] = NPCP.array([+1, -1, +1], dtype=NPCP.float64)
-        sign[0, 0, 1, :] = NPCP.array([+1, +1, -1], dtype=NPCP.float64)
-        sign[1, 1, 0, :] = NPCP.array([-1, -1, +1], dtype=NPCP.float64)
-        sign[1, 0, 1, :] = NPCP.array([-1, +1, -1], dtype=NPCP.float64)
-        sign[0, 1, 1, :] = NPCP.array([+1, -1, -1], dtype=NPCP.float64)
-        sign[1, 1, 1, :] = NPCP.array([-1, -1, -1], dtype=NPCP.float64)
+        sign = NPCP.ones(nd_in, dtype=NPCP.float64)
+    elif name in ["coupling", "gradient"]:
+        sign = NPCP.ones(nd_in, dtype=NPCP.float64)
+        sign[dim] = -1
     else:
         raise ValueError("invalid matrix type")
 
     return sign
 
 
-def _get_tensor_circulant(mat, sign):
+def _get_tensor_circulant(name, mat, axis, box_out, box_in):
     """
-    Construct a circulant tensor from a 4D tensor.
+    Construct a circulant tensor from a 4D tensor (for a pair of boxes).
     The circulant tensor is constructed for the first 3D.
 
     The input tensor has the size: (nx, ny, nz, nd_in).
-    The output FFT circulant tensor has the size: (2*nx, 2*ny, 2*nz, nd_in).
+    The output box has the size: (mx_out, my_out, mz_out).
+    The input box has the size: (mx_in, my_in, mz_in).
+    The output FFT circulant tensor has the size: (mx_out+mx_in, my_out+my_in, mz_out+mz_in, nd_in).
+    For the full voxel structure, the FFT circulant tensor has the size: (2*nx, 2*ny, 2*nz, nd_in).
+
+    The dimensions listed in axis are not mirrored (image tensors).
+    For these dimensions, the size of the input tensor is already doubled.
     """
 
     # get the tensor size
-    (nx, ny, nz, nd_in) = mat.shape
-
-    # init the circulant tensor
-    mat_fft = NPCP.zeros((2 * nx, 2 * ny, 2 * nz, nd_in), dtype=NPCP.float64)
-
-    # cube none
-    mat_fft[0:nx, 0:ny, 0:nz, :] = mat[0:nx, 0:ny, 0:nz, :] * sign[0:1, 0:1, 0:1, :]
-    # cube x
-    mat_fft[nx + 1 : 2 * nx, 0:ny, 0:nz, :] = mat[nx - 1 : 0 : -1, 0:ny, 0:nz, :] * sign[1:2, 0:1, 0:1, :]
-    # cube y
-    mat_fft[0:nx, ny + 1 : 2 * ny, 0:nz, :] = mat[0:nx, ny - 1 : 0 : -1, 0:nz, :] * sign[0:1, 1:2, 0:1, :]
-    # cube z
-    mat_fft[0:nx, 0:ny, nz + 1 : 2 * nz, :] = mat[0:nx, 0:ny, nz - 1 : 0 : -1, :] * sign[0:1, 0:1, 1:2, :]
-    # cube xy
-    mat_fft[nx + 1 : 2 * nx, ny + 1 : 2 * ny, 0:nz, :] = mat[nx - 1 : 0 : -1, ny - 1 : 0 : -1, 0:nz, :] * sign[1:2, 1:2, 0:1, :]
-    # cube xz
-    mat_fft[nx + 1 : 2 * nx, 0:ny, nz + 1 : 2 * nz, :] = mat[nx - 1 : 0 : -1, 0:ny, nz - 1 : 0 : -1, :] * sign[1:2, 0:1, 1:2, :]
-    # cube yz
-    mat_fft[0:nx, ny + 1 : 2 * ny, nz + 1 : 2 * nz, :] = mat[0:nx, ny - 1 : 0 : -1, nz - 1 : 0 : -1, :] * sign[0:1, 1:2, 1:2, :]
-    # cube xyz
-    mat_fft[nx + 1 : 2 * nx, ny + 1 : 2 * ny, nz + 1 : 2 * nz, :] = mat[nx - 1 : 0 : -1, ny - 1 : 0 : -1, nz - 1 : 0 : -1, :] * sign[1:2, 1:2, 1:2, :]
+    nd_in = mat.shape[3]
+
+    # get the box position and size
+    lo_out = box_out["lo"]
+    lo_in = box_in["lo"]
+    n_out = box_out["hi"] - box_out["lo"]
+    n_in = box_in["hi"] - box_in["lo"]
+
+    # get the mapping and the signs along the different dimensions
+    idx_list = []
+    sign_list = []
+    for dim in range(3):
+        # get the FFT size
+        n_fft = int(n_out[dim] + n_in[dim])
+        idx_fft = NPCP.arange(n_fft, dtype=NPCP.int64)
+
+        if dim in axis:
+            # the dimension is not mirrored (sum of the indices, the last element is the shifted element)
+            n_dim = mat.shape[dim] // 2
+            idx_tmp = NPCP.mod(idx_fft + 1, n_fft) - 1
+            idx_tmp = NPCP.mod(lo_out[dim] + lo_in[dim] + idx_tmp, 2 * n_dim)
+            sign_tmp = NPCP.ones((n_fft, nd_in), dtype=NPCP.float64)
+        else:
+            # the dimension is mirrored (difference of the indices, the unused elements are set to zero)
+            n_dim = mat.shape[dim]
+            idx_tmp = NPCP.where(idx_fft < n_out[dim], idx_fft, idx_fft - n_fft)
+            idx_tmp = lo_out[dim] - lo_in[dim] + idx_tmp
+            idx_neg = idx_tmp < 0
+            idx_tmp = NPCP.abs(idx_tmp)
+            idx_zero = idx_tmp >= n_dim
+            idx_tmp[idx_zero] = 0
+            sign_tmp = NPCP.ones((n_fft, nd_in), dtype=NPCP.float64)
+            sign_tmp[idx_neg, :] = _get_tensor_sign(name, nd_in, dim)
+            sign_tmp[idx_zero, :] = 0
+
+        idx_list.append(idx_tmp)
+        sign_list.append(sign_tmp)
+
+    # get the circulant tensor
+    mat_fft = mat[NPCP.ix_(*idx_list)]
+
+    # apply the signs
+    mat_fft *= sign_list[0][:, NPCP.newaxis, NPCP.newaxis, :]
+    mat_fft *= sign_list[1][NPCP.newaxis, :, NPCP.newaxis, :]
+    mat_fft *= sign_list[2][NPCP.newaxis, NPCP.newaxis, :, :]
 
     # get the FFT of the circulant tensor
     mat_fft = _get_fft_tensor_keep(mat_fft, True)
@@ -304,37 +336,146 @@ def _get_tensor_circulant(mat, sign):
     return mat_fft
 
 
-def _get_indices(nx, ny, nz, idx, nd_out, dim):
+def _get_tensor_phase(shape):
+    """
+    Get the phase shifts (one element along the different dimensions).
+    The phase shifts are used for the faces located between the voxels (along the mirrored dimensions).
+    """
+
+    phase = []
+    for n_fft in shape:
+        idx = NPCP.arange(n_fft, dtype=NPCP.float64)
+        phase.append(NPCP.exp(-2j * NPCP.pi * idx / n_fft))
+
+    return phase
+
+
+def _get_tensor_image(name, img, box_out, box_in, nd_vec_in, nd_vec_out):
+    """
+    Construct the FFT image tensors (one tensor per combination of symmetry planes).
+    The FFT image tensors are constructed for a pair of boxes.
+
+    The image tensors are describing the coupling with the mirrored elements.
+    The signs of the mirrored input elements are given by the image definition:
+        - sign_in: signs of the input vector components.
+        - sign_out: signs of the output vector components (used if the input and output are flipped).
+        - shift: if the input vector components are located between the voxels (along the mirrored dimension).
+    """
+
+    img_fft = []
+    for img_tmp in img:
+        # extract the data
+        axis = img_tmp["axis"]
+        mat = img_tmp["mat"]
+        sign_in = img_tmp["sign_in"]
+        sign_out = img_tmp["sign_out"]
+        shift = img_tmp["shift"]
+
+        # get the FFT circulant tensor (the mirrored dimensions are not mirrored)
+        mat_fft = _get_tensor_circulant(name, mat, axis, box_out, box_in)
+
+        # check the size
+        if (len(sign_in) != nd_vec_in) or (len(shift) != nd_vec_in) or (len(sign_out) != nd_vec_out):
+            raise ValueError("invalid image tensor size")
+
+        # assign the data
+        img_fft.append({"axis": axis, "mat_fft": mat_fft, "sign_in": sign_in, "sign_out": sign_out, "shift": shift})
+
+    return img_fft
+
+
+def _get_tensor_mirror(res, img_fft, phase, dim_in, flip):
     """
-    Get the indices for mapping a vector into a tensor.
+    Get the FFT of the mirrored input tensor (for a given combination of symmetry planes).
+    The reversed frequencies are used for computing the correlation with the image tensor.
+    If the input tensor is a 3D slice, the vector component is specified by dim_in.
+    """
+
+    # extract the data
+    axis = img_fft["axis"]
+    shift = img_fft["shift"]
+
+    # get the signs of the mirrored elements (flipped input and output)
+    if flip:
+        sign = img_fft["sign_out"]
+    else:
+        sign = img_fft["sign_in"]
+
+    # reverse the frequencies along the mirrored dimensions
+    res = NPCP.roll(NPCP.flip(res, axis=axis), 1, axis=axis)
+
+    # apply the signs and the phase shifts
+    if dim_in is None:
+        res *= sign
+        for dim in range(res.shape[3]):
+            if shift[dim] and (dim in axis):
+                res[:, :, :, dim] *= _get_phase_broadcast(phase, dim)
+    else:
+        res *= sign[dim_in]
+        if shift[dim_in] and (dim_in in axis):
+            res *= _get_phase_broadcast(phase, dim_in)
+
+    return res
+
+
+def _get_phase_broadcast(phase, dim):
+    """
+    Get the phase shift along a dimension (for broadcasting with a 3D tensor).
+    """
+
+    if dim == 0:
+        return phase[0][:, NPCP.newaxis, NPCP.newaxis]
+    elif dim == 1:
+        return phase[1][NPCP.newaxis, :, NPCP.newaxis]
+    elif dim == 2:
+        return phase[2][NPCP.newaxis, NPCP.newaxis, :]
+    else:
+        raise ValueError("invalid dimension")
+
+
+def _get_indices(n, box, idx, nd_out, dim):
+    """
+    Get the indices for mapping a vector into a tensor (for a box).
     The indices are either computed for all 4D or for a 3D slice.
+    Only the elements located inside the box are selected.
     """
 
+    # get the box position and size
+    lo = box["lo"]
+    (mx, my, mz) = box["hi"] - box["lo"]
+
+    # mapping between the vector indices and the tensor indices (voxel structure)
+    (idx_x, idx_y, idx_z, idx_d) = NPCP.unravel_index(idx, (*n, nd_out), order="F")
+
+    # mapping between the vector indices and the tensor indices (box)
+    idx_x = idx_x - lo[0]
+    idx_y = idx_y - lo[1]
+    idx_z = idx_z - lo[2]
+
+    # indices of the elements included in the box
+    idx_sel = (idx_x >= 0) & (idx_x < mx) & (idx_y >= 0) & (idx_y < my) & (idx_z >= 0) & (idx_z < mz)
+
     if dim is None:
         # shape of the tensor with the vectors (4D)
-        shape = (nx, ny, nz, nd_out)
+        shape = (mx, my, mz, nd_out)
 
         # mapping between the vector indices and the tensor indices (4D)
-        idx_mat = NPCP.unravel_index(idx, (nx, ny, nz, nd_out), order="F")
-
-        # for the case with 4D mapping, all the elements are selected
-        idx_sel = None
+        idx_mat = (idx_x[idx_sel], idx_y[idx_sel], idx_z[idx_sel], idx_d[idx_sel])
     else:
-        # number of element for the 3D sluce
-        nv = nx * ny * nz
-
-        # shape of the tensor with the vectors (4D)
-        shape = (nx, ny, nz)
+        # shape of the tensor with the vectors (3D)
+        shape = (mx, my, mz)
 
         # indices of the elements included in the considered 3D slices
-        idx_sel = NPCP.isin(idx, NPCP.arange(dim * nv, (dim + 1) * nv))
+        idx_sel = idx_sel & (idx_d == dim)
 
         # mapping between the vector indices and the tensor indices (3D)
-        idx_tmp = idx[idx_sel] - dim * nv
-        idx_mat = NPCP.unravel_index(idx_tmp, shape, order="F")
+        idx_mat = (idx_x[idx_sel], idx_y[idx_sel], idx_z[idx_sel])
+
+    # get the number of selected elements
+    count = int(NPCP.count_nonzero(idx_sel))
 
     # assign the dict with the indices
-    idx = {"idx_sel": idx_sel, "idx_mat": idx_mat, "shape": shape, "length": len(idx)}
+    idx = {"idx_sel": idx_sel, "idx_mat": idx_mat, "shape": shape, "length": len(idx), "count": count}
 
     return idx
 
@@ -354,10 +495,7 @@ def _get_tensor(idx, vec):
     res = NPCP.zeros(shape, dtype=NPCP.complex128)
 
     # assign the tensor (4D or 3D slice)
-    if idx_sel is None:
-        res[idx_mat] = vec[:]
-    else:
-        res[idx_mat] = vec[idx_sel]
+    res[idx_mat] = vec[idx_sel]
 
     return res
 
@@ -377,15 +515,12 @@ def _get_vector(idx, res):
     vec = NPCP.zeros(length, dtype=NPCP.complex128)
 
     # assign the vector (4D or 3D slice)
-    if idx_sel is None:
-        vec[:] = res[idx_mat]
-    else:
-        vec[idx_sel] = res[idx_mat]
+    vec[idx_sel] = res[idx_mat]
 
     return vec
 
 
-def _get_compute_combined(name, idx_in, idx_out, mat_fft, vec_in):
+def _get_compute_combined(name, idx_in, idx_out, pair, vec_in, flip):
     """
     Matrix-vector multiplication with FFT.
     The multiplication is done directly with the 4D tensors.
@@ -397,69 +532,113 @@ def _get_compute_combined(name, idx_in, idx_out, mat_fft, vec_in):
 
     The FFT circulant tensor has the size: (2*nx, 2*ny, 2*nz, nd_in).
     The input tensor has the size: (nx, ny, nz, nd_out).
+    For a pair of boxes, the sizes are given by the boxes (see the circulant tensor).
 
     For the matrix-vector multiplication is done in several steps:
         - The vector is expanded into a tensor: n_in to (nx, ny, nz, nd_out).
         - Computation the FFT of the obtained tensor: (nx, ny, nz, nd_out) to (2*nx, 2*ny, 2*nz, nd_out).
         - Multiplication of FFT circulant tensors: (2*nx, 2*ny, 2*nz, nd_in) and (2*nx, 2*ny, 2*nz, nd_out).
+        - Multiplication of FFT image tensors with the reversed FFT tensor (symmetry planes).
         - Computation the iFFT of the obtained tensor: (2*nx, 2*ny, 2*nz, nd_out).
         - The tensor is flattened into a vector: (2*nx, 2*ny, 2*nz, nd_out) to n_out.
     """
 
+    # extract the data
+    shape = pair["shape"]
+    mat_fft = pair["mat_fft"]
+    img_fft = pair["img_fft"]
+    phase = pair["phase"]
+
+    # skip the pairs without input or output elements
+    if (idx_in["count"] == 0) or (idx_out["count"] == 0):
+        return NPCP.zeros(idx_out["length"], dtype=NPCP.complex128)
+
     # get the input tensor from the input vector
     res = _get_tensor(idx_in, vec_in)
 
     # compute the FFT of the input tensor
-    res = _get_fft_tensor_expand(res, True)
+    res = _get_fft_tensor_expand(res, shape, True)
 
     # matrix vector multiplication in frequency domain with the FFT circulant tensor
+    res_all = _get_tensor_product(name, mat_fft, res)
+
+    # add the contributions of the mirrored elements (image tensors)
+    for img_fft_tmp in img_fft:
+        res_tmp = _get_tensor_mirror(res, img_fft_tmp, phase, None, flip)
+        res_all += _get_tensor_product(name, img_fft_tmp["mat_fft"], res_tmp)
+
+    # compute the iFFT of the obtained output tensor
+    res_all = _get_ifft_tensor(res_all, True)
+
+    # extract the output vector from the output tensor
+    res_all = _get_vector(idx_out, res_all)
+
+    return res_all
+
+
+def _get_tensor_product(name, mat_fft, res):
+    """
+    Multiplication of the FFT circulant tensor with the FFT of the input tensor.
+    """
+
     if name == "potential":
-        res *= mat_fft
+        res = mat_fft * res
     elif name == "inductance":
-        res *= mat_fft
+        res = mat_fft * res
     elif name == "coupling":
         res_tmp = NPCP.empty(res.shape, dtype=NPCP.complex128)
         res_tmp[:, :, :, 0] = +mat_fft[:, :, :, 2] * res[:, :, :, 1] + mat_fft[:, :, :, 1] * res[:, :, :, 2]
         res_tmp[:, :, :, 1] = -mat_fft[:, :, :, 2] * res[:, :, :, 0] + mat_fft[:, :, :, 0] * res[:, :, :, 2]
         res_tmp[:, :, :, 2] = -mat_fft[:, :, :, 1] * res[:, :, :, 0] - mat_fft[:, :, :, 0] * res[:, :, :, 1]
         res = res_tmp
+    elif name == "gradient":
+        res = mat_fft * res[:, :, :, 0:1]
     else:
         raise ValueError("invalid matrix type")
 
-    # compute the iFFT of the obtained output tensor
-    res = _get_ifft_tensor(res, True)
-
-    # extract the output vector from the output tensor
-    res = _get_vector(idx_out, res)
-
     return res
 
 
-def _get_multiply_slice(idx_in, idx_out, mat_fft, vec_in, dim_in, dim_out, dim_mat):
+def _get_multiply_slice(idx_in, idx_out, pair, vec_in, flip, dim_in, dim_out, dim_mat):
     """
     Matrix-vector multiplication with FFT.
     The multiplication is done for specific 3D slices composing the 4D tensors.
     """
 
+    # extract the data
+    shape = pair["shape"]
+    mat_fft = pair["mat_fft"]
+    img_fft = pair["img_fft"]
+    phase = pair["phase"]
+
+    # skip the slices without input or output elements
+    if (idx_in[dim_in]["count"] == 0) or (idx_out[dim_out]["count"] == 0):
+        return NPCP.zeros(idx_out[dim_out]["length"], dtype=NPCP.complex128)
+
     # get the input tensor from the input vector
     res = _get_tensor(idx_in[dim_in], vec_in)
 
     # compute the FFT of the input tensor
-    res = _get_fft_tensor_expand(res, True)
+    res = _get_fft_tensor_expand(res, shape, True)
 
     # matrix vector multiplication in frequency domain with the FFT circulant tensor
-    res *= mat_fft[:, :, :, dim_mat]
+    res_all = res * mat_fft[:, :, :, dim_mat]
+
+    # add the contributions of the mirrored elements (image tensors)
+    for img_fft_tmp in img_fft:
+        res_tmp = _get_tensor_mirror(res, img_fft_tmp, phase, dim_in, flip)
+        res_all += res_tmp * img_fft_tmp["mat_fft"][:, :, :, dim_mat]
 
     # compute the iFFT of the obtained output tensor
-    res = _get_ifft_tensor(res, True)
+    res_all = _get_ifft_tensor(res_all, True)
 
     # extract the output vector from the output tensor
-    res = _get_vector(idx_out[dim_out], res)
+    res_all = _get_vector(idx_out[dim_out], res_all)
 
-    return res
+    return res_all
 
 
-def _get_compute_split(name, n_out, idx_in, idx_out, mat_fft, vec_in):
+def _get_compute_split(name, n_out, idx_in, idx_out, pair, vec_in, flip):
     """
     Matrix-vector multiplication with FFT.
     The multiplication is done by splitting the 4D tensor in 3D slices.
@@ -472,6 +651,7 @@ def _get_compute_split(name, n_out, idx_in, idx_out, mat_fft, vec_in):
     The FFT circulant tensor has the size: (2*nx, 2*ny, 2*nz, nd_in).
     The input tensor has the size: (nx, ny, nz, nd_out).
     The dimension nd_in and nd_out are used to create the 3D slices.
+    For a pair of boxes, the sizes are given by the boxes (see the circulant tensor).
 
     For the matrix-vector multiplication is done in several steps for each slice:
         - The vector is expanded into a tensor: n_in to (nx, ny, nz).
@@ -483,29 +663,56 @@ def _get_compute_split(name, n_out, idx_in, idx_out, mat_fft, vec_in):
 
     if name == "potential":
         # the multiplication is composed of a single slice
-        res = _get_multiply_slice(idx_in, idx_out, mat_fft, vec_in, 0, 0, 0)
+        res = _get_multiply_slice(idx_in, idx_out, pair, vec_in, flip, 0, 0, 0)
     elif name == "inductance":
         # the multiplication is decomposed into three slices
         res = NPCP.zeros(n_out, dtype=NPCP.complex128)
-        res += _get_multiply_slice(idx_in, idx_out, mat_fft, vec_in, 0, 0, 0)
-        res += _get_multiply_slice(idx_in, idx_out, mat_fft, vec_in, 1, 1, 0)
-        res += _get_multiply_slice(idx_in, idx_out, mat_fft, vec_in, 2, 2, 0)
+        res += _get_multiply_slice(idx_in, idx_out, pair, vec_in, flip, 0, 0, 0)
+        res += _get_multiply_slice(idx_in, idx_out, pair, vec_in, flip, 1, 1, 0)
+        res += _get_multiply_slice(idx_in, idx_out, pair, vec_in, flip, 2, 2, 0)
     elif name == "coupling":
         # the multiplication is decomposed into six slices
         res = NPCP.zeros(n_out, dtype=NPCP.complex128)
-        res += _get_multiply_slice(idx_in, idx_out, mat_fft, vec_in, 1, 0, 2)
-        res += _get_multiply_slice(idx_in, idx_out, mat_fft, vec_in, 2, 0, 1)
-        res += _get_multiply_slice(idx_in, idx_out, mat_fft, vec_in, 2, 1, 0)
-        res -= _get_multiply_slice(idx_in, idx_out, mat_fft, vec_in, 0, 1, 2)
-        res -= _get_multiply_slice(idx_in, idx_out, mat_fft, vec_in, 0, 2, 1)
-        res -= _get_multiply_slice(idx_in, idx_out, mat_fft, vec_in, 1, 2, 0)
+        res += _get_multiply_slice(idx_in, idx_out, pair, vec_in, flip, 1, 0, 2)
+        res += _get_multiply_slice(idx_in, idx_out, pair, vec_in, flip, 2, 0, 1)
+        res += _get_multiply_slice(idx_in, idx_out, pair, vec_in, flip, 2, 1, 0)
+        res -= _get_multiply_slice(idx_in, idx_out, pair, vec_in, flip, 0, 1, 2)
+        res -= _get_multiply_slice(idx_in, idx_out, pair, vec_in, flip, 0, 2, 1)
+        res -= _get_multiply_slice(idx_in, idx_out, pair, vec_in, flip, 1, 2, 0)
+    elif name == "gradient":
+        # the multiplication is decomposed into three slices
+        res = NPCP.zeros(n_out, dtype=NPCP.complex128)
+        res += _get_multiply_slice(idx_in, idx_out, pair, vec_in, flip, 0, 0, 0)
+        res += _get_multiply_slice(idx_in, idx_out, pair, vec_in, flip, 0, 1, 1)
+        res += _get_multiply_slice(idx_in, idx_out, pair, vec_in, flip, 0, 2, 2)
     else:
         raise ValueError("invalid matrix type")
 
     return res
 
 
-def get_prepare(name, idx_out, idx_in, mat, split, fft_options):
+def _get_box_indices(n, box, idx, nd_vec, split):
+    """
+    Get the indices for mapping a vector into a tensor (for a box).
+    """
+
+    if split:
+        # the following method is used for the multiplication
+        #   - 4D tensor will be sliced into 3D tensors for the computation
+        #   - compute the indices for each 3D slice
+        idx_mat = []
+        for i in range(nd_vec):
+            idx_mat.append(_get_indices(n, box, idx, nd_vec, i))
+    else:
+        # the following method is used for the multiplication
+        #   - 4D tensor are directly used for the computation
+        #   - compute the indices for the 4D tensor
+        idx_mat = _get_indices(n, box, idx, nd_vec, None)
+
+    return idx_mat
+
+
+def get_prepare(name, idx_out, idx_in, mat, img, split, box_options, fft_options):
     """
     Construct a circulant tensor from a 4D tensor (main function).
     The circulant tensor is constructed along the first 3D.
@@ -513,67 +720,100 @@ def get_prepare(name, idx_out, idx_in, mat, split, fft_options):
 
     The input tensor has the size: (nx, ny, nz, nd_in).
     The output FFT circulant tensor has the size: (2*nx, 2*ny, 2*nz, nd_in).
+    The image tensors (symmetry planes) are transformed into FFT image tensors (same size).
+
+    If the voxel structure is decomposed into sub-boxes, a circulant tensor is constructed per pair.
+    The output FFT circulant tensors have the size: (mx_out+mx_in, my_out+my_in, mz_out+mz_in, nd_in).
     """
 
     # set the global options (one per process)
     if not SET:
         _set_options(fft_options)
 
-    # load the data to the GPU
-    mat = LOAD(mat)
-    idx_in = LOAD(idx_in)
-    idx_out = LOAD(idx_out)
-
     # get tensor size
     (nx, ny, nz, nd_in) = mat.shape
+    n = (nx, ny, nz)
+
+    # get the number of dimensions of the input and output vectors
+    if name == "potential":
+        (nd_vec_in, nd_vec_out) = (1, 1)
+    elif name == "inductance":
+        (nd_vec_in, nd_vec_out) = (3, 3)
+    elif name == "coupling":
+        (nd_vec_in, nd_vec_out) = (3, 3)
+    elif name == "gradient":
+        (nd_vec_in, nd_vec_out) = (1, 3)
+    else:
+        raise ValueError("invalid matrix type")
+
+    # decompose the voxel structure into sub-boxes
+    idx_vox_out = idx_out % (nx * ny * nz)
+    idx_vox_in = idx_in % (nx * ny * nz)
+    (box_list, box_pair) = multiply_box.get_box_decomposition(n, idx_vox_out, idx_vox_in, box_options)
 
     # get the memory footprint
-    nnz = (2 * nx) * (2 * ny) * (2 * nz) * nd_in
+    nnz = 0
+    for idx_box_out, idx_box_in in box_pair:
+        n_box_out = box_list[idx_box_out]["hi"] - box_list[idx_box_out]["lo"]
+        n_box_in = box_list[idx_box_in]["hi"] - box_list[idx_box_in]["lo"]
+        nnz += int((n_box_out + n_box_in).prod()) * nd_in * (1 + len(img))
     itemsize = NPCP.dtype(NPCP.complex128).itemsize
     footprint = (itemsize * nnz) / (1024**2)
 
     # display the tensor size
     LOGGER.debug("%s / footprint = %.2f MB", name, footprint)
 
-    # get the sign that will be applied to the different blocks of the tensor
-    sign = _get_tensor_sign(name, nd_in)
-
-    # get the FFT circulant tensor
-    mat_fft = _get_tensor_circulant(mat, sign)
-
-    # get tensor last dimension
-    if name == "potential":
-        nd_out = 1
-    elif name == "inductance":
-        nd_out = 3
-    elif name == "coupling":
-        nd_out = 3
-    else:
-        raise ValueError("invalid matrix type")
+    # load the data to the GPU
+    mat = LOAD(mat)
+    idx_in = LOAD(idx_in)
+    idx_out = LOAD(idx_out)
+    img = [{**img_tmp, "mat": LOAD(img_tmp["mat"]), "sign_in": LOAD(img_tmp["sign_in"]), "sign_out": LOAD(img_tmp["sign_out"])} for img_tmp in img]
 
     # length of the output
     n_in = len(idx_in)
     n_out = len(idx_out)
 
-    # compute the indices for mapping a vector into a tensor
-    if split:
-        # the following method is used for the multiplication
-        #   - 4D tensor will be sliced into 3D tensors for the computation
-        #   - compute the indices for each 3D slice
-        idx_in_mat = []
-        idx_out_mat = []
-        for i in range(nd_out):
-            idx_in_mat.append(_get_indices(nx, ny, nz, idx_in, nd_out, i))
-            idx_out_mat.append(_get_indices(nx, ny, nz, idx_out, nd_out, i))
-    else:
-        # the following method is used for the multiplication
-        #   - 4D tensor are directly used for the computation
-        #   - compute the indices for the 4D tensor
-        idx_in_mat = _get_indices(nx, ny, nz, idx_in, nd_out, None)
-        idx_out_mat = _get_indices(nx, ny, nz, idx_out, nd_out, None)
+    # compute the indices for mapping a vector into a tensor (for the boxes)
+    #   - the indices are computed for the input and output vectors
+    #   - for the flipped multiplication, the input and output vectors are swapped
+    idx_mat = []
+    for box in box_list:
+        idx_in_mat = _get_box_indices(n, box, idx_in, nd_vec_in, split)
+        idx_out_mat = _get_box_indices(n, box, idx_out, nd_vec_out, split)
+        idx_mat.append({"idx_in": idx_in_mat, "idx_out": idx_out_mat})
+
+    # get the FFT circulant tensors for the pairs of boxes
+    pair = []
+    for idx_box_out, idx_box_in in box_pair:
+        # get the boxes
+        box_out = box_list[idx_box_out]
+        box_in = box_list[idx_box_in]
+
+        # get the FFT size
+        shape = (box_out["hi"] - box_out["lo"]) + (box_in["hi"] - box_in["lo"])
+        shape = tuple(int(shape_tmp) for shape_tmp in shape)
+
+        # get the FFT circulant tensor
+        mat_fft = _get_tensor_circulant(name, mat, (), box_out, box_in)
+
+        # get the FFT image tensors and the phase shifts (symmetry planes)
+        img_fft = _get_tensor_image(name, img, box_out, box_in, nd_vec_in, nd_vec_out)
+        phase = _get_tensor_phase(shape)
+
+        # assign the pair
+        pair.append(
+            {
+                "idx_box_out": idx_box_out,
+                "idx_box_in": idx_box_in,
+                "shape": shape,
+                "mat_fft": mat_fft,
+                "img_fft": img_fft,
+                "phase": phase,
+            }
+        )
 
     # assemble
-    data = (name, n_in, n_out, idx_in_mat, idx_out_mat, mat_fft)
+    data = (name, n_in, n_out, idx_mat, pair)
 
     return data
 
@@ -582,6 +822,7 @@ def get_multiply(data, vec_in, split, fft_options, flip):
     """
     Matrix-vector multiplication with FFT.
     If the flip switch is activated, the input and output are flipped.
+    The contributions of the different pairs of boxes are summed.
 
     The output index vector has the size: n_out.
     The input index vector has the size: n_in.
@@ -597,17 +838,30 @@ def get_multiply(data, vec_in, split, fft_options, flip):
     vec_in = LOAD(vec_in)
 
     # extract the data
-    (name, n_in, n_out, idx_in, idx_out, mat_fft) = data
+    (name, n_in, n_out, idx_mat, pair) = data
 
     # flip the input and output
     if flip:
         (n_out, n_in) = (n_in, n_out)
-        (idx_out, idx_in) = (idx_in, idx_out)
 
-    if split:
-        vec_out = _get_compute_split(name, n_out, idx_in, idx_out, mat_fft, vec_in)
-    else:
-        vec_out = _get_compute_combined(name, idx_in, idx_out, mat_fft, vec_in)
+    # sum the contributions of the pairs of boxes
+    vec_out = NPCP.zeros(n_out, dtype=NPCP.complex128)
+    for pair_tmp in pair:
+        # get the indices of the output and input boxes
+        idx_box_out = idx_mat[pair_tmp["idx_box_out"]]
+        idx_box_in = idx_mat[pair_tmp["idx_box_in"]]
+
+        # get the indices (flipped input and output)
+        if flip:
+            (idx_out, idx_in) = (idx_box_out["idx_in"], idx_box_in["idx_out"])
+        else:
+            (idx_out, idx_in) = (idx_box_out["idx_out"], idx_box_in["idx_in"])
+
+        # compute the contribution of the pair
+        if split:
+            vec_out += _get_compute_split(name, n_out, idx_in, idx_out, pair_tmp, vec_in, flip)
+        else:
+            vec_out += _get_compute_combined(name, idx_in, idx_out, pair_tmp, vec_in, flip)
 
     # unload the data from the GPU
     vec_out = UNLOAD(vec_out)
@@ -216,7 +216,7 @@ def _get_reduce(n, d, c, domain_def):
 
     # get the center shift
     n_diff = (idx_min + idx_max + 1 - n) / 2
-    c += n_diff * d
+    c = c + n_diff * d
 
     # get the new voxel number
     n = idx_max - idx_min + 1
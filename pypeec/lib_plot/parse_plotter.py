@@ -116,6 +116,21 @@ def set_point_cloud(point, var, name):
     return point
 
 
+def set_grid_vector(grid, var, name):
+    """
+    Add a vector variable defined on the complete voxel grid.
+    The norm (scalar field) and the direction (vector field) are added.
+    """
+
+    # assign the vector and the norm
+    if grid.n_cells > 0:
+        grid[name + "_re"] = np.real(var)
+        grid[name + "_im"] = np.imag(var)
+        grid[name + "_norm"] = lna.norm(var, axis=1)
+
+    return grid
+
+
 def get_voxel(idx_vc, idx_vm):
     """
     Get the indices of the non-empty voxels.
@@ -7,12 +7,16 @@ __copyright__ = "Thomas Guillod - Dartmouth College"
 __license__ = "Mozilla Public License Version 2.0"
 
 import scilogger
+import threading
+import contextlib
+import concurrent.futures as cf
 import numpy as np
 import scipy.linalg as lna
 import scipy.sparse.linalg as sla
 from pypeec.lib_matrix import matrix_factorization
 from pypeec.lib_matrix import matrix_condition
 from pypeec.lib_matrix import matrix_iterative
+from pypeec.lib_solver import monitor_resource
 
 # get a logger
 LOGGER = scilogger.get_logger(__name__, "pypeec")
@@ -43,7 +47,7 @@ class _IterCounter:
     Simple class used as a callback to monitor the solver iterations.
     """
 
-    def __init__(self, fct_conv, power_options):
+    def __init__(self, fct_conv, power_options, checkpoint):
         """
         Constructor.
         Init the counters.
@@ -51,6 +55,7 @@ class _IterCounter:
 
         # assign data
         self.fct_conv = fct_conv
+        self.checkpoint = checkpoint
         self.stop = power_options["stop"]
         self.n_min = power_options["n_min"]
         self.n_cmp = power_options["n_cmp"]
@@ -63,9 +68,10 @@ class _IterCounter:
         self.power_final = None
         self.power_init = None
 
-    def get_callback_run(self, sol):
+    def get_callback_run(self, sol, res=None):
         """
         Callback displaying and saving the iteration.
+        The residuum estimate is displayed (if available).
         Check the convergence on the complex power.
         If convergence is achieved, stop the solver and save the solution.
         """
@@ -81,7 +87,15 @@ class _IterCounter:
         self.power_vec.append(power_tmp)
 
         # log the results
-        LOGGER.debug("iter = %d / S = %s VA", iter_tmp, f"{power_tmp:.2e}")
+        if res is None:
+            LOGGER.debug("iter = %d / S = %s VA", iter_tmp, f"{power_tmp:.2e}")
+        else:
+            LOGGER.debug("iter = %d / S = %s VA / res = %.2e", iter_tmp, f"{power_tmp:.2e}", res)
+
+        # save the solver state
+        if self.checkpoint is not None:
+            fct_save = self.checkpoint["fct_save"]
+            fct_save({"sol": sol, "n_iter": self.n_iter, "power_vec": self.power_vec})
 
         # convergence iter condition
         n_iter_min = np.max([2, self.n_cmp + 1, self.n_min])
@@ -103,6 +117,26 @@ class _IterCounter:
             if status:
                 raise _PowerConvergenceError(status, sol)
 
+    def get_restart(self, sol_init):
+        """
+        Restore the solver state from a checkpoint (if available).
+        Return the initial solution.
+        """
+
+        # check if a solver state is available
+        if (self.checkpoint is None) or (self.checkpoint["restart"] is None):
+            return sol_init
+
+        # restore the solver state
+        restart = self.checkpoint["restart"]
+        self.n_iter = restart["n_iter"]
+        self.power_vec = list(restart["power_vec"])
+
+        # log the restart
+        LOGGER.debug("restart / iter = %d", self.n_iter)
+
+        return restart["sol"]
+
     def get_callback_init(self, sol):
         """
         Callback for the initial solution.
@@ -156,6 +190,12 @@ class _IterCounter:
 class _OpCounter:
     """
     Simple class used for creating linear operators and counting the evaluations.
+    The wall time is measured for the different operators.
+
+    The Krylov overhead is measured on the calling thread (solver thread):
+        - The time spent in the operators by the calling thread is measured.
+        - Only the outermost operators are considered (nested operators are ignored).
+        - The operators evaluated by the thread pool are included in the outermost operators.
     """
 
     def __init__(self):
@@ -168,6 +208,93 @@ class _OpCounter:
         self.n_pcd_eval = 0
         self.n_sys_eval = 0
 
+        # init the operator timing
+        self.lock = threading.Lock()
+        self.op_timing = {}
+
+        # init the timing of the calling thread
+        self.thread = threading.get_ident()
+        self.depth = 0
+        self.time_call = 0.0
+
+    @contextlib.contextmanager
+    def _get_call(self):
+        """
+        Measure the time spent in the outermost operators by the calling thread.
+        """
+
+        # the operators evaluated by the thread pool are ignored
+        if threading.get_ident() != self.thread:
+            yield
+            return
+
+        # measure the outermost operators
+        time_start = monitor_resource.get_wall_time()
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            if self.depth == 0:
+                self.time_call += monitor_resource.get_wall_time() - time_start
+
+    def get_fct_time(self, tag, op):
+        """
+        Get an operator that measures the wall time.
+        """
+
+        # init the timing for the operator
+        self.op_timing[tag] = {"n_eval": 0, "time": 0.0}
+
+        def fct(*args):
+            # measure the operator
+            with self._get_call():
+                time_start = monitor_resource.get_wall_time()
+                y = op(*args)
+                time_end = monitor_resource.get_wall_time()
+
+            # update the timing
+            with self.lock:
+                op_timing = self.op_timing[tag]
+                op_timing["n_eval"] += 1
+                op_timing["time"] += time_end - time_start
+
+            return y
+
+        return fct
+
+    def get_fct_time_cm(self, tag, op_cm):
+        """
+        Get electric and magnetic operators that measure the wall time.
+        """
+
+        # extract
+        (op_c, op_m) = op_cm
+
+        # get the operators
+        fct_c = self.get_fct_time(tag + "_electric", op_c)
+        fct_m = self.get_fct_time(tag + "_magnetic", op_m)
+
+        return fct_c, fct_m
+
+    def get_op_timing(self, time_total, memory_total):
+        """
+        Get the operator timing.
+        The Krylov overhead is the time of the calling thread which is not spent in the operators.
+        """
+
+        # get the Krylov overhead
+        time_krylov = max(0.0, time_total - self.time_call)
+
+        # assign the results
+        op_timing = {
+            **self.op_timing,
+            "krylov": {"time": time_krylov},
+            "total": {"time": time_total, **memory_total},
+        }
+
+        return op_timing
+
     def get_fct_pcd(self, op, n_dof):
         """
         Get a preconditioner operator that counts the number of evaluations.
@@ -175,7 +302,8 @@ class _OpCounter:
 
         def fct(x):
             self.n_pcd_eval += 1
-            y = op(x)
+            with self._get_call():
+                y = op(x)
             return y
 
         op_count = sla.LinearOperator((n_dof, n_dof), matvec=fct, dtype=np.complex128)
@@ -189,7 +317,8 @@ class _OpCounter:
 
         def fct(x):
             self.n_sys_eval += 1
-            y = op(x)
+            with self._get_call():
+                y = op(x)
             return y
 
         op_count = sla.LinearOperator((n_dof, n_dof), matvec=fct, dtype=np.complex128)
@@ -211,7 +340,25 @@ class _OpCounter:
         return self.n_sys_eval
 
 
-def _fct_pcd_all(rhs_tmp, n_dof_c, n_dof_m, fct_pcd_cm):
+def _get_branch(fct_c, fct_m, pool):
+    """
+    Evaluate the electric and magnetic branches (sequentially or concurrently).
+    The heavy computations (FFT and sparse solves) are releasing the GIL.
+    """
+
+    if pool is None:
+        out_c = fct_c()
+        out_m = fct_m()
+    else:
+        future_c = pool.submit(fct_c)
+        future_m = pool.submit(fct_m)
+        out_c = future_c.result()
+        out_m = future_m.result()
+
+    return out_c, out_m
+
+
+def _fct_pcd_all(rhs_tmp, n_dof_c, n_dof_m, fct_pcd_cm, pool):
     """
     Function describing the preconditioner for the system.
     """
@@ -223,9 +370,16 @@ def _fct_pcd_all(rhs_tmp, n_dof_c, n_dof_m, fct_pcd_cm):
     rhs_c = rhs_tmp[0:n_dof_c]
     rhs_m = rhs_tmp[n_dof_c : n_dof_c + n_dof_m]
 
+    # function describing the electric preconditioner
+    def fct_c():
+        return fct_pcd_c(rhs_c)
+
+    # function describing the magnetic preconditioner
+    def fct_m():
+        return fct_pcd_m(rhs_m)
+
     # solve the preconditioner
-    sol_c = fct_pcd_c(rhs_c)
-    sol_m = fct_pcd_m(rhs_m)
+    (sol_c, sol_m) = _get_branch(fct_c, fct_m, pool)
 
     # assemble solution
     sol = np.concatenate((sol_c, sol_m))
@@ -233,7 +387,7 @@ def _fct_pcd_all(rhs_tmp, n_dof_c, n_dof_m, fct_pcd_cm):
     return sol
 
 
-def _fct_sys_all(sol_tmp, n_dof_c, n_dof_m, fct_cpl_cm, fct_sys_cm):
+def _fct_sys_all(sol_tmp, n_dof_c, n_dof_m, fct_cpl_cm, fct_sys_cm, pool):
     """
     Function describing the equation system.
     """
@@ -246,9 +400,16 @@ def _fct_sys_all(sol_tmp, n_dof_c, n_dof_m, fct_cpl_cm, fct_sys_cm):
     sol_c = sol_tmp[0:n_dof_c]
     sol_m = sol_tmp[n_dof_c : n_dof_c + n_dof_m]
 
+    # function describing the electric system
+    def fct_c():
+        return fct_sys_c(sol_c) + fct_cpl_c(sol_m)
+
+    # function describing the magnetic system
+    def fct_m():
+        return fct_sys_m(sol_m) + fct_cpl_m(sol_c)
+
     # solve the system
-    rhs_c = fct_sys_c(sol_c) + fct_cpl_c(sol_m)
-    rhs_m = fct_sys_m(sol_m) + fct_cpl_m(sol_c)
+    (rhs_c, rhs_m) = _get_branch(fct_c, fct_m, pool)
 
     # assemble solution
     rhs = np.concatenate((rhs_c, rhs_m))
@@ -256,33 +417,70 @@ def _fct_sys_all(sol_tmp, n_dof_c, n_dof_m, fct_cpl_cm, fct_sys_cm):
     return rhs
 
 
-def _get_solver_direct(sol_init, fct_cpl_cm, fct_sys_cm, fct_pcd_cm, rhs_cm, direct_options, op_obj, iter_obj):
+def _get_pcd_inner(fct_pcd_all, op_sys, n_dof, inner_options):
+    """
+    Get an inner iterative preconditioner for the coupled system.
+    The preconditioner is a loose iterative solve of the coupled system.
+    The inner solve is preconditioned with the sparse preconditioner.
+    """
+
+    # extract
+    inner = inner_options["inner"]
+    iter_options = inner_options["iter_options"]
+
+    # check if the inner iterative preconditioner is used
+    if not inner:
+        return fct_pcd_all
+
+    # get the sparse preconditioner operator
+    op_pcd = sla.LinearOperator((n_dof, n_dof), matvec=fct_pcd_all, dtype=np.complex128)
+
+    # function describing the inner iterative preconditioner
+    def fct(rhs_tmp):
+        sol_tmp = np.zeros(n_dof, dtype=np.complex128)
+        (_, sol_tmp) = matrix_iterative.get_solve(sol_tmp, op_sys, op_pcd, rhs_tmp, None, iter_options)
+        return sol_tmp
+
+    return fct
+
+
+def _get_solver_direct(sol_init, fct_cpl_cm, fct_sys_cm, fct_pcd_cm, rhs_cm, direct_options, inner_options, pool, op_obj, iter_obj):
     """
     Solve the coupled magnetic-electric equation system with an iterative solver.
+    The preconditioner is either the sparse preconditioner or an inner iterative solve.
     """
 
     # extract
+    solver = direct_options["solver"]
+    inner = inner_options["inner"]
     (rhs_c, rhs_m) = rhs_cm
 
+    # the inner iterative preconditioner is not constant (flexible solver required)
+    if inner and (solver != "fgmres"):
+        raise ValueError("invalid solver: inner preconditioner requires fgmres")
+
     # get problem size
     n_dof_c = len(rhs_c)
     n_dof_m = len(rhs_m)
 
     # function describing the preconditioner
     def fct_pcd_all(rhs_tmp):
-        return _fct_pcd_all(rhs_tmp, n_dof_c, n_dof_m, fct_pcd_cm)
+        return _fct_pcd_all(rhs_tmp, n_dof_c, n_dof_m, fct_pcd_cm, pool)
 
     # function describing the equation system
     def fct_sys_all(sol_tmp):
-        return _fct_sys_all(sol_tmp, n_dof_c, n_dof_m, fct_cpl_cm, fct_sys_cm)
+        return _fct_sys_all(sol_tmp, n_dof_c, n_dof_m, fct_cpl_cm, fct_sys_cm, pool)
 
     # get operator
-    op_pcd = op_obj.get_fct_pcd(fct_pcd_all, n_dof_c + n_dof_m)
     op_sys = op_obj.get_fct_sys(fct_sys_all, n_dof_c + n_dof_m)
 
+    # get the (inner iterative) preconditioner
+    fct_pcd_inner = _get_pcd_inner(fct_pcd_all, op_sys, n_dof_c + n_dof_m, inner_options)
+    op_pcd = op_obj.get_fct_pcd(fct_pcd_inner, n_dof_c + n_dof_m)
+
     # get callback
-    def fct_callback(sol):
-        iter_obj.get_callback_run(sol)
+    def fct_callback(sol, res):
+        iter_obj.get_callback_run(sol, res)
 
     # assemble rhs
     rhs = np.concatenate((rhs_c, rhs_m))
@@ -325,9 +523,68 @@ def _get_solver_domain(sol_init, sol_other, fct_cpl, fct_sys, fct_pcd, rhs, iter
     return status, sol
 
 
+def _get_anderson(sol_old, sol_new, history, anderson_depth):
+    """
+    Accelerate a fixed-point iteration with the Anderson method.
+    The history of the fixed-point iterations is stored in a list (modified in place).
+    If the history depth is zero, the acceleration is disabled.
+    """
+
+    # check if the acceleration is used
+    if anderson_depth == 0:
+        return sol_new
+
+    # get the fixed-point residuum
+    res = sol_new - sol_old
+
+    # update the history
+    history.append((res, sol_new))
+    if len(history) > (anderson_depth + 1):
+        history.pop(0)
+
+    # the acceleration requires at least two iterations
+    if len(history) < 2:
+        return sol_new
+
+    # get the differences between the successive iterations
+    res_all = np.stack([res_tmp for (res_tmp, _) in history], axis=1)
+    sol_all = np.stack([sol_tmp for (_, sol_tmp) in history], axis=1)
+    res_diff = np.diff(res_all, axis=1)
+    sol_diff = np.diff(sol_all, axis=1)
+
+    # solve the least-squares problem for the mixing coefficients
+    (gamma, _, _, _) = lna.lstsq(res_diff, res)
+
+    # get the accelerated solution
+    sol = sol_new - sol_diff @ gamma
+
+    return sol
+
+
+def _get_adapt_options(iter_options, res_rel, adapt_factor):
+    """
+    Adapt the tolerance of the inner iterative solver to the outer residuum.
+    The inner tolerance is loose for the first iterations and tightened as the residuum decreases.
+    If the adaptation factor is zero, the adaptation is disabled.
+    """
+
+    # extract
+    rel_tol = iter_options["rel_tol"]
+
+    # get the adapted tolerance
+    rel_tol = np.maximum(rel_tol, adapt_factor * np.minimum(res_rel, 1.0))
+
+    # assign the adapted tolerance
+    iter_options = {**iter_options, "rel_tol": float(rel_tol)}
+
+    return iter_options
+
+
 def _get_solver_segregated(sol_init, fct_cpl_cm, fct_sys_cm, fct_pcd_cm, rhs_cm, segregated_options, op_obj, iter_obj):
     """
     Solve the segregated magnetic-electric equation system with an iterative solver.
+    The outer fixed-point iteration can be accelerated with the Anderson method.
+    The tolerances of the inner iterative solvers can be adapted to the outer residuum.
     """
 
     # extract
@@ -337,6 +594,8 @@ def _get_solver_segregated(sol_init, fct_cpl_cm, fct_sys_cm, fct_pcd_cm, rhs_cm,
     n_max = segregated_options["n_max"]
     relax_electric = segregated_options["relax_electric"]
     relax_magnetic = segregated_options["relax_magnetic"]
+    anderson_depth = segregated_options["anderson_depth"]
+    adapt_factor = segregated_options["adapt_factor"]
     iter_electric_options = segregated_options["iter_electric_options"]
     iter_magnetic_options = segregated_options["iter_magnetic_options"]
 
@@ -354,37 +613,58 @@ def _get_solver_segregated(sol_init, fct_cpl_cm, fct_sys_cm, fct_pcd_cm, rhs_cm,
     sol_c = sol_init[0:n_dof_c]
     sol_m = sol_init[n_dof_c : n_dof_c + n_dof_m]
 
+    # get the residuum threshold
+    rhs = np.concatenate((rhs_c, rhs_m))
+    res_ref = lna.norm(rhs)
+    res_thr = np.maximum(rel_tol * res_ref, abs_tol)
+
+    # init the relative residuum (used for the adaptive inner tolerances)
+    if adapt_factor > 0:
+        res_c = fct_sys_c(sol_c) + fct_cpl_c(sol_m) - rhs_c
+        res_m = fct_sys_m(sol_m) + fct_cpl_m(sol_c) - rhs_m
+        res_rel = lna.norm(np.concatenate((res_c, res_m))) / np.maximum(res_ref, abs_tol)
+    else:
+        res_rel = 0.0
+
     # init
     converged = False
     status = None
-    sol = None
+    history = []
+    sol = np.concatenate((sol_c, sol_m))
 
     # solve
     while not converged:
+        # get the inner solver options
+        iter_electric_tmp = _get_adapt_options(iter_electric_options, res_rel, adapt_factor)
+        iter_magnetic_tmp = _get_adapt_options(iter_magnetic_options, res_rel, adapt_factor)
+
         # solve and relax the electric equation systems
-        (status_c, sol_c_new) = _get_solver_domain(sol_c, sol_m, fct_cpl_c, fct_sys_c, fct_pcd_c, rhs_c, iter_electric_options, op_obj)
+        (status_c, sol_c_new) = _get_solver_domain(sol_c, sol_m, fct_cpl_c, fct_sys_c, fct_pcd_c, rhs_c, iter_electric_tmp, op_obj)
         sol_c = (1 - relax_electric) * sol_c + relax_electric * sol_c_new
 
         # solve and relax the magnetic equation systems
-        (status_m, sol_m_new) = _get_solver_domain(sol_m, sol_c, fct_cpl_m, fct_sys_m, fct_pcd_m, rhs_m, iter_magnetic_options, op_obj)
+        (status_m, sol_m_new) = _get_solver_domain(sol_m, sol_c, fct_cpl_m, fct_sys_m, fct_pcd_m, rhs_m, iter_magnetic_tmp, op_obj)
         sol_m = (1 - relax_magnetic) * sol_m + relax_magnetic * sol_m_new
 
+        # accelerate the fixed-point iteration
+        sol_new = np.concatenate((sol_c, sol_m))
+        sol = _get_anderson(sol, sol_new, history, anderson_depth)
+        sol_c = sol[0:n_dof_c]
+        sol_m = sol[n_dof_c : n_dof_c + n_dof_m]
+
         # get residuum
         res_c = fct_sys_c(sol_c) + fct_cpl_c(sol_m) - rhs_c
         res_m = fct_sys_m(sol_m) + fct_cpl_m(sol_c) - rhs_m
-
-        # aggregate the results
-        sol = np.concatenate((sol_c, sol_m))
         res = np.concatenate((res_c, res_m))
-        rhs = np.concatenate((rhs_c, rhs_m))
 
         # run callback
         iter_obj.get_callback_run(sol)
         n_iter = iter_obj.get_n_iter()
 
         # check status
-        res_thr = np.maximum(rel_tol * lna.norm(rhs), abs_tol)
-        status_res = lna.norm(res) <= res_thr
+        res_val = lna.norm(res)
+        res_rel = res_val / np.maximum(res_ref, abs_tol)
+        status_res = res_val <= res_thr
         status = status_c and status_m and status_res
 
         # check convergence
@@ -394,7 +674,110 @@ def _get_solver_segregated(sol_init, fct_cpl_cm, fct_sys_cm, fct_pcd_cm, rhs_cm,
     return status, sol
 
 
-def _get_status(status, sol, rhs_cm, fct_cpl_cm, fct_sys_cm, status_options):
+def _get_solver_refinement(sol_init, fct_cpl_cm, fct_sys_cm, fct_pcd_cm, rhs_cm, refinement_options, pool, op_obj, iter_obj):
+    """
+    Solve the coupled magnetic-electric equation system with iterative refinement.
+    The residuum is computed with the complete equation system (defect correction).
+    The corrections are computed with the sparse preconditioner (existing factorization).
+    The successive corrections are combined with the Anderson method (limited memory).
+    """
+
+    # extract
+    rel_tol = refinement_options["rel_tol"]
+    abs_tol = refinement_options["abs_tol"]
+    relax = refinement_options["relax"]
+    anderson_depth = refinement_options["anderson_depth"]
+    n_min = refinement_options["n_min"]
+    n_max = refinement_options["n_max"]
+
+    # extract
+    (rhs_c, rhs_m) = rhs_cm
+
+    # get problem size
+    n_dof_c = len(rhs_c)
+    n_dof_m = len(rhs_m)
+
+    # function describing the preconditioner
+    def fct_pcd_all(rhs_tmp):
+        return _fct_pcd_all(rhs_tmp, n_dof_c, n_dof_m, fct_pcd_cm, pool)
+
+    # function describing the equation system
+    def fct_sys_all(sol_tmp):
+        return _fct_sys_all(sol_tmp, n_dof_c, n_dof_m, fct_cpl_cm, fct_sys_cm, pool)
+
+    # get operator
+    op_pcd = op_obj.get_fct_pcd(fct_pcd_all, n_dof_c + n_dof_m)
+    op_sys = op_obj.get_fct_sys(fct_sys_all, n_dof_c + n_dof_m)
+
+    # assemble rhs
+    rhs = np.concatenate((rhs_c, rhs_m))
+
+    # residuum threshold
+    res_thr = np.maximum(rel_tol * lna.norm(rhs), abs_tol)
+
+    # init
+    converged = False
+    status = None
+    history = []
+    sol = sol_init
+    res = rhs - op_sys(sol)
+
+    # solve
+    while not converged:
+        # correct and accelerate the solution
+        sol_new = sol + relax * op_pcd(res)
+        sol = _get_anderson(sol, sol_new, history, anderson_depth)
+
+        # get residuum
+        res = rhs - op_sys(sol)
+
+        # run callback
+        iter_obj.get_callback_run(sol)
+        n_iter = iter_obj.get_n_iter()
+
+        # check status
+        status = lna.norm(res) <= res_thr
+
+        # check convergence
+        if (n_iter >= n_max) or (status and (n_iter >= n_min)):
+            converged = True
+
+    return status, sol
+
+
+def _get_solver_sparse(fct_pcd_cm, rhs_cm, pool, op_obj, iter_obj):
+    """
+    Solve the equation system with a single evaluation of the preconditioner.
+    This is only valid if the preconditioner is an exact representation of the system.
+    """
+
+    # extract
+    (rhs_c, rhs_m) = rhs_cm
+
+    # get problem size
+    n_dof_c = len(rhs_c)
+    n_dof_m = len(rhs_m)
+
+    # function describing the preconditioner
+    def fct_pcd_all(rhs_tmp):
+        return _fct_pcd_all(rhs_tmp, n_dof_c, n_dof_m, fct_pcd_cm, pool)
+
+    # get operator
+    op_pcd = op_obj.get_fct_pcd(fct_pcd_all, n_dof_c + n_dof_m)
+
+    # assemble rhs
+    rhs = np.concatenate((rhs_c, rhs_m))
+
+    # solve the system
+    sol = op_pcd(rhs)
+
+    # run callback
+    iter_obj.get_callback_run(sol)
+
+    return True, sol
+
+
+def _get_status(status, sol, rhs_cm, fct_cpl_cm, fct_sys_cm, status_options, pool):
     """
     Compute the residuum and the solver convergence status.
     """
@@ -414,7 +797,7 @@ def _get_status(status, sol, rhs_cm, fct_cpl_cm, fct_sys_cm, status_options):
 
     # get solution
     rhs = np.concatenate((rhs_c, rhs_m))
-    out = _fct_sys_all(sol, n_dof_c, n_dof_m, fct_cpl_cm, fct_sys_cm)
+    out = _fct_sys_all(sol, n_dof_c, n_dof_m, fct_cpl_cm, fct_sys_cm, pool)
 
     # get residuum value
     residuum = out - rhs
@@ -441,18 +824,63 @@ def _get_status(status, sol, rhs_cm, fct_cpl_cm, fct_sys_cm, status_options):
     return status, residuum, residuum_val, residuum_thr
 
 
-def get_solver(sol_init, fct_cpl_cm, fct_sys_cm, fct_pcd_cm, rhs_cm, fct_conv, solver_options):
+def get_extrapolate(freq, init_chain, extrapolation_options):
+    """
+    Get the initial solution from the chain of parent sweeps (None for the sweeps without dependencies).
+    The solutions of the parent sweeps are extrapolated with respect to the frequency (polynomial).
+    The order of the polynomial is reduced if not enough distinct frequencies are available.
+    """
+
+    # extract the options
+    order = extrapolation_options["order"]
+
+    # check if the sweep has dependencies
+    if not init_chain:
+        return None
+
+    # get the parent sweeps with distinct frequencies
+    freq_list = []
+    sol_list = []
+    for data_param_tmp, sol_tmp in init_chain[: order + 1]:
+        freq_tmp = data_param_tmp["freq"]
+        if freq_tmp not in freq_list:
+            freq_list.append(freq_tmp)
+            sol_list.append(sol_tmp)
+
+    # get the extrapolated solution (Lagrange polynomial)
+    sol_init = np.zeros(len(sol_list[0]), dtype=np.complex128)
+    for i, (freq_i, sol_i) in enumerate(zip(freq_list, sol_list, strict=True)):
+        weight = 1.0
+        for j, freq_j in enumerate(freq_list):
+            if i != j:
+                weight *= (freq - freq_j) / (freq_i - freq_j)
+        sol_init += weight * sol_i
+
+    # display the extrapolation
+    LOGGER.debug("extrapolation / order = %d", len(freq_list) - 1)
+
+    return sol_init
+
+
+def get_solver(sol_init, fct_cpl_cm, fct_sys_cm, fct_pcd_cm, fct_coarse, rhs_cm, sys_exact, fct_conv, checkpoint, solver_options):
     """
     Solve the equation system with an iterative solver.
     The equation system and the preconditioner are described with linear operator.
+    If the preconditioner is exact, the system can be solved with a single sparse solve.
+    If a coarse correction is provided, the electric preconditioner is a two-level preconditioner.
+    The solver state can be saved and restored (checkpoint and restart).
     """
 
     # get the condition options
     coupling = solver_options["coupling"]
+    sparse_bypass = solver_options["sparse_bypass"]
+    concurrent = solver_options["concurrent"]
     status_options = solver_options["status_options"]
     power_options = solver_options["power_options"]
     segregated_options = solver_options["segregated_options"]
     direct_options = solver_options["direct_options"]
+    inner_options = solver_options["inner_options"]
+    refinement_options = solver_options["refinement_options"]
 
     # get system size
     (rhs_c, rhs_m) = rhs_cm
@@ -467,65 +895,123 @@ def get_solver(sol_init, fct_cpl_cm, fct_sys_cm, fct_pcd_cm, rhs_cm, fct_conv, s
     # create operator counter
     op_obj = _OpCounter()
 
+    # get the operators with timing (the original operators are kept for the status)
+    fct_sys_time_cm = op_obj.get_fct_time_cm("system", fct_sys_cm)
+    fct_cpl_time_cm = op_obj.get_fct_time_cm("coupling", fct_cpl_cm)
+    fct_pcd_time_cm = op_obj.get_fct_time_cm("preconditioner", fct_pcd_cm)
+    fct_conv_time = op_obj.get_fct_time("callback", fct_conv)
+
+    # add the coarse correction to the electric preconditioner (the additional system evaluations are timed)
+    if fct_coarse is None:
+        fct_pcd_iter_cm = fct_pcd_time_cm
+    else:
+        (fct_pcd_time_c, fct_pcd_time_m) = fct_pcd_time_cm
+        (fct_sys_time_c, fct_sys_time_m) = fct_sys_time_cm
+        fct_coarse_time = op_obj.get_fct_time("coarse_electric", fct_coarse)
+        fct_pcd_time_c = _get_pcd_multilevel(fct_pcd_time_c, fct_sys_time_c, fct_coarse_time)
+        fct_pcd_iter_cm = (fct_pcd_time_c, fct_pcd_time_m)
+
     # create iteration counter and convergence check
-    iter_obj = _IterCounter(fct_conv, power_options)
+    iter_obj = _IterCounter(fct_conv_time, power_options, checkpoint)
 
-    # call the solver
-    LOGGER.debug("solver run")
-    with LOGGER.BlockIndent():
-        # first callback with the solution
-        iter_obj.get_callback_init(sol_init)
+    # restore the solver state (if available)
+    sol_init = iter_obj.get_restart(sol_init)
 
-        # solve the equation system
-        try:
-            # run the solver
-            if coupling == "direct":
-                (status, sol) = _get_solver_direct(
-                    sol_init,
-                    fct_cpl_cm,
-                    fct_sys_cm,
-                    fct_pcd_cm,
-                    rhs_cm,
-                    direct_options,
-                    op_obj,
-                    iter_obj,
-                )
-            elif coupling == "segregated":
-                (status, sol) = _get_solver_segregated(
-                    sol_init,
-                    fct_cpl_cm,
-                    fct_sys_cm,
-                    fct_pcd_cm,
-                    rhs_cm,
-                    segregated_options,
-                    op_obj,
-                    iter_obj,
-                )
-            else:
-                raise ValueError("invalid coupling method")
-
-            # residuum solver convergence
-            power = False
-        except _PowerConvergenceError as ex:
-            # power solver convergence
-            power = True
-
-            # get the solution
-            status = ex.status
-            sol = ex.sol
-
-        # final callback with the solution
-        iter_obj.get_callback_final(sol)
-
-    # get convergence status
-    (status, residuum, residuum_val, residuum_thr) = _get_status(
-        status,
-        sol,
-        rhs_cm,
-        fct_cpl_cm,
-        fct_sys_cm,
-        status_options,
-    )
+    # create a thread pool for the electric and magnetic branches (if both are present)
+    #   - the thread pool is released at the end of the solve (also if an exception is raised)
+    #   - without a thread pool, the branches are evaluated sequentially
+    if concurrent and (n_dof_electric > 0) and (n_dof_magnetic > 0):
+        pool_cm = cf.ThreadPoolExecutor(max_workers=2)
+    else:
+        pool_cm = contextlib.nullcontext()
+
+    # solve the equation system and compute the status
+    with pool_cm as pool:
+        # call the solver
+        LOGGER.debug("solver run")
+        memory_total = {}
+        time_start = monitor_resource.get_wall_time()
+        with LOGGER.BlockIndent(), monitor_resource.get_memory(memory_total):
+            # first callback with the solution
+            iter_obj.get_callback_init(sol_init)
+
+            # solve the equation system
+            try:
+                # run the solver
+                if sparse_bypass and sys_exact:
+                    (status, sol) = _get_solver_sparse(
+                        fct_pcd_time_cm,
+                        rhs_cm,
+                        pool,
+                        op_obj,
+                        iter_obj,
+                    )
+                elif coupling == "direct":
+                    (status, sol) = _get_solver_direct(
+                        sol_init,
+                        fct_cpl_time_cm,
+                        fct_sys_time_cm,
+                        fct_pcd_iter_cm,
+                        rhs_cm,
+                        direct_options,
+                        inner_options,
+                        pool,
+                        op_obj,
+                        iter_obj,
+                    )
+                elif coupling == "segregated":
+                    (status, sol) = _get_solver_segregated(
+                        sol_init,
+                        fct_cpl_time_cm,
+                        fct_sys_time_cm,
+                        fct_pcd_iter_cm,
+                        rhs_cm,
+                        segregated_options,
+                        op_obj,
+                        iter_obj,
+                    )
+                elif coupling == "refinement":
+                    (status, sol) = _get_solver_refinement(
+                        sol_init,
+                        fct_cpl_time_cm,
+                        fct_sys_time_cm,
+                        fct_pcd_iter_cm,
+                        rhs_cm,
+                        refinement_options,
+                        pool,
+                        op_obj,
+                        iter_obj,
+                    )
+                else:
+                    raise ValueError("invalid coupling method")
+
+                # residuum solver convergence
+                power = False
+            except _PowerConvergenceError as ex:
+                # power solver convergence
+                power = True
+
+                # get the solution
+                status = ex.status
+                sol = ex.sol
+
+            # final callback with the solution
+            iter_obj.get_callback_final(sol)
+
+        # get the operator timing
+        time_end = monitor_resource.get_wall_time()
+        op_timing = op_obj.get_op_timing(time_end - time_start, memory_total)
+
+        # get convergence status
+        (status, residuum, residuum_val, residuum_thr) = _get_status(
+            status,
+            sol,
+            rhs_cm,
+            fct_cpl_cm,
+            fct_sys_cm,
+            status_options,
+            pool,
+        )
 
     # extract operator call statistics
     n_sys_eval = op_obj.get_n_sys_eval()
@@ -549,6 +1035,7 @@ def get_solver(sol_init, fct_cpl_cm, fct_sys_cm, fct_pcd_cm, rhs_cm, fct_conv, s
         "residuum_thr": residuum_thr,
         "status": status,
         "power": power,
+        "op_timing": op_timing,
     }
 
     # display results
@@ -566,6 +1053,15 @@ def get_solver(sol_init, fct_cpl_cm, fct_sys_cm, fct_pcd_cm, rhs_cm, fct_conv, s
         LOGGER.debug("residuum_val = %.2e", residuum_val)
         LOGGER.debug("residuum_thr = %.2e", residuum_thr)
 
+        # display timing
+        for tag, op_timing_tmp in op_timing.items():
+            time_tmp = op_timing_tmp["time"]
+            LOGGER.debug("timing / %s = %.3f s", tag, time_tmp)
+
+        # display memory
+        for tag, mem_tmp in memory_total.items():
+            LOGGER.debug("%s = %.2f MB", tag, mem_tmp / (1024**2))
+
         # display status
         if status:
             LOGGER.debug("convergence achieved")
@@ -578,30 +1074,107 @@ def get_solver(sol_init, fct_cpl_cm, fct_sys_cm, fct_pcd_cm, rhs_cm, fct_conv, s
 def get_factorization(pcd_mat_cm, factorization_options):
     """
     Factorize the preconditioner (sparse matrices).
+    The factorized matrices (and the solvers, if available) are returned for the condition check.
+    The electric and magnetic matrices can be factorized concurrently (thread pool).
+    The concurrent factorization is not supported for PARDISO (process-global thread settings).
     """
 
     # extract matrices
     (pcd_mat_c, pcd_mat_m) = pcd_mat_cm
 
-    # factorize the electric system
-    LOGGER.debug("factorization / electric")
-    with LOGGER.BlockIndent():
-        (fct_c, C_mat_c) = matrix_factorization.get_factorize(pcd_mat_c, factorization_options)
+    # extract the options
+    concurrent = factorization_options["concurrent"]
+    library = factorization_options["library"]
 
-    # factorize the magnetic system
-    LOGGER.debug("factorization / magnetic")
-    with LOGGER.BlockIndent():
-        (fct_m, C_mat_m) = matrix_factorization.get_factorize(pcd_mat_m, factorization_options)
+    # the PARDISO factorizations are multithreaded and computed sequentially
+    if concurrent and (library == "PARDISO"):
+        LOGGER.debug("factorization / concurrent factorization not supported for PARDISO")
+        concurrent = False
+
+    # check if both matrices are present
+    n_pcd_c = pcd_mat_c["mat_11"].shape[0] + pcd_mat_c["mat_22"].shape[0]
+    n_pcd_m = pcd_mat_m["mat_11"].shape[0] + pcd_mat_m["mat_22"].shape[0]
+    concurrent = concurrent and (n_pcd_c > 0) and (n_pcd_m > 0)
+
+    # factorize the electric and magnetic systems
+    if concurrent:
+        LOGGER.debug("factorization / electric and magnetic / concurrent")
+        with LOGGER.BlockIndent():
+            with cf.ThreadPoolExecutor(max_workers=2) as pool:
+                future_c = pool.submit(matrix_factorization.get_factorize, pcd_mat_c, factorization_options)
+                future_m = pool.submit(matrix_factorization.get_factorize, pcd_mat_m, factorization_options)
+                (fct_c, mat_c, fct_inv_c) = future_c.result()
+                (fct_m, mat_m, fct_inv_m) = future_m.result()
+    else:
+        LOGGER.debug("factorization / electric")
+        with LOGGER.BlockIndent():
+            (fct_c, mat_c, fct_inv_c) = matrix_factorization.get_factorize(pcd_mat_c, factorization_options)
+
+        LOGGER.debug("factorization / magnetic")
+        with LOGGER.BlockIndent():
+            (fct_m, mat_m, fct_inv_m) = matrix_factorization.get_factorize(pcd_mat_m, factorization_options)
 
     # combine the electric and magnetic data (factorization operator)
     fct_cm = (fct_c, fct_m)
 
-    # combine the electric and magnetic data (factorization operator)
-    C_mat_cm = (C_mat_c, C_mat_m)
+    # combine the electric and magnetic data (factorized matrices and solvers)
+    C_mat_cm = ((mat_c, fct_inv_c), (mat_m, fct_inv_m))
 
     return fct_cm, C_mat_cm
 
 
+def _get_pcd_multilevel(fct_pcd, fct_sys, fct_coarse):
+    """
+    Get a two-level preconditioner (coarse correction and fine smoothing).
+    The coarse system is solved with the dense factorization.
+    The fine system is smoothed with the sparse preconditioner.
+    Each evaluation requires an additional evaluation of the system operator.
+    """
+
+    # function describing the two-level preconditioner
+    def fct(rhs):
+        # coarse correction
+        sol = fct_coarse(rhs)
+
+        # fine smoothing of the remaining residuum
+        res = rhs - fct_sys(sol)
+        sol = sol + fct_pcd(res)
+
+        return sol
+
+    return fct
+
+
+def get_multilevel(coarse_mat):
+    """
+    Factorize the coarse system (multilevel preconditioner, electric domains).
+    The coarse system is dense and small (bounded size), a dense LU factorization is used.
+    The returned operator is projecting, solving, and prolongating the coarse system.
+    """
+
+    # check if the coarse system is used
+    if coarse_mat is None:
+        return None
+
+    # extract the coarse data
+    mat_c = coarse_mat["mat_c"]
+    P_mat = coarse_mat["P_mat"]
+
+    # factorize the coarse system
+    LOGGER.debug("multilevel / size = %d", len(mat_c))
+    lu_c = lna.lu_factor(mat_c, check_finite=False)
+
+    # function describing the coarse correction
+    def fct(rhs):
+        rhs_c = P_mat.transpose() * rhs
+        sol_c = lna.lu_solve(lu_c, rhs_c, check_finite=False)
+        sol = P_mat * sol_c
+
+        return sol
+
+    return fct
+
+
 def get_condition(cond_mat_cm, conditions_options):
     """
     Compute an estimate of the condition number (norm 1) of the sparse system.
@@ -613,19 +1186,20 @@ def get_condition(cond_mat_cm, conditions_options):
     tolerance_electric = conditions_options["tolerance_electric"]
     tolerance_magnetic = conditions_options["tolerance_magnetic"]
     norm_options = conditions_options["norm_options"]
+    cache_options = conditions_options["cache_options"]
 
-    # extract matrices
-    (cond_mat_c, cond_mat_m) = cond_mat_cm
+    # extract matrices and solvers
+    ((cond_mat_c, fct_inv_c), (cond_mat_m, fct_inv_m)) = cond_mat_cm
 
     # check the condition
     if check:
         LOGGER.debug("condition / electric")
         with LOGGER.BlockIndent():
-            cond_electric = matrix_condition.get_condition_matrix(cond_mat_c, norm_options)
+            cond_electric = matrix_condition.get_condition_matrix(cond_mat_c, fct_inv_c, norm_options, cache_options)
 
         LOGGER.debug("condition / magnetic")
         with LOGGER.BlockIndent():
-            cond_magnetic = matrix_condition.get_condition_matrix(cond_mat_m, norm_options)
+            cond_magnetic = matrix_condition.get_condition_matrix(cond_mat_m, fct_inv_m, norm_options, cache_options)
 
         status = (cond_electric < tolerance_electric) and (cond_magnetic < tolerance_magnetic)
     else:
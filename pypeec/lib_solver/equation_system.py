@@ -85,12 +85,14 @@ It should be noted that surface charges are not considered.
 Only volume charges are used, which is an approximation.
 
 For the preconditioner, the following simplifications are made:
-    - The dense inductance matrix is diagonalized.
+    - The dense inductance matrix is truncated to the near-field coefficients.
     - The dense potential matrix is diagonalized.
     - The electric-magnetic coupling matrices are neglected.
 
 With these assumptions, a sparse (electric and magnetic) equation system is obtained.
 The preconditioner is solved separately for the electric and magnetic equations.
+For DC problems without magnetic domains, the preconditioner is exact (no dense matrices).
+For such cases, the full system can be solved with a single sparse solve.
 
 The preconditioner matrices (electric and magnetic) have the following form:
     [
@@ -98,7 +100,9 @@ The preconditioner matrices (electric and magnetic) have the following form:
         mat_21,    mat_22;
     ]
 
-The first block matrix (mat_11) is diagonal and the Schur complement can be used.
+If the near-field inductances are restricted to the self-inductances:
+    - The first block matrix (mat_11) is diagonal and the Schur complement can be used.
+    - Otherwise, the Schur complement cannot be used for the electric preconditioner.
 
 For the full equation system, the complete dense matrices are used:
     - The system is split in three parts: electric, magnetic, and electric-magnetic coupling.
@@ -177,7 +181,7 @@ def _get_cond_fact_electric(freq, A_net_c, R_c, L_c, A_src):
     Compute the sparse matrices using for the electric preconditioner.
 
     The equation system has the following size: n_fc+n_vc+n_src_c+n_src_v.
-    The first (n_fc, n_fc) block is a diagonal matrix:
+    The first (n_fc, n_fc) block is a sparse matrix (near-field inductances).
     """
 
     # get the matrices
@@ -193,7 +197,8 @@ def _get_cond_fact_electric(freq, A_net_c, R_c, L_c, A_src):
     s = 1j * 2 * np.pi * freq
 
     # admittance matrix
-    mat_11 = sps.diags(R_c + s * L_c, format="csc")
+    mat_11 = sps.diags(R_c, format="csc") + s * L_c
+    mat_11 = sps.csc_matrix(mat_11, dtype=np.complex128)
 
     # assemble the matrices
     mat_21 = A_net_c
@@ -434,6 +439,70 @@ def get_cond_operator(freq, A_net_c, A_net_m, A_src, R_c, R_m, L_c, P_m):
     return pcd_mat_cm
 
 
+def get_system_exact(freq, n_vm, n_fm, factorization_options):
+    """
+    Check if the preconditioner is an exact representation of the full system.
+    In this case, the equation system can be solved with a single sparse solve.
+
+    The preconditioner is exact if the following conditions are fulfilled:
+        - The frequency is zero (the inductance matrix vanishes).
+        - The problem has no magnetic domains (the potential and coupling matrices vanish).
+        - The sparse factorization is exact (direct sparse solver).
+    """
+
+    # extract the factorization library
+    library = factorization_options["library"]
+
+    # check the different conditions
+    freq_exact = freq == 0
+    magnetic_exact = (n_vm + n_fm) == 0
+    library_exact = library in ["SuperLU", "PARDISO"]
+
+    # combine the conditions
+    sys_exact = freq_exact and magnetic_exact and library_exact
+
+    return sys_exact
+
+
+def get_operator_cache(op):
+    """
+    Get a linear operator caching the last matrix-vector product.
+    If the operator is called with the same input vector, the cached product is returned.
+
+    The input vectors are compared by identity and by value:
+        - For read-only input vectors, the identity is checked first (no comparison of the values).
+        - Otherwise, the input vectors are compared by value (slices of the solution vectors are used).
+
+    The returned products are read-only (the cached product cannot be modified by the caller).
+    """
+
+    # init the cache (input vector, copy of the input vector, and output vector)
+    cache = [None, None, None]
+
+    # function describing the matrix-vector multiplication
+    def op_cache(vec_in):
+        # extract the cache
+        (vec_in_ref, vec_in_cache, vec_out_cache) = cache
+
+        # check if the cached product can be used (identity and then value)
+        if vec_in_cache is not None:
+            if (vec_in is vec_in_ref) and (not vec_in.flags.writeable):
+                return vec_out_cache
+            if np.array_equal(vec_in, vec_in_cache):
+                return vec_out_cache
+
+        # compute the product (read-only)
+        vec_out = op(vec_in)
+        vec_out.flags.writeable = False
+
+        # update the cache (single assignment)
+        cache[:] = [vec_in, np.copy(vec_in), vec_out]
+
+        return vec_out
+
+    return op_cache
+
+
 def get_coupling_operator(freq, n_vc, n_fc, n_vm, n_fm, n_src, K_op_c, K_op_m):
     """
     Get linear operators that represent the electric-magnetic couplings.
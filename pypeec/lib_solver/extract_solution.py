@@ -5,6 +5,20 @@ Different functions for extracting the fields and terminal currents and voltages
     - Extract the integral quantities.
     - Extract the source terminal currents and voltages.
     - Compute the magnetic field for the point cloud.
+    - Compute the magnetic field for the voxel grid (FFT).
+
+The field variables are only computed if they are selected (output size and time).
+
+The magnetic field of the point cloud is computed with a blocked kernel:
+    - The points and the sources are split into blocks (limited memory usage).
+    - The contributions of a block are computed with matrix products.
+    - The blocks of points can be computed in parallel (thread pool).
+    - For large point clouds, an octree (Barnes-Hut) can be used for the far-field.
+
+For problems with symmetry planes, the mirrored sources are added for the point cloud:
+    - The source positions are mirrored with respect to the symmetry planes.
+    - The sources are multiplied with the signs given by the symmetry type.
+    - The vector components normal to the symmetry planes are flipped.
 
 Warning
 -------
@@ -16,123 +30,363 @@ __author__ = "Thomas Guillod"
 __copyright__ = "Thomas Guillod - Dartmouth College"
 __license__ = "Mozilla Public License Version 2.0"
 
+import os
+import itertools
 import scilogger
+import concurrent.futures as cf
 import numpy as np
 import numpy.linalg as lna
 import scipy.constants as cst
+from pypeec.lib_solver import extract_tree
 
 # get a logger
 LOGGER = scilogger.get_logger(__name__, "pypeec")
 
 
+def _get_block_index(n_pts, n_src, size_max):
+    """
+    Split the points and the sources into blocks.
+    The number of point/source pairs in a block is limited (memory budget).
+    """
+
+    # get the block size for the sources
+    n_src_block = max(1, min(n_src, size_max))
+
+    # get the block size for the points
+    n_pts_block = max(1, size_max // n_src_block)
+
+    # get the block indices
+    idx_pts = [np.arange(i, min(i + n_pts_block, n_pts)) for i in range(0, n_pts, n_pts_block)]
+    idx_src = [np.arange(i, min(i + n_src_block, n_src)) for i in range(0, n_src, n_src_block)]
+
+    return idx_pts, idx_src
+
+
+def _get_block_distance(pts, pts_src):
+    """
+    Get the weighted distance components between points and sources.
+    The distance is computed between all the point/source pairs of a block.
+    The distance vectors (from the points to the sources) are divided by the cubed norm.
+    """
+
+    # get the distance components between the points and the sources
+    vx = pts_src[:, 0] - pts[:, 0, np.newaxis]
+    vy = pts_src[:, 1] - pts[:, 1, np.newaxis]
+    vz = pts_src[:, 2] - pts[:, 2, np.newaxis]
+
+    # get the cubed inverse norm of the distance
+    nrm = vx * vx + vy * vy + vz * vz
+    nrm = 1 / (nrm * np.sqrt(nrm))
+
+    # get the weighted distance components
+    vx *= nrm
+    vy *= nrm
+    vz *= nrm
+
+    return vx, vy, vz
+
+
+def _get_block_product(mat, vec):
+    """
+    Multiply a real matrix with a complex vector (or matrix).
+    The real and imaginary parts are split (avoid the complex cast of the matrix).
+    """
+
+    # split the real and imaginary parts
+    vec_split = np.concatenate((vec.real, vec.imag), axis=-1)
+
+    # real matrix product
+    res_split = mat @ vec_split
+
+    # assemble the real and imaginary parts
+    n_col = vec.shape[-1]
+    res = res_split[..., :n_col] + 1j * res_split[..., n_col:]
+
+    return res
+
+
 def _get_biot_savart(pts, pts_src, I_src):
     """
-    Compute the magnetic field at a specified point.
-    The field is created by many currents.
+    Compute the magnetic field for a block of points.
+    The field is created by a block of currents.
     """
 
-    # get the distance between the points and the voxels
-    vec = pts - pts_src
+    # get the weighted distance between the points and the sources
+    (vx, vy, vz) = _get_block_distance(pts, pts_src)
 
-    # get the norm of the distance
-    nrm = lna.norm(vec, axis=1, keepdims=True)
+    # compute the products between the distances and the currents
+    Px = _get_block_product(vx, I_src)
+    Py = _get_block_product(vy, I_src)
+    Pz = _get_block_product(vz, I_src)
 
-    # compute the Biot-Savart contributions
-    H_all = (1 / (4 * np.pi)) * (np.cross(I_src, vec, axis=1) / (nrm**3))
+    # compute the sum of the Biot-Savart contributions (cross product)
+    H_pts = np.zeros((len(pts), 3), dtype=np.complex128)
+    H_pts[:, 0] = Py[:, 2] - Pz[:, 1]
+    H_pts[:, 1] = Pz[:, 0] - Px[:, 2]
+    H_pts[:, 2] = Px[:, 1] - Py[:, 0]
 
-    # sum the contributions
-    H_pts = np.sum(H_all, axis=0)
+    # scale the contributions
+    H_pts *= 1 / (4 * np.pi)
 
     return H_pts
 
 
 def _get_magnetic_charge(pts, pts_src, I_src):
     """
-    Compute the magnetic field at a specified point.
-    The field is created by many magnetic charge.
+    Compute the magnetic field for a block of points.
+    The field is created by a block of magnetic charges.
+    """
+
+    # get the weighted distance between the points and the sources
+    (vx, vy, vz) = _get_block_distance(pts, pts_src)
+
+    # compute the sum of the charge contributions
+    H_pts = np.zeros((len(pts), 3), dtype=np.complex128)
+    H_pts[:, 0] = _get_block_product(vx, I_src[:, np.newaxis])[:, 0]
+    H_pts[:, 1] = _get_block_product(vy, I_src[:, np.newaxis])[:, 0]
+    H_pts[:, 2] = _get_block_product(vz, I_src[:, np.newaxis])[:, 0]
+
+    # scale the contributions
+    H_pts *= 1 / (4 * np.pi * cst.mu_0)
+
+    return H_pts
+
+
+def _get_field_block(tag, fct_kernel, pts_cloud, pts_src, I_src, field_options):
+    """
+    Compute the magnetic field for the point cloud with a blocked kernel.
+    The points and the sources are split into blocks (limited memory usage).
+    The blocks of points can be computed in parallel with a thread pool.
+
+    The contributions of the sources are computed with the following methods:
+        - "direct" for a direct summation over all the sources.
+        - "tree" for an octree (Barnes-Hut) with multipole expansions.
     """
 
-    # get the distance between the points and the voxels
-    vec = pts_src - pts
+    # extract the options
+    method = field_options["method"]
+    size_max = field_options["size_max"]
+    n_thread = field_options["n_thread"]
+    tree_options = field_options["tree_options"]
 
-    # get the norm of the distance
-    nrm = lna.norm(vec, axis=1, keepdims=True)
+    # find the number of threads (negative values are counted from the number of cores)
+    if n_thread < 0:
+        n_thread = os.cpu_count() + n_thread + 1
+    n_thread = max(1, n_thread)
 
-    # transform the charge into a vector
-    I_src = np.tile(I_src, (3, 1)).transpose()
+    # init the magnetic field
+    H_pts = np.zeros((len(pts_cloud), 3), dtype=np.complex128)
 
-    # compute the charge contributions
-    H_all = (1 / (4 * np.pi * cst.mu_0)) * ((I_src * vec) / (nrm**3))
+    # check for empty data
+    if (len(pts_cloud) == 0) or (len(pts_src) == 0):
+        return H_pts
+
+    # get the function computing the field for a block of points
+    if method == "direct":
+        # get the blocks
+        (idx_pts, idx_src) = _get_block_index(len(pts_cloud), len(pts_src), size_max)
+
+        # sum over the blocks of sources
+        def fct_block(idx_pts_tmp):
+            for idx_src_tmp in idx_src:
+                H_pts[idx_pts_tmp] += fct_kernel(pts_cloud[idx_pts_tmp], pts_src[idx_src_tmp], I_src[idx_src_tmp])
+    elif method == "tree":
+        # get the blocks (the leaves are limiting the number of sources)
+        n_leaf = tree_options["n_leaf"]
+        (idx_pts, _) = _get_block_index(len(pts_cloud), n_leaf, size_max)
+
+        # create the octree
+        node = extract_tree.get_tree(tag, pts_src, I_src, tree_options)
+
+        # traverse the octree
+        def fct_block(idx_pts_tmp):
+            H_pts[idx_pts_tmp] = extract_tree.get_field_tree(tag, fct_kernel, pts_cloud[idx_pts_tmp], pts_src, I_src, node, tree_options)
+    else:
+        raise ValueError("invalid field computation method")
 
-    # sum the contributions
-    H_pts = np.sum(H_all, axis=0)
+    # compute the field for all the blocks (the blocks of points are independent)
+    if (n_thread == 1) or (len(idx_pts) == 1):
+        for idx_pts_tmp in idx_pts:
+            fct_block(idx_pts_tmp)
+    else:
+        with cf.ThreadPoolExecutor(max_workers=n_thread) as pool:
+            list(pool.map(fct_block, idx_pts))
 
     return H_pts
 
 
-def get_magnetic_field_electric(n, d, idx_fc, A_net_c, I_fc, pts_net_c, pts_cloud, biot_savart):
+def _get_image_source(pts_src, I_src, sym_axis, sym_sign):
+    """
+    Add the mirrored sources (for all the combinations of symmetry planes).
+    The sources are either vectors (current elements) or scalars (magnetic charges).
+    """
+
+    # get the mirrored dimensions
+    dim_list = sorted(sym_axis.keys())
+
+    # init the sources
+    pts_all = [pts_src]
+    I_all = [I_src]
+
+    # add the mirrored sources
+    for n_axis in range(1, len(dim_list) + 1):
+        for axis in itertools.combinations(dim_list, n_axis):
+            # copy the sources
+            pts_tmp = pts_src.copy()
+            I_tmp = I_src.copy()
+
+            # mirror the sources
+            for dim in axis:
+                pts_tmp[:, dim] = 2 * sym_axis[dim]["coord"] - pts_tmp[:, dim]
+                I_tmp *= sym_sign[dim]
+                if I_tmp.ndim == 2:
+                    I_tmp[:, dim] *= -1
+
+            # add the sources
+            pts_all.append(pts_tmp)
+            I_all.append(I_tmp)
+
+    # assemble the sources
+    pts_all = np.concatenate(pts_all, axis=0)
+    I_all = np.concatenate(I_all, axis=0)
+
+    return pts_all, I_all
+
+
+def _get_voxel_current(d, dir_fc, A_net_c, I_fc):
+    """
+    Project the face currents into the voxels (current elements).
+    """
+
+    # extract the voxel data
+    (dx, dy, dz) = d
+
+    # get the direction of the faces (x, y, z)
+    slc_x = dir_fc["slc_x"]
+    slc_y = dir_fc["slc_y"]
+    slc_z = dir_fc["slc_z"]
+
+    # project the faces current into the voxels
+    I_vc = np.zeros((A_net_c.shape[0], 3), dtype=np.complex128)
+    I_vc[:, 0] = dx * 0.5 * np.abs(A_net_c[:, slc_x]) * I_fc[slc_x]
+    I_vc[:, 1] = dy * 0.5 * np.abs(A_net_c[:, slc_y]) * I_fc[slc_y]
+    I_vc[:, 2] = dz * 0.5 * np.abs(A_net_c[:, slc_z]) * I_fc[slc_z]
+
+    return I_vc
+
+
+def get_magnetic_field_electric(d, dir_fc, A_net_c, I_fc, pts_net_c, pts_cloud, sym_axis, sym_c, biot_savart, field_options):
     """
     Compute the magnetic field for the provided points (contributions of the electric domains).
     The Biot-Savart law is used for the electric material contribution.
+    The mirrored currents are added for the symmetry planes.
     """
 
     # extract the voxel data
     (dx, dy, dz) = d
 
-    # get total size
-    nv = np.prod(n)
-
     # get the direction of the faces (x, y, z)
-    idx_fx = np.isin(idx_fc, np.arange(0 * nv, 1 * nv, dtype=np.int64))
-    idx_fy = np.isin(idx_fc, np.arange(1 * nv, 2 * nv, dtype=np.int64))
-    idx_fz = np.isin(idx_fc, np.arange(2 * nv, 3 * nv, dtype=np.int64))
+    slc_x = dir_fc["slc_x"]
+    slc_y = dir_fc["slc_y"]
+    slc_z = dir_fc["slc_z"]
 
     if biot_savart == "voxel":
         # get the voxel positions
         pts_src = pts_net_c
 
         # project the faces current into the voxels
-        I_src = np.zeros((len(pts_net_c), 3), dtype=np.complex128)
-        I_src[:, 0] = dx * 0.5 * np.abs(A_net_c[:, idx_fx]) * I_fc[idx_fx]
-        I_src[:, 1] = dy * 0.5 * np.abs(A_net_c[:, idx_fy]) * I_fc[idx_fy]
-        I_src[:, 2] = dz * 0.5 * np.abs(A_net_c[:, idx_fz]) * I_fc[idx_fz]
+        I_src = _get_voxel_current(d, dir_fc, A_net_c, I_fc)
     elif biot_savart == "face":
         # get the face positions
         pts_src = 0.5 * np.abs(A_net_c.transpose()) * pts_net_c
 
         # get the face currents as vector
         I_src = np.zeros((len(I_fc), 3), dtype=np.complex128)
-        I_src[idx_fx, 0] = dx * I_fc[idx_fx]
-        I_src[idx_fy, 1] = dy * I_fc[idx_fy]
-        I_src[idx_fz, 2] = dz * I_fc[idx_fz]
+        I_src[slc_x, 0] = dx * I_fc[slc_x]
+        I_src[slc_y, 1] = dy * I_fc[slc_y]
+        I_src[slc_z, 2] = dz * I_fc[slc_z]
+
+        # faces on the symmetry planes (half of the face is located in the mirrored structure)
+        idx_plane = dir_fc["idx_plane"]
+        idx_dir = dir_fc["idx_dir"][idx_plane]
+        pts_src[idx_plane] *= 2
+        pts_src[idx_plane, idx_dir] -= 0.5 * np.array(d, dtype=np.float64)[idx_dir]
+        I_src[idx_plane] *= 0.5
     else:
         raise ValueError("invalid field computation method")
 
-    # for each provided point, compute the magnetic field
-    H_pts = np.zeros((len(pts_cloud), 3), dtype=np.complex128)
-    for i, pts_tmp in enumerate(pts_cloud):
-        H_pts[i, :] = _get_biot_savart(pts_tmp, pts_src, I_src)
+    # add the mirrored currents
+    (pts_src, I_src) = _get_image_source(pts_src, I_src, sym_axis, sym_c)
+
+    # compute the magnetic field for the provided points
+    H_pts = _get_field_block("current", _get_biot_savart, pts_cloud, pts_src, I_src, field_options)
 
     return H_pts
 
 
-def get_magnetic_field_magnetic(A_net_m, I_fm, pts_net_m, pts_cloud):
+def get_magnetic_field_magnetic(A_net_m, I_fm, pts_net_m, pts_cloud, sym_axis, sym_m, field_options):
     """
     Compute the magnetic field for the provided points (contributions of the magnetic domains).
     The magnetic charge is used for the magnetic material contribution.
+    The mirrored charges are added for the symmetry planes.
     """
 
     # compute the divergence
     var_v = A_net_m * I_fm
 
-    # for each provided point, compute the magnetic field
-    H_pts = np.zeros((len(pts_cloud), 3), dtype=np.complex128)
-    for i, pts_tmp in enumerate(pts_cloud):
-        H_pts[i, :] = _get_magnetic_charge(pts_tmp, pts_net_m, var_v)
+    # add the mirrored charges
+    (pts_net_m, var_v) = _get_image_source(pts_net_m, var_v, sym_axis, sym_m)
+
+    # compute the magnetic field for the provided points
+    H_pts = _get_field_block("charge", _get_magnetic_charge, pts_cloud, pts_net_m, var_v, field_options)
 
     return H_pts
 
 
+def get_magnetic_field_grid(d, dir_fc, A_net_c, A_net_m, I_fc, I_fm, F_op_c, F_op_m):
+    """
+    Compute the magnetic field for the complete voxel grid (voxel centers).
+    The electric contribution is computed with the voxel currents (Biot-Savart law).
+    The magnetic contribution is computed with the voxel charges (magnetic charge law).
+    The convolutions are computed with FFT circulant tensors (field operators).
+    """
+
+    # project the faces current into the voxels
+    I_vc = _get_voxel_current(d, dir_fc, A_net_c, I_fc)
+
+    # compute the divergence
+    var_vm = A_net_m * I_fm
+
+    # compute the contributions of the electric and magnetic domains
+    H_c = (+1 / (4 * np.pi)) * F_op_c(I_vc)
+    H_m = (-1 / (4 * np.pi * cst.mu_0)) * F_op_m(var_vm)
+
+    # assemble the magnetic field
+    H_grid = H_c + H_m
+
+    return H_grid
+
+
+def get_output_select(output_options):
+    """
+    Get the field variables to be extracted and stored.
+    If the selection is not specified, all the field variables are extracted.
+    """
+
+    # extract the options
+    field_select = output_options["field_select"]
+    keep_solution = output_options["keep_solution"]
+
+    # get the selected fields
+    if field_select is None:
+        field_select = ["V_c", "P_c", "S_c", "J_c", "V_m", "P_m", "Q_m", "B_m", "H_p", "H_g"]
+
+    # remove duplicates
+    field_select = set(field_select)
+
+    return field_select, keep_solution
+
+
 def get_sol_extract(sol, sol_idx):
     """
     Extract the different variables from the solution vector.
@@ -147,7 +401,7 @@ def get_sol_extract(sol, sol_idx):
     return I_fc, V_vc, I_fm, V_vm, I_src
 
 
-def get_vector_density(n, d, idx_f, A_net, var_f):
+def get_vector_density(d, dir_f, A_net, var_f):
     """
     Project a face vector variable into a voxel vector variable.
     Scale the variable with respect to the face area (density).
@@ -159,18 +413,15 @@ def get_vector_density(n, d, idx_f, A_net, var_f):
     # extract the voxel data
     (dx, dy, dz) = d
 
-    # get total size
-    nv = np.prod(n)
-
     # get the direction of the faces (x, y, z)
-    idx_fx = np.isin(idx_f, np.arange(0 * nv, 1 * nv, dtype=np.int64))
-    idx_fy = np.isin(idx_f, np.arange(1 * nv, 2 * nv, dtype=np.int64))
-    idx_fz = np.isin(idx_f, np.arange(2 * nv, 3 * nv, dtype=np.int64))
+    slc_x = dir_f["slc_x"]
+    slc_y = dir_f["slc_y"]
+    slc_z = dir_f["slc_z"]
 
     # project the faces into the voxels
-    var_v_x = 0.5 * np.abs(A_net[:, idx_fx]) * var_f[idx_fx]
-    var_v_y = 0.5 * np.abs(A_net[:, idx_fy]) * var_f[idx_fy]
-    var_v_z = 0.5 * np.abs(A_net[:, idx_fz]) * var_f[idx_fz]
+    var_v_x = 0.5 * np.abs(A_net[:, slc_x]) * var_f[slc_x]
+    var_v_y = 0.5 * np.abs(A_net[:, slc_y]) * var_f[slc_y]
+    var_v_z = 0.5 * np.abs(A_net[:, slc_z]) * var_f[slc_z]
 
     # convert to density.
     var_v_x = var_v_x / (dy * dz)
@@ -0,0 +1,210 @@
+"""
+Different functions for computing the magnetic field of the point cloud with an octree (Barnes-Hut).
+
+The sources are sorted into an octree:
+    - The nodes are recursively split into eight octants.
+    - The nodes with few sources are not split (leaves).
+    - The multipole moments of the sources are computed for each node.
+
+The magnetic field is computed by traversing the octree:
+    - The far-field contributions of a node are computed with a multipole expansion.
+    - A node is considered in the far-field if the opening angle is small enough.
+    - The near-field contributions of the leaves are computed with the direct kernel.
+
+The multipole expansion is done around the geometric center of the nodes:
+    - The monopole and dipole terms are considered (first-order Taylor expansion).
+    - The error of the expansion scales with the square of the opening angle.
+    - With an opening angle of zero, the direct kernel is used for all the sources.
+
+Two types of sources are considered:
+    - "current" for current elements (Biot-Savart law).
+    - "charge" for magnetic charges (magnetic charge law).
+"""
+
+__author__ = "Thomas Guillod"
+__copyright__ = "Thomas Guillod - Dartmouth College"
+__license__ = "Mozilla Public License Version 2.0"
+
+import scilogger
+import numpy as np
+import scipy.constants as cst
+
+# get a logger
+LOGGER = scilogger.get_logger(__name__, "pypeec")
+
+
+def _get_moment(tag, pts_src, I_src, center):
+    """
+    Compute the multipole moments of the sources (with respect to a center).
+    """
+
+    # get the distance between the sources and the center
+    vec = pts_src - center
+
+    # compute the moments
+    if tag == "current":
+        mom_0 = np.sum(I_src, axis=0)
+        mom_1 = np.einsum("sj,sk->jk", vec, I_src)
+    elif tag == "charge":
+        mom_0 = np.sum(I_src, axis=0)
+        mom_1 = np.einsum("sj,s->j", vec, I_src)
+    else:
+        raise ValueError("invalid source type")
+
+    return mom_0, mom_1
+
+
+def _get_expansion(tag, pts, center, mom_0, mom_1):
+    """
+    Compute the magnetic field with the multipole expansion of a node.
+    The monopole and the dipole terms are considered.
+    """
+
+    # get the distance between the points and the center
+    vec = pts - center
+
+    # get the inverse norms of the distance
+    nrm = np.sqrt(np.sum(vec**2, axis=1, keepdims=True))
+    nrm_3 = 1 / (nrm**3)
+    nrm_5 = 1 / (nrm**5)
+
+    if tag == "current":
+        # antisymmetric part of the dipole moment
+        mom_a = np.array(
+            [
+                mom_1[2, 1] - mom_1[1, 2],
+                mom_1[0, 2] - mom_1[2, 0],
+                mom_1[1, 0] - mom_1[0, 1],
+            ]
+        )
+
+        # projection of the dipole moment on the distance
+        mom_p = vec @ mom_1
+
+        # monopole and dipole terms
+        H_0 = nrm_3 * np.cross(mom_0, vec)
+        H_1 = nrm_3 * mom_a - 3 * nrm_5 * np.cross(mom_p, vec)
+
+        # scale the contributions
+        H_pts = (1 / (4 * np.pi)) * (H_0 - H_1)
+    elif tag == "charge":
+        # projection of the dipole moment on the distance
+        mom_p = vec @ mom_1
+
+        # monopole and dipole terms
+        H_0 = nrm_3 * mom_0 * vec
+        H_1 = nrm_3 * mom_1 - 3 * nrm_5 * mom_p[:, np.newaxis] * vec
+
+        # scale the contributions
+        H_pts = (-1 / (4 * np.pi * cst.mu_0)) * (H_0 - H_1)
+    else:
+        raise ValueError("invalid source type")
+
+    return H_pts
+
+
+def _get_node(tag, pts_src, I_src, idx_src, n_leaf):
+    """
+    Create an octree node (recursive split into octants).
+    """
+
+    # get the bounding box of the sources
+    pts_min = np.min(pts_src[idx_src], axis=0)
+    pts_max = np.max(pts_src[idx_src], axis=0)
+
+    # get the center and the radius of the node
+    center = (pts_min + pts_max) / 2
+    radius = np.sqrt(np.sum((pts_max - pts_min) ** 2)) / 2
+
+    # get the multipole moments
+    (mom_0, mom_1) = _get_moment(tag, pts_src[idx_src], I_src[idx_src], center)
+
+    # check if the node is a leaf (few sources or coincident sources)
+    if (len(idx_src) <= n_leaf) or (radius == 0):
+        children = []
+    else:
+        # get the octant of the sources
+        octant = pts_src[idx_src] > center
+        octant = 4 * octant[:, 0] + 2 * octant[:, 1] + 1 * octant[:, 2]
+
+        # create the children
+        children = []
+        for i in range(8):
+            idx_tmp = idx_src[octant == i]
+            if len(idx_tmp) > 0:
+                children.append(_get_node(tag, pts_src, I_src, idx_tmp, n_leaf))
+
+    # assemble the node
+    node = {
+        "center": center,
+        "radius": radius,
+        "idx_src": idx_src,
+        "mom_0": mom_0,
+        "mom_1": mom_1,
+        "children": children,
+    }
+
+    return node
+
+
+def get_tree(tag, pts_src, I_src, tree_options):
+    """
+    Create the octree containing the sources.
+    """
+
+    # extract the options
+    n_leaf = tree_options["n_leaf"]
+
+    # create the octree (recursively)
+    idx_src = np.arange(len(pts_src), dtype=np.int64)
+    node = _get_node(tag, pts_src, I_src, idx_src, n_leaf)
+
+    return node
+
+
+def get_field_tree(tag, fct_kernel, pts, pts_src, I_src, node, tree_options):
+    """
+    Compute the magnetic field for a block of points by traversing the octree.
+    The near-field contributions of the leaves are computed with the direct kernel.
+    """
+
+    # extract the options
+    theta = tree_options["theta"]
+
+    # init the magnetic field
+    H_pts = np.zeros((len(pts), 3), dtype=np.complex128)
+
+    # traverse the octree (the nodes are stored with the points to be computed)
+    stack = [(node, np.arange(len(pts), dtype=np.int64))]
+    while stack:
+        (node, idx_pts) = stack.pop()
+
+        # extract the node
+        center = node["center"]
+        radius = node["radius"]
+        idx_src = node["idx_src"]
+        mom_0 = node["mom_0"]
+        mom_1 = node["mom_1"]
+        children = node["children"]
+
+        # get the distance between the points and the node
+        dist = np.sqrt(np.sum((pts[idx_pts] - center) ** 2, axis=1))
+
+        # find the points in the far-field (opening angle criterion)
+        idx_far = radius < (theta * dist)
+        idx_near = idx_pts[np.logical_not(idx_far)]
+        idx_far = idx_pts[idx_far]
+
+        # compute the far-field contributions with the multipole expansion
+        if len(idx_far) > 0:
+            H_pts[idx_far] += _get_expansion(tag, pts[idx_far], center, mom_0, mom_1)
+
+        # compute the near-field contributions
+        if len(idx_near) > 0:
+            if children:
+                for child in children:
+                    stack.append((child, idx_near))
+            else:
+                H_pts[idx_near] += fct_kernel(pts[idx_near], pts_src[idx_src], I_src[idx_src])
+
+    return H_pts
@@ -0,0 +1,160 @@
+"""
+Module for monitoring the resources used by the solver (time and memory).
+
+The following metrics are available:
+    - Wall time (monotonic clock).
+    - CPU time of the process (all threads).
+    - Current memory usage of the process (resident set size).
+
+The memory usage is obtained from the operating system:
+    - The current memory is only available on Linux systems (proc filesystem).
+    - On other systems, the memory usage is not available (NaN).
+
+The metrics can be recorded for the different stages of the solver:
+    - The current memory is recorded at the start and at the end of the stage.
+    - The peak memory of the stage is sampled with a background thread.
+"""
+
+__author__ = "Thomas Guillod"
+__copyright__ = "Thomas Guillod - Dartmouth College"
+__license__ = "Mozilla Public License Version 2.0"
+
+import os
+import time
+import threading
+import contextlib
+
+# interval between the memory samples (in seconds)
+SAMPLE_INTERVAL = 0.01
+
+
+def get_wall_time():
+    """
+    Get the wall time (in seconds).
+    """
+
+    return time.perf_counter()
+
+
+def get_cpu_time():
+    """
+    Get the CPU time of the process (in seconds).
+    """
+
+    return time.process_time()
+
+
+def get_current_memory():
+    """
+    Get the current memory usage of the process (in bytes).
+    """
+
+    # read the resident set size (in pages)
+    try:
+        with open("/proc/self/statm") as fid:
+            rss = int(fid.read().split()[1])
+        page = os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return float("nan")
+
+    return float(rss * page)
+
+
+class _MemorySampler:
+    """
+    Simple class used for sampling the current memory usage with a background thread.
+    The maximum of the samples is recorded (sampled peak memory).
+    """
+
+    def __init__(self):
+        """
+        Constructor.
+        Start the sampling thread.
+        """
+
+        # init the peak with the current memory
+        self.memory_start = get_current_memory()
+        self.memory_peak = self.memory_start
+
+        # start the sampling thread
+        self.event = threading.Event()
+        self.thread = threading.Thread(target=self._get_sample, daemon=True)
+        self.thread.start()
+
+    def _get_sample(self):
+        """
+        Sample the memory usage until the sampling is stopped.
+        """
+
+        while not self.event.wait(SAMPLE_INTERVAL):
+            self.memory_peak = max(self.memory_peak, get_current_memory())
+
+    def get_stop(self):
+        """
+        Stop the sampling thread.
+        The memory at the start, at the end, and the sampled peak are returned.
+        """
+
+        # stop the sampling thread
+        self.event.set()
+        self.thread.join()
+
+        # get the final sample
+        memory_end = get_current_memory()
+        memory_peak = max(self.memory_peak, memory_end)
+
+        return self.memory_start, memory_end, memory_peak
+
+
+@contextlib.contextmanager
+def get_memory(memory):
+    """
+    Context manager recording the memory used by a block of code.
+    The current memory (start and end) and the sampled peak memory are added to the provided dict.
+    """
+
+    # start the memory sampling
+    sampler = _MemorySampler()
+
+    # run the block
+    try:
+        yield
+    finally:
+        # stop the memory sampling
+        (memory_start, memory_end, memory_peak) = sampler.get_stop()
+
+        # assign the metrics
+        memory["memory_start"] = memory_start
+        memory["memory_end"] = memory_end
+        memory["memory_peak"] = memory_peak
+
+
+@contextlib.contextmanager
+def get_stage(performance, tag):
+    """
+    Context manager recording the resources used by a stage of the solver.
+    The wall time, the CPU time, and the memory usage are added to the provided dict.
+    """
+
+    # init the metrics
+    memory = {}
+
+    # get the metrics at the start of the stage
+    wall_start = get_wall_time()
+    cpu_start = get_cpu_time()
+
+    # run the stage
+    try:
+        with get_memory(memory):
+            yield
+    finally:
+        # get the metrics at the end of the stage
+        wall_end = get_wall_time()
+        cpu_end = get_cpu_time()
+
+        # assign the metrics
+        performance[tag] = {
+            "wall_time": wall_end - wall_start,
+            "cpu_time": cpu_end - cpu_start,
+            **memory,
+        }
@@ -223,35 +223,6 @@ def get_source_pos(source_idx, idx_vc, idx_src_c, idx_src_v):
     return source_idx
 
 
-def get_reduce_matrix(pts_vox, A_vox, idx_v):
-    """
-    Reduce the matrices to the non-empty voxels and compute face indices.
-
-    The voxel structure has the following size: (nx, ny, nz).
-    The problem contains n_v non-empty voxels and n_f internal faces.
-    At the input, the complete coordinate matrix is provided: (nx*ny*nz, 3).
-    At the input, the complete incidence matrix is provided: (nx*ny*nz, 3*nx*ny*nz).
-    At the output, the reduced coordinate matrix is provided: (n_v, 3).
-    At the output, the reduced incidence matrix is provided: (n_v, n_f).
-    The indices of the internal faces are also computed.
-    """
-
-    # reduce the size of the voxel coordinate amtrix
-    pts_net = pts_vox[idx_v, :]
-
-    # reduce the size of the incidence matrix (only the non-empty voxels)
-    A_net = A_vox[idx_v, :]
-
-    # indices of the all the internal faces (global face indices, 0:3*n)
-    idx_f = np.sum(np.abs(A_net), axis=0) == 2
-    idx_f = np.flatnonzero(idx_f)
-
-    # reduce the size of the incidence matrix (only the internal faces)
-    A_net = A_net[:, idx_f]
-
-    return pts_net, A_net, idx_f
-
-
 def get_status(n, idx_vc, idx_vm, idx_fc, idx_fm, idx_src_c, idx_src_v):
     """
     Get a dict summarizing the problem size.
@@ -308,3 +279,71 @@ def get_status(n, idx_vc, idx_vm, idx_fc, idx_fm, idx_src_c, idx_src_v):
     LOGGER.debug("ratio_face = %.2e", ratio_face)
 
     return problem_status
+
+
+def get_symmetry(n, d, c, symmetry_def):
+    """
+    Parse the symmetry planes of the problem.
+    The geometry only contains the reduced structure (half, quarter, or eighth).
+
+    The symmetry planes should be located below the voxel structure:
+        - The plane can be located at the boundary of the voxel structure.
+        - The plane can be separated from the voxel structure with a gap (multiple of the voxel size).
+        - The structure is mirrored in the negative direction.
+
+    The symmetry type describes the electric variables:
+        - even: symmetric potential, no current is crossing the plane.
+        - odd: antisymmetric potential, the plane is at zero potential.
+        - The magnetic variables feature the opposite symmetry type.
+
+    The following data are returned:
+        - sym_axis: dict with the plane coordinate and the image offset (in voxels).
+        - sym_c: dict with the signs of the electric scalar variables (+1 or -1).
+        - sym_m: dict with the signs of the magnetic scalar variables (+1 or -1).
+    """
+
+    # cast to array
+    c = np.array(c, dtype=np.float64)
+    d = np.array(d, dtype=np.float64)
+    n = np.array(n, dtype=np.int64)
+
+    # origin coordinate
+    o = c - (n * d) / 2
+
+    # init
+    sym_axis = {}
+    sym_c = {}
+    sym_m = {}
+
+    for tag, symmetry_def_tmp in symmetry_def.items():
+        # extract the data
+        symmetry_type = symmetry_def_tmp["symmetry_type"]
+        coord = symmetry_def_tmp["coordinate"]
+
+        # get the dimension
+        dim = ["x", "y", "z"].index(tag)
+
+        # get the gap between the plane and the voxel structure (in voxels)
+        gap = (o[dim] - coord) / d[dim]
+        gap_round = np.round(gap)
+        if (gap_round < 0) or (not np.isclose(gap, gap_round)):
+            raise RuntimeError("invalid symmetry: plane should be located below the structure: %s" % tag)
+
+        # get the sign of the scalar variables
+        if symmetry_type == "even":
+            sign = +1
+        elif symmetry_type == "odd":
+            sign = -1
+        else:
+            raise ValueError("invalid symmetry type")
+
+        # assign the data (offset between a voxel and the mirrored voxel)
+        sym_axis[dim] = {"coord": coord, "offset": int(1 + 2 * gap_round)}
+        sym_c[dim] = +sign
+        sym_m[dim] = -sign
+
+    # display the symmetry planes
+    for dim, sym_axis_tmp in sym_axis.items():
+        LOGGER.debug("symmetry / %s / coord = %.3e / sign = %+d", "xyz"[dim], sym_axis_tmp["coord"], sym_c[dim])
+
+    return sym_axis, sym_c, sym_m
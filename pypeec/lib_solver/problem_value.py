@@ -261,7 +261,7 @@ def get_source_vector(source_all, source_type_ref):
     return value_src, element_src
 
 
-def get_resistance_vector(n, d, A_net, idx_f, rho_v):
+def get_resistance_vector(d, A_net, dir_f, rho_v):
     """
     Extract the resistance vector of the system (diagonal of the resistance matrix).
 
@@ -272,21 +272,18 @@ def get_resistance_vector(n, d, A_net, idx_f, rho_v):
     # extract the voxel data
     (dx, dy, dz) = d
 
-    # get total size
-    nv = np.prod(n)
+    # get the direction of the faces (x, y, z)
+    slc_x = dir_f["slc_x"]
+    slc_y = dir_f["slc_y"]
+    slc_z = dir_f["slc_z"]
 
     # get the resistivity of the faces (average between voxels)
     rho = 0.5 * rho_v.transpose() * np.abs(A_net)
 
-    # get the direction of the faces (x, y, z)
-    idx_fx = np.isin(idx_f, np.arange(0 * nv, 1 * nv, dtype=np.int64))
-    idx_fy = np.isin(idx_f, np.arange(1 * nv, 2 * nv, dtype=np.int64))
-    idx_fz = np.isin(idx_f, np.arange(2 * nv, 3 * nv, dtype=np.int64))
-
     # resistance vector (different directions)
-    R = np.zeros(len(idx_f), dtype=np.complex128)
-    R[idx_fx] = (dx / (dy * dz)) * rho[0, idx_fx]
-    R[idx_fy] = (dy / (dx * dz)) * rho[1, idx_fy]
-    R[idx_fz] = (dz / (dx * dy)) * rho[2, idx_fz]
+    R = np.zeros(A_net.shape[1], dtype=np.complex128)
+    R[slc_x] = (dx / (dy * dz)) * rho[0, slc_x]
+    R[slc_y] = (dy / (dx * dz)) * rho[1, slc_y]
+    R[slc_z] = (dz / (dx * dy)) * rho[2, slc_z]
 
     return R
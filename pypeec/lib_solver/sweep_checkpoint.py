@@ -0,0 +1,188 @@
+"""
+Module for saving and restoring the solver state (checkpoint and restart).
+
+Two types of checkpoints are written (one file per sweep):
+    - Iteration checkpoint: current solution and convergence history of the iterative solver.
+    - Sweep checkpoint: results of a completed sweep.
+
+When the solver is restarted:
+    - The completed sweeps are loaded and not computed.
+    - The interrupted sweeps are restarted from the iteration checkpoint.
+
+The checkpoints are identified with a hash of the solver input data and the PyPEEC version.
+Checkpoints created with different input data or different versions are ignored.
+
+The checkpoints are stored with MessagePack (no pickle):
+    - Loading a checkpoint does not execute code.
+    - The checkpoint folder should nevertheless only contain trusted files.
+"""
+
+__author__ = "Thomas Guillod"
+__copyright__ = "Thomas Guillod - Dartmouth College"
+__license__ = "Mozilla Public License Version 2.0"
+
+import os
+import scisave
+import scilogger
+import pypeec
+from pypeec.utils import hashing
+
+# get a logger
+LOGGER = scilogger.get_logger(__name__, "pypeec")
+
+
+def _get_filename(folder, tag, name):
+    """
+    Get the filename of a checkpoint file.
+    """
+
+    filename = os.path.join(folder, "%s_%s.mpk" % (tag, name))
+
+    return filename
+
+
+def _get_load(filename, key):
+    """
+    Load a checkpoint file (None if not found or not matching).
+    """
+
+    # check if the file exists
+    if not os.path.isfile(filename):
+        return None
+
+    # load the checkpoint
+    data = scisave.load_data(filename)
+
+    # check that the checkpoint matches the input data
+    if data["key"] != key:
+        LOGGER.debug("checkpoint / ignore / %s", filename)
+        return None
+
+    return data
+
+
+def _get_write(filename, data):
+    """
+    Write a checkpoint file (atomic replacement of the previous file).
+    """
+
+    # get a temporary file
+    (name, ext) = os.path.splitext(filename)
+    filename_tmp = name + "_tmp" + ext
+
+    # write the file and replace the previous file
+    scisave.write_data(filename_tmp, data)
+    os.replace(filename_tmp, filename)
+
+
+def get_key(tag, data_solver, data_param):
+    """
+    Get a key identifying the input data of a sweep (and the PyPEEC version).
+    The sweep definitions, the parallel options, and the checkpoint options are ignored.
+    """
+
+    # get the relevant input data
+    data_key = {}
+    for name, value in data_solver.items():
+        if name not in ["sweep_solver", "parallel_sweep", "checkpoint_options"]:
+            data_key[name] = value
+
+    # get the key (hash of the data)
+    (_, key) = hashing.get_key("checkpoint", [pypeec.__version__, tag, data_param, data_key])
+
+    return key
+
+
+def get_sweep_load(tag, key, checkpoint_options):
+    """
+    Load the results of a completed sweep (None if not available).
+    """
+
+    # extract the options
+    checkpoint = checkpoint_options["checkpoint"]
+    folder = checkpoint_options["folder"]
+
+    # check if the checkpoints are used
+    if not checkpoint:
+        return None
+
+    # load the data
+    filename = _get_filename(folder, tag, "sweep")
+    data = _get_load(filename, key)
+    if data is None:
+        return None
+
+    # extract the data
+    LOGGER.debug("checkpoint / load / %s", filename)
+    data_sweep = data["data_sweep"]
+    sol = data["sol"]
+
+    return data_sweep, sol
+
+
+def get_sweep_save(tag, key, data_sweep, sol, checkpoint_options):
+    """
+    Save the results of a completed sweep.
+    The iteration checkpoint of the sweep is removed.
+    """
+
+    # extract the options
+    checkpoint = checkpoint_options["checkpoint"]
+    folder = checkpoint_options["folder"]
+
+    # check if the checkpoints are used
+    if not checkpoint:
+        return
+
+    # write the data
+    os.makedirs(folder, exist_ok=True)
+    filename = _get_filename(folder, tag, "sweep")
+    _get_write(filename, {"key": key, "data_sweep": data_sweep, "sol": sol})
+    LOGGER.debug("checkpoint / save / %s", filename)
+
+    # remove the iteration checkpoint
+    filename = _get_filename(folder, tag, "iter")
+    if os.path.isfile(filename):
+        os.remove(filename)
+
+
+def get_iter_checkpoint(tag, key, checkpoint_options):
+    """
+    Get the iteration checkpoint data (None if the checkpoints are not used):
+        - A function for saving the solver state.
+        - The solver state for restarting the solver (None if not available).
+    """
+
+    # extract the options
+    checkpoint = checkpoint_options["checkpoint"]
+    folder = checkpoint_options["folder"]
+    n_iter_save = checkpoint_options["n_iter"]
+
+    # check if the checkpoints are used
+    if not checkpoint:
+        return None
+
+    # load the solver state
+    filename = _get_filename(folder, tag, "iter")
+    data = _get_load(filename, key)
+    if data is None:
+        restart = None
+    else:
+        LOGGER.debug("checkpoint / restart / %s", filename)
+        restart = data["state"]
+
+    # function for saving the solver state
+    def fct_save(state):
+        # only save the state every n_iter iterations
+        if (state["n_iter"] % n_iter_save) != 0:
+            return
+
+        # write the data
+        os.makedirs(folder, exist_ok=True)
+        _get_write(filename, {"key": key, "state": state})
+        LOGGER.debug("checkpoint / save / %s", filename)
+
+    # assign the data
+    checkpoint = {"fct_save": fct_save, "restart": restart}
+
+    return checkpoint
@@ -5,6 +5,11 @@ Interdependency means that the result of a sweep can be used as the input for an
 Build a tree representing the interdependencies between the sweeps.
 Check that the interdependencies are not impossible (no cyclical dependencies).
 Run the sweeps in the correct order and return the results.
+
+The inputs of a sweep are the results of the chain of parent sweeps:
+    - The chain is sorted from the direct parent to the oldest ancestor.
+    - The length of the chain is limited (memory footprint).
+    - The chain is empty for the sweeps without dependencies.
 """
 
 __author__ = "Thomas Guillod"
@@ -98,7 +103,7 @@ def _get_parallel_loop(parallel_sweep, fct_compute, arg_list):
     return out_list
 
 
-def _get_tree_compute(parallel_sweep, sweep_tree, sweep_param, fct_compute, tag_init, output, init):
+def _get_tree_compute(parallel_sweep, sweep_tree, sweep_param, fct_compute, tag_init, n_chain, output, init):
     """
     Compute the sweeps with the dependencies.
     This is done by walking through the graph from the root.
@@ -107,9 +112,9 @@ def _get_tree_compute(parallel_sweep, sweep_tree, sweep_param, fct_compute, tag_
     # find the sweeps to be computed
     tag_sub = sweep_tree[tag_init]
 
-    # find the dependency for the sweeps
+    # find the dependency chain for the sweeps
     if tag_init is None:
-        init_tmp = None
+        init_tmp = []
     else:
         init_tmp = init[tag_init]
 
@@ -126,23 +131,24 @@ def _get_tree_compute(parallel_sweep, sweep_tree, sweep_param, fct_compute, tag_
     out_list = _get_parallel_loop(parallel_sweep, fct_compute, arg_list)
 
     # assemble the results
-    for tag_tmp, out_tmp in zip(tag_sub, out_list, strict=True):
+    for tag_tmp, data_tmp, out_tmp in zip(tag_sub, data_sub, out_list, strict=True):
         (output_tmp, sol_tmp) = out_tmp
         output[tag_tmp] = output_tmp
-        init[tag_tmp] = sol_tmp
+        init[tag_tmp] = [(data_tmp, sol_tmp)] + init_tmp[: n_chain - 1]
 
     # recursive call for the dependent sweeps
     for tag_tmp in tag_sub:
-        (output, init) = _get_tree_compute(parallel_sweep, sweep_tree, sweep_param, fct_compute, tag_tmp, output, init)
+        (output, init) = _get_tree_compute(parallel_sweep, sweep_tree, sweep_param, fct_compute, tag_tmp, n_chain, output, init)
 
     return output, init
 
 
-def get_run_sweep(parallel_sweep, sweep_solver, fct_compute):
+def get_run_sweep(parallel_sweep, sweep_solver, fct_compute, n_chain):
     """
     Build a tree representing the interdependencies between the sweeps.
     Check that the interdependencies are not impossible (no cyclical dependencies).
     Run the sweeps in the correct order and return the results.
+    The results of the parent sweeps are provided as a chain (with a maximum length).
     """
 
     # extract data
@@ -164,6 +170,6 @@ def get_run_sweep(parallel_sweep, sweep_solver, fct_compute):
     init = {}
 
     # compute the sweep in the correct order (starting from the tree root)
-    (output, init) = _get_tree_compute(parallel_sweep, sweep_tree, sweep_param, fct_compute, None, output, init)
+    (output, init) = _get_tree_compute(parallel_sweep, sweep_tree, sweep_param, fct_compute, None, n_chain, output, init)
 
     return output
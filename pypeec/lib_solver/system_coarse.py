@@ -0,0 +1,425 @@
+"""
+Different functions for creating a coarse equation system (multilevel preconditioner).
+
+The coarse system is built from a coarsened voxel structure:
+    - The voxel structure is split into coarse cells (coarsening factor).
+    - The voxels of a coarse cell are aggregated into coarse voxels.
+    - The voxels are only aggregated if they are connected within the coarse cell.
+    - Therefore, conductors separated by gaps are not short-circuited.
+
+The coarse system is only created for the electric equations:
+    - The face currents are aggregated into coarse face currents.
+    - The voxel potentials are aggregated into coarse voxel potentials.
+    - The source variables are not aggregated.
+
+A Galerkin projection is used for the sparse matrices:
+    - The prolongation matrix is mapping the coarse variables to the fine variables.
+    - The restriction matrix is the transposed of the prolongation matrix.
+    - The coarse incidence and source matrices are exact projections.
+
+For the resistance matrix, the faces inside the coarse cells are considered:
+    - The faces between the coarse cells are projected (parallel connection).
+    - The faces inside the coarse cells are aggregated (series connection of the layers).
+    - A coarse face is connected to the half of the coarse voxels at both sides.
+
+For the inductance matrix, the projection is approximated:
+    - The fine Green tensor is averaged over the coarse faces.
+    - The averaging is exact for coarse faces covering complete coarse cells.
+    - The different face directions are not coupled (block diagonal matrix).
+
+The coarse system is a dense matrix (full inductive coupling) solved with a dense LU factorization.
+The size of the coarse system is bounded (maximum number of coarse voxels and faces):
+    - If the coarse system is too large, the coarsening factor is increased.
+    - The memory footprint of the coarse system is quadratic with respect to the size.
+"""
+
+__author__ = "Thomas Guillod"
+__copyright__ = "Thomas Guillod - Dartmouth College"
+__license__ = "Mozilla Public License Version 2.0"
+
+import scilogger
+import numpy as np
+import scipy.sparse as sps
+import scipy.sparse.csgraph as csg
+import scipy.constants as cst
+
+# get a logger
+LOGGER = scilogger.get_logger(__name__, "pypeec")
+
+
+def _get_face_voxel(A_net):
+    """
+    Get the voxels connected by the internal faces.
+    The first voxel is the voxel with a positive incidence.
+    The faces on the symmetry planes are connected to a single voxel (same voxel twice).
+    """
+
+    # get the incidence matrix as a COO matrix
+    A_net = A_net.tocoo()
+
+    # init the voxel indices
+    (n_v, n_f) = A_net.shape
+    idx_a = np.zeros(n_f, dtype=np.int64)
+    idx_b = np.zeros(n_f, dtype=np.int64)
+
+    # assign the voxel indices
+    idx_pos = A_net.data > 0
+    idx_neg = A_net.data < 0
+    idx_a[A_net.col[idx_pos]] = A_net.row[idx_pos]
+    idx_b[A_net.col[idx_neg]] = A_net.row[idx_neg]
+
+    # faces on the symmetry planes (the mirrored voxel is not included)
+    idx_plane = A_net.getnnz(axis=0) == 1
+    idx_a[idx_plane] = idx_b[idx_plane]
+
+    return idx_a, idx_b
+
+
+def _get_coarse_tensor(n, n_c, G_mutual, coarse_factor, dim):
+    """
+    Average the Green tensor over the coarse faces for a given face direction.
+    The fine faces are covering a square patch of the coarse faces.
+
+    The fine Green tensor has the following size: (nx, ny, nz).
+    The coarse Green tensor has the following size: (nx_c, ny_c, nz_c).
+    """
+
+    # extract the voxel data
+    (nx, ny, nz) = n
+    (nx_c, ny_c, nz_c) = n_c
+
+    # offsets between the fine faces composing two coarse faces
+    off = np.arange(-(coarse_factor - 1), coarse_factor, dtype=np.int64)
+
+    # weights of the offsets (number of fine face pairs)
+    weight = coarse_factor - np.abs(off)
+
+    # init the coarse tensor
+    G_coarse = np.zeros((nx_c, ny_c, nz_c), dtype=np.float64)
+
+    # sum the contributions of the different fine face pairs (offsets in the face plane)
+    for off_a, weight_a in zip(off, weight, strict=True):
+        for off_b, weight_b in zip(off, weight, strict=True):
+            # get the offsets (no offset along the face direction)
+            off_all = np.zeros(3, dtype=np.int64)
+            off_all[[i for i in range(3) if i != dim]] = [off_a, off_b]
+
+            # get the fine tensor indices
+            idx_x = np.minimum(np.abs(coarse_factor * np.arange(nx_c) + off_all[0]), nx - 1)
+            idx_y = np.minimum(np.abs(coarse_factor * np.arange(ny_c) + off_all[1]), ny - 1)
+            idx_z = np.minimum(np.abs(coarse_factor * np.arange(nz_c) + off_all[2]), nz - 1)
+
+            # add the contribution
+            G_coarse += weight_a * weight_b * G_mutual[np.ix_(idx_x, idx_y, idx_z)]
+
+    # scale with the number of fine face pairs
+    G_coarse /= coarse_factor**4
+
+    return G_coarse
+
+
+def _get_coarse_internal(n, idx_f, idx_a, idx_b, idx_agg, idx_inner, idx_cross, idx_first, n_v_c):
+    """
+    Aggregate the resistances of the faces inside the coarse cells.
+
+    For each coarse voxel and face direction, the internal faces are split into layers:
+        - The layers are connected in series.
+        - The faces of a layer are connected in parallel.
+        - The resistance is approximated with the sum of the face resistances divided by the squared number of faces per layer.
+
+    The resistance of a coarse face includes the half of the internal resistances of the connected coarse voxels.
+    The aggregation matrix has the following size: (n_f_c, n_f).
+    """
+
+    # get total size
+    nv = np.prod(n)
+    n_f = len(idx_f)
+    n_f_c = len(idx_first)
+
+    # get the internal faces (direction and coarse voxel)
+    idx_int = np.flatnonzero(idx_inner)
+    dir_int = idx_f[idx_int] // nv
+    key_int = 3 * idx_agg[idx_a[idx_int]] + dir_int
+
+    # get the position of the internal faces along the face direction (layer)
+    pos_int = np.stack(np.unravel_index(idx_f[idx_int] % nv, n, order="F"), axis=1)
+    pos_int = pos_int[np.arange(len(idx_int)), dir_int]
+
+    # number of internal faces and layers for each coarse voxel and direction
+    n_face = np.bincount(key_int, minlength=3 * n_v_c)
+    layer = np.unique(key_int * (np.max(n) + 1) + pos_int) // (np.max(n) + 1)
+    n_layer = np.bincount(layer, minlength=3 * n_v_c)
+
+    # weights of the internal faces (number of faces per layer)
+    n_par = n_face[key_int] / n_layer[key_int]
+    val = 1 / (n_par**2)
+    W_int = sps.csc_matrix((val, (key_int, idx_int)), shape=(3 * n_v_c, n_f), dtype=np.float64)
+
+    # connect the coarse faces with the coarse voxels (half of the internal resistance)
+    idx_ref = idx_cross[idx_first]
+    dir_ref = idx_f[idx_ref] // nv
+    key_a = 3 * idx_agg[idx_a[idx_ref]] + dir_ref
+    key_b = 3 * idx_agg[idx_b[idx_ref]] + dir_ref
+    row = np.concatenate((np.arange(n_f_c), np.arange(n_f_c)))
+    col = np.concatenate((key_a, key_b))
+    val = np.full(2 * n_f_c, 0.5, dtype=np.float64)
+    M_int = sps.csc_matrix((val, (row, col)), shape=(n_f_c, 3 * n_v_c), dtype=np.float64)
+
+    # aggregation matrix
+    Q_f = sps.csc_matrix(M_int * W_int)
+
+    return Q_f
+
+
+def _get_coarse_geometry(n, idx_v, idx_f, A_net, coarse_factor):
+    """
+    Aggregate the voxels and the faces into a coarse voxel structure.
+
+    The problem contains n_v non-empty voxels and n_f internal faces.
+    The coarse problem contains n_v_c coarse voxels and n_f_c coarse faces.
+    The voxel prolongation matrix has the following size: (n_v, n_v_c).
+    The face prolongation matrix has the following size: (n_f, n_f_c).
+    The coarse incidence matrix has the following size: (n_v_c, n_f_c).
+    """
+
+    # extract the voxel data
+    (nx, ny, nz) = n
+
+    # get total size
+    nv = np.prod(n)
+    n_v = len(idx_v)
+    n_f = len(idx_f)
+
+    # get the size of the coarse voxel structure
+    n_c = tuple(int(np.ceil(n_tmp / coarse_factor)) for n_tmp in n)
+    (nx_c, ny_c, nz_c) = n_c
+
+    # get the coarse cells of the voxels
+    (idx_x, idx_y, idx_z) = np.unravel_index(idx_v, n, order="F")
+    idx_cell = np.stack((idx_x, idx_y, idx_z), axis=1) // coarse_factor
+    idx_cell_lin = idx_cell[:, 0] + idx_cell[:, 1] * nx_c + idx_cell[:, 2] * nx_c * ny_c
+
+    # get the voxels connected by the faces
+    (idx_a, idx_b) = _get_face_voxel(A_net)
+
+    # find the faces inside the coarse cells and the faces between the coarse cells
+    #   - the faces on the symmetry planes are kept (connection with the mirrored voxels)
+    idx_inner = (idx_cell_lin[idx_a] == idx_cell_lin[idx_b]) & (idx_a != idx_b)
+    idx_cross = np.flatnonzero(np.invert(idx_inner))
+
+    # aggregate the voxels connected within the coarse cells
+    val = np.ones(np.count_nonzero(idx_inner), dtype=np.int64)
+    A_graph = sps.csr_matrix((val, (idx_a[idx_inner], idx_b[idx_inner])), shape=(n_v, n_v))
+    (n_v_c, idx_agg) = csg.connected_components(A_graph, directed=False)
+
+    # aggregate the faces between the same coarse voxels
+    key = idx_agg[idx_a[idx_cross]] * n_v_c + idx_agg[idx_b[idx_cross]]
+    (key, idx_first, idx_inv, n_agg) = np.unique(key, return_index=True, return_inverse=True, return_counts=True)
+    n_f_c = len(key)
+
+    # voxel prolongation matrix (constant potential)
+    val = np.ones(n_v, dtype=np.float64)
+    P_v = sps.csc_matrix((val, (np.arange(n_v), idx_agg)), shape=(n_v, n_v_c), dtype=np.float64)
+
+    # face prolongation matrix (current equally split between the fine faces)
+    val = 1 / n_agg[idx_inv]
+    P_f = sps.csc_matrix((val, (idx_cross, idx_inv)), shape=(n_f, n_f_c), dtype=np.float64)
+
+    # coarse incidence matrix
+    A_net_c = sps.csc_matrix(P_v.transpose() * A_net * P_f)
+
+    # direction and position of the coarse faces
+    idx_dir = idx_f[idx_cross[idx_first]] // nv
+    idx_pos = idx_cell[idx_a[idx_cross[idx_first]]]
+
+    # aggregation matrix for the resistances of the faces inside the coarse cells
+    Q_f = _get_coarse_internal(n, idx_f, idx_a, idx_b, idx_agg, idx_inner, idx_cross, idx_first, n_v_c)
+
+    # display the size
+    LOGGER.debug("coarse / factor = %d", coarse_factor)
+    LOGGER.debug("coarse / size = (%d, %d, %d)", nx_c, ny_c, nz_c)
+    LOGGER.debug("coarse / voxel = %d / %d", n_v_c, n_v)
+    LOGGER.debug("coarse / face = %d / %d", n_f_c, n_f)
+
+    # assign the data
+    coarse_geometry = {
+        "n_c": n_c,
+        "P_v": P_v,
+        "P_f": P_f,
+        "Q_f": Q_f,
+        "A_net_c": A_net_c,
+        "idx_dir": idx_dir,
+        "idx_pos": idx_pos,
+    }
+
+    return coarse_geometry
+
+
+def _get_coarse_inductance(n, d, G_mutual, coarse_geometry, coarse_factor):
+    """
+    Compute the inductance matrix between the coarse faces.
+    The different face directions are not coupled (block diagonal dense matrix).
+
+    The coarse problem contains n_f_c coarse faces.
+    The fine Green tensor has the following size: (nx, ny, nz, 1).
+    The dense coarse inductance matrix has the following size: (n_f_c, n_f_c).
+    """
+
+    # extract the voxel data
+    (dx, dy, dz) = d
+
+    # extract the coarse data
+    n_c = coarse_geometry["n_c"]
+    idx_dir = coarse_geometry["idx_dir"]
+    idx_pos = coarse_geometry["idx_pos"]
+
+    # get the size
+    n_f_c = len(idx_dir)
+
+    # scaling factor for the different face directions
+    scale = [
+        cst.mu_0 / (dy**2 * dz**2),
+        cst.mu_0 / (dx**2 * dz**2),
+        cst.mu_0 / (dx**2 * dy**2),
+    ]
+
+    # init the matrix (the different face directions are not coupled)
+    L_c = np.zeros((n_f_c, n_f_c), dtype=np.float64)
+
+    # get the matrix blocks for the different directions
+    for dim in range(3):
+        # get the coarse faces for the considered direction
+        idx = np.flatnonzero(idx_dir == dim)
+
+        # get the averaged Green tensor
+        G_coarse = _get_coarse_tensor(n, n_c, G_mutual[:, :, :, 0], coarse_factor, dim)
+
+        # get the relative position between the coarse faces
+        pos = idx_pos[idx]
+        idx_x = np.abs(pos[:, [0]] - pos[:, 0])
+        idx_y = np.abs(pos[:, [1]] - pos[:, 1])
+        idx_z = np.abs(pos[:, [2]] - pos[:, 2])
+
+        # assign the block
+        L_c[np.ix_(idx, idx)] = scale[dim] * G_coarse[idx_x, idx_y, idx_z]
+
+    return L_c
+
+
+def get_coarse_system(n, d, idx_v, idx_f, A_net, G_mutual, multilevel_options):
+    """
+    Create the coarse voxel structure and the coarse inductance matrix (electric domains).
+    The coarse data is independent of the solver sweeps.
+
+    The size of the coarse system (coarse voxels and faces) is bounded.
+    If the coarse system is too large, the coarsening factor is increased.
+    """
+
+    # extract the options
+    multilevel = multilevel_options["multilevel"]
+    coarse_factor = multilevel_options["coarse_factor"]
+    n_max = multilevel_options["n_max"]
+
+    # check if the coarse system is required
+    if not multilevel:
+        return None
+
+    # aggregate the voxels and the faces (increase the coarsening factor until the size is bounded)
+    while True:
+        coarse_geometry = _get_coarse_geometry(n, idx_v, idx_f, A_net, coarse_factor)
+        (n_v_c, n_f_c) = coarse_geometry["A_net_c"].shape
+        if ((n_v_c + n_f_c) <= n_max) or (coarse_factor >= np.max(n)):
+            break
+        coarse_factor += 1
+
+    # check the size of the coarse system
+    if (n_v_c + n_f_c) > n_max:
+        raise RuntimeError("invalid coarse system: size cannot be bounded")
+
+    # display the footprint of the coarse system
+    footprint = np.dtype(np.complex128).itemsize * (n_v_c + n_f_c) ** 2
+    LOGGER.debug("coarse / footprint = %.2f MB", footprint / (1024**2))
+
+    # get the coarse inductance matrix
+    L_c = _get_coarse_inductance(n, d, G_mutual, coarse_geometry, coarse_factor)
+
+    # assign the data
+    coarse_data = {
+        "P_v": coarse_geometry["P_v"],
+        "P_f": coarse_geometry["P_f"],
+        "Q_f": coarse_geometry["Q_f"],
+        "A_net_c": coarse_geometry["A_net_c"],
+        "L_c": L_c,
+    }
+
+    return coarse_data
+
+
+def get_coarse_matrix(freq, R_c, A_src, coarse_data):
+    """
+    Assemble the dense coarse equation system (electric equations).
+
+    The equation system has the following size: n_f_c+n_v_c+n_src.
+    The prolongation matrix has the following size: (n_f+n_v+n_src, n_f_c+n_v_c+n_src).
+    """
+
+    # check if the coarse system is used
+    if coarse_data is None:
+        return None
+
+    # extract the coarse data
+    P_v = coarse_data["P_v"]
+    P_f = coarse_data["P_f"]
+    Q_f = coarse_data["Q_f"]
+    A_net_c = coarse_data["A_net_c"]
+    L_c = coarse_data["L_c"]
+
+    # get the matrices
+    A_vc_src = A_src["A_vc_src"]
+    A_src_vc = A_src["A_src_vc"]
+    A_src_src = A_src["A_src_src"]
+
+    # get the system size
+    (n_v_c, n_f_c) = A_net_c.shape
+    (n_src, n_src) = A_src_src.shape
+
+    # get the angular frequency
+    s = 1j * 2 * np.pi * freq
+
+    # project the resistance matrix (faces between the coarse cells)
+    R_mat = P_f.transpose() * sps.diags(R_c) * P_f
+
+    # add the resistance of the faces inside the coarse cells
+    R_mat = R_mat + sps.diags(Q_f * R_c)
+
+    # project the source matrices
+    A_vc_src = P_v.transpose() * A_vc_src
+    A_src_vc = A_src_vc * P_v
+
+    # empty blocks
+    Z_fs = sps.csc_matrix((n_f_c, n_src), dtype=np.complex128)
+    Z_vv = sps.csc_matrix((n_v_c, n_v_c), dtype=np.complex128)
+    Z_sf = sps.csc_matrix((n_src, n_f_c), dtype=np.complex128)
+
+    # assemble the sparse part of the coarse matrix
+    mat_c = sps.bmat(
+        [
+            [R_mat, -A_net_c.transpose(), Z_fs],
+            [A_net_c, Z_vv, A_vc_src],
+            [Z_sf, A_src_vc, A_src_src],
+        ],
+        format="csc",
+    )
+
+    # add the dense inductance matrix
+    mat_c = mat_c.toarray().astype(np.complex128)
+    mat_c[:n_f_c, :n_f_c] += s * L_c
+
+    # assemble the prolongation matrix
+    P_src = sps.eye(n_src, format="csc")
+    P_mat = sps.block_diag((P_f, P_v, P_src), format="csc")
+
+    # assign the data
+    coarse_mat = {"mat_c": mat_c, "P_mat": P_mat}
+
+    return coarse_mat
@@ -2,9 +2,15 @@
 Different functions for handling creating the PEEC dense matrices:
     - Inductance and potential matrices.
     - Magnetic-electric coupling matrices.
+    - Magnetic field matrices (voxel grid).
 
 Function operators are returned for performing the matrix-vector multiplications.
 The multiplication can either be done with the dense matrices or with FFT circulant tensors.
+
+For problems with symmetry planes, the image tensors are added to the operators:
+    - The signs of the mirrored elements depend on the symmetry type and the vector components.
+    - The faces located on the symmetry planes are shared with the mirrored structure (half faces).
+    - The near-field preconditioner only includes the self-coupling of the faces on the symmetry planes.
 """
 
 __author__ = "Thomas Guillod"
@@ -13,6 +19,7 @@ __license__ = "Mozilla Public License Version 2.0"
 
 import scilogger
 import numpy as np
+import numpy.linalg as lna
 import scipy.sparse as sps
 import scipy.constants as cst
 from pypeec.lib_matrix import matrix_multiply
@@ -21,7 +28,61 @@ from pypeec.lib_matrix import matrix_multiply
 LOGGER = scilogger.get_logger(__name__, "pypeec")
 
 
-def _get_face_voxel_indices(n, idx_v, idx_f, A_net, offset):
+def _get_image_sign(axis, sym_sign, vector):
+    """
+    Get the signs of the mirrored elements (for a combination of symmetry planes).
+    For vectors, the component normal to a symmetry plane is flipped.
+    """
+
+    # get the sign of the scalar variables
+    sign_scalar = np.prod([sym_sign[dim] for dim in axis])
+
+    # get the signs of the components
+    if vector:
+        sign = [-sign_scalar if dim in axis else +sign_scalar for dim in range(3)]
+    else:
+        sign = [sign_scalar]
+
+    # cast to array
+    sign = np.array(sign, dtype=np.float64)
+
+    return sign
+
+
+def _get_image_data(mat_image, sym_in, sym_out, vector_in, vector_out, face_in):
+    """
+    Get the image tensors with the signs of the mirrored elements.
+    The signs are computed for the input and output elements (input and output can be flipped).
+    The face variables are shifted with respect to the voxel variables along the mirrored dimensions.
+    """
+
+    # get the number of components of the input vector
+    if vector_in:
+        nd_in = 3
+    else:
+        nd_in = 1
+
+    # assemble the image data
+    img = []
+    for mat_image_tmp in mat_image:
+        # extract the data
+        axis = mat_image_tmp["axis"]
+        mat = mat_image_tmp["mat"]
+
+        # get the signs
+        sign_in = _get_image_sign(axis, sym_in, vector_in)
+        sign_out = _get_image_sign(axis, sym_out, vector_out)
+
+        # get the shift of the input elements
+        shift = [face_in] * nd_in
+
+        # add the image tensor
+        img.append({"axis": axis, "mat": mat, "sign_in": sign_in, "sign_out": sign_out, "shift": shift})
+
+    return img
+
+
+def _get_face_voxel_indices(n, idx_v, dir_f, A_net, offset):
     """
     Create a matrix to project a variable into a voxel variable.
     The variable is a vector and a single component (x, y, or z) is projected.
@@ -32,10 +93,10 @@ def _get_face_voxel_indices(n, idx_v, idx_f, A_net, offset):
     nv = np.prod(n)
 
     # get the local indices (face indices of the incidence matrix)
-    idx_local = np.isin(idx_f, np.arange(offset * nv, (offset + 1) * nv, dtype=np.int64))
+    slc_local = [dir_f["slc_x"], dir_f["slc_y"], dir_f["slc_z"]][offset]
 
     # slice matrix (columns)
-    A_net = A_net[:, idx_local]
+    A_net = A_net[:, slc_local]
 
     # get face indices (get the non-zero entry of the projected voxel variable)
     idx_local = A_net.getnnz(axis=1) > 0
@@ -55,7 +116,7 @@ def _get_face_voxel_indices(n, idx_v, idx_f, A_net, offset):
     return A_net, idx
 
 
-def _get_face_voxel_matrix(n, idx_v, idx_f, A_net):
+def _get_face_voxel_matrix(n, idx_v, dir_f, A_net):
     """
     Create a matrix to project a face vector into a voxel vector.
     All the vector components (x, y, and z) are projected.
@@ -63,9 +124,9 @@ def _get_face_voxel_matrix(n, idx_v, idx_f, A_net):
     """
 
     # get the incidence matrix between the faces and voxels
-    (A_net_x, idx_x) = _get_face_voxel_indices(n, idx_v, idx_f, A_net, 0)
-    (A_net_y, idx_y) = _get_face_voxel_indices(n, idx_v, idx_f, A_net, 1)
-    (A_net_z, idx_z) = _get_face_voxel_indices(n, idx_v, idx_f, A_net, 2)
+    (A_net_x, idx_x) = _get_face_voxel_indices(n, idx_v, dir_f, A_net, 0)
+    (A_net_y, idx_y) = _get_face_voxel_indices(n, idx_v, dir_f, A_net, 1)
+    (A_net_z, idx_z) = _get_face_voxel_indices(n, idx_v, dir_f, A_net, 2)
 
     # assemble incidence matrix and indices
     idx_fv = np.concatenate((idx_x, idx_y, idx_z))
@@ -74,6 +135,92 @@ def _get_face_voxel_matrix(n, idx_v, idx_f, A_net):
     return A_fv_net, idx_fv
 
 
+def _get_inductance_near_field(n, d, idx_f, dir_f, scale, G_self, G_mutual, sym_c, near_field):
+    """
+    Create a sparse matrix with the near-field inductances (used for the preconditioner).
+    The self-inductances are placed on the diagonal.
+    The mutual inductances are added for the faces within the near-field radius.
+    The near-field radius is expressed as a normalized voxel distance.
+    The faces on the symmetry planes are coupled with their own image.
+    """
+
+    # extract the voxel data
+    (nx, ny, nz) = n
+    d = np.array(d, dtype=np.float64)
+
+    # get total size
+    nv = np.prod(n)
+    n_f = len(idx_f)
+
+    # get the maximum offset along the different directions
+    (rx, ry, rz) = np.floor(near_field * np.max(d) / d).astype(np.int64)
+    rx = min(rx, nx - 1)
+    ry = min(ry, ny - 1)
+    rz = min(rz, nz - 1)
+
+    # get the relative voxel offsets within the radius (without the self-inductance)
+    x = np.arange(-rx, rx + 1, dtype=np.int64)
+    y = np.arange(-ry, ry + 1, dtype=np.int64)
+    z = np.arange(-rz, rz + 1, dtype=np.int64)
+    (off_x, off_y, off_z) = np.meshgrid(x, y, z, indexing="ij")
+    idx_off = np.stack((off_x.flatten(), off_y.flatten(), off_z.flatten()), axis=1)
+    n_cell = lna.norm(d * idx_off, axis=1) / np.max(d)
+    idx_off = idx_off[(n_cell <= near_field) & (n_cell > 0)]
+
+    # get the direction and the tensor indices of the faces
+    idx_dir = dir_f["idx_dir"]
+    (idx_x, idx_y, idx_z) = dir_f["idx_crd"]
+
+    # self-inductance (diagonal coefficients)
+    idx_row = [np.arange(n_f, dtype=np.int64)]
+    idx_col = [np.arange(n_f, dtype=np.int64)]
+    val = [scale * G_self]
+
+    # faces on the symmetry planes (the face and the image are located at the same position)
+    idx_plane = dir_f["idx_plane"]
+    sign = [_get_image_sign((dim,), sym_c, True)[dim] for dim in idx_dir[idx_plane]]
+    idx_row.append(idx_plane)
+    idx_col.append(idx_plane)
+    val.append(scale[idx_plane] * np.array(sign, dtype=np.float64) * G_self)
+
+    # mutual inductances (only faces with the same direction are coupled)
+    for off_x, off_y, off_z in idx_off:
+        # get the indices of the neighbor faces
+        idx_x_tmp = idx_x + off_x
+        idx_y_tmp = idx_y + off_y
+        idx_z_tmp = idx_z + off_z
+
+        # remove the neighbors outside the voxel structure
+        idx_ok = (idx_x_tmp >= 0) & (idx_x_tmp < nx)
+        idx_ok &= (idx_y_tmp >= 0) & (idx_y_tmp < ny)
+        idx_ok &= (idx_z_tmp >= 0) & (idx_z_tmp < nz)
+        idx_ok = np.flatnonzero(idx_ok)
+
+        # get the global indices of the neighbor faces
+        idx_tmp = idx_dir[idx_ok] * nv + idx_x_tmp[idx_ok] + idx_y_tmp[idx_ok] * nx + idx_z_tmp[idx_ok] * nx * ny
+
+        # find the neighbor faces that are present in the problem (sorted indices)
+        idx_pos = np.searchsorted(idx_f, idx_tmp)
+        idx_pos = np.minimum(idx_pos, n_f - 1)
+        idx_match = idx_f[idx_pos] == idx_tmp
+
+        # assign the coefficients
+        idx_row.append(idx_ok[idx_match])
+        idx_col.append(idx_pos[idx_match])
+        val.append(scale[idx_ok[idx_match]] * G_mutual[abs(off_x), abs(off_y), abs(off_z), 0])
+
+    # assemble the sparse matrix
+    idx_row = np.concatenate(idx_row)
+    idx_col = np.concatenate(idx_col)
+    val = np.concatenate(val)
+    L = sps.csc_matrix((val, (idx_row, idx_col)), shape=(n_f, n_f), dtype=np.complex128)
+
+    # display the sparsity
+    LOGGER.debug("inductance / near-field = %d", L.nnz)
+
+    return L
+
+
 def _get_operator_zeros(idx_out):
     """
     Get a linear operator returning zeros.
@@ -89,14 +236,19 @@ def _get_operator_zeros(idx_out):
     return op
 
 
-def get_inductance_matrix(n, d, idx_f, G_self, G_mutual, dense_options):
+def get_inductance_matrix(n, d, idx_f, dir_f, G_self, G_mutual, G_image, sym_c, near_field, dense_options):
     """
     Extract the inductance matrix of the system (used for the full system).
 
     The problem contains n_f internal faces.
+    A sparse near-field inductance matrix is returned for the preconditioner: (n_f, n_f).
     The voxel structure has the following size: (nx, ny, nz).
     The green tensor has the following size: (nx, ny, nz, 1).
 
+    The faces on the symmetry planes are only half included in the problem:
+        - The face is shared between the structure and the mirrored structure.
+        - The rows and columns of the matrix are scaled with a weight (one half).
+
     The tensor is then used to create a matrix-vector linear operator:
         - Input size: n_f.
         - Output size: n_f.
@@ -107,8 +259,8 @@ def get_inductance_matrix(n, d, idx_f, G_self, G_mutual, dense_options):
 
     # check if the matrix is required
     if len(idx_f) == 0:
-        # dummy diagonal coefficient
-        L = np.nan
+        # dummy near-field matrix
+        L = sps.csc_matrix((0, 0), dtype=np.complex128)
 
         # dummy matrix multiplication operator
         L_op = _get_operator_zeros(idx_f)
@@ -118,35 +270,40 @@ def get_inductance_matrix(n, d, idx_f, G_self, G_mutual, dense_options):
     # extract the voxel data
     (dx, dy, dz) = d
 
-    # get total size
-    nv = np.prod(n)
-
     # get the direction of the faces (x, y, z)
-    idx_fx = np.isin(idx_f, np.arange(0 * nv, 1 * nv, dtype=np.int64))
-    idx_fy = np.isin(idx_f, np.arange(1 * nv, 2 * nv, dtype=np.int64))
-    idx_fz = np.isin(idx_f, np.arange(2 * nv, 3 * nv, dtype=np.int64))
+    slc_x = dir_f["slc_x"]
+    slc_y = dir_f["slc_y"]
+    slc_z = dir_f["slc_z"]
 
     # scaling factor
     scale = np.zeros(len(idx_f), dtype=np.complex128)
-    scale[idx_fx] = cst.mu_0 / (dy**2 * dz**2)
-    scale[idx_fy] = cst.mu_0 / (dx**2 * dz**2)
-    scale[idx_fz] = cst.mu_0 / (dx**2 * dy**2)
+    scale[slc_x] = cst.mu_0 / (dy**2 * dz**2)
+    scale[slc_y] = cst.mu_0 / (dx**2 * dz**2)
+    scale[slc_z] = cst.mu_0 / (dx**2 * dy**2)
 
-    # self-inductance for the preconditioner (diagonal coefficient)
-    L = scale * G_self
+    # weights of the faces (faces on the symmetry planes are shared)
+    weight = np.ones(len(idx_f), dtype=np.float64)
+    weight[dir_f["idx_plane"]] = 0.5
+
+    # near-field inductance matrix for the preconditioner
+    L = _get_inductance_near_field(n, d, idx_f, dir_f, scale, G_self, G_mutual, sym_c, near_field)
+    L = sps.csc_matrix(sps.diags(weight) * L * sps.diags(weight))
+
+    # get the image tensors (faces)
+    img = _get_image_data(G_image, sym_c, sym_c, True, True, True)
 
     # get the matrix-vector operator
-    L_op_tmp = matrix_multiply.get_operator_inductance(idx_f, G_mutual, dense_options)
+    L_op_tmp = matrix_multiply.get_operator_inductance(idx_f, G_mutual, img, dense_options)
 
     # function describing the inductance matrix multiplication
     def L_op(var_f):
-        res_f = scale * L_op_tmp(var_f)
+        res_f = weight * scale * L_op_tmp(weight * var_f)
         return res_f
 
     return L, L_op
 
 
-def get_potential_matrix(d, idx_v, G_self, G_mutual, dense_options):
+def get_potential_matrix(d, idx_v, G_self, G_mutual, G_image, sym_m, dense_options):
     """
     Extract the potential matrix of the system.
 
@@ -181,8 +338,11 @@ def get_potential_matrix(d, idx_v, G_self, G_mutual, dense_options):
     # self-potential for the preconditioner (diagonal coefficient)
     P = scale * G_self
 
+    # get the image tensors (voxels)
+    img = _get_image_data(G_image, sym_m, sym_m, False, False, False)
+
     # get the matrix-vector operator
-    P_op_tmp = matrix_multiply.get_operator_potential(idx_v, G_mutual, dense_options)
+    P_op_tmp = matrix_multiply.get_operator_potential(idx_v, G_mutual, img, dense_options)
 
     # function describing the potential matrix multiplication
     def P_op(var_v):
@@ -192,7 +352,7 @@ def get_potential_matrix(d, idx_v, G_self, G_mutual, dense_options):
     return P, P_op
 
 
-def get_coupling_matrix(n, idx_vc, idx_vm, idx_fc, idx_fm, A_net_c, A_net_m, K_tsr, dense_options):
+def get_coupling_matrix(n, idx_vc, idx_vm, idx_fc, idx_fm, dir_fc, dir_fm, A_net_c, A_net_m, K_tsr, K_image, sym_c, sym_m, dense_options):
     """
     Extract the magnetic-electric coupling matrices.
 
@@ -236,11 +396,14 @@ def get_coupling_matrix(n, idx_vc, idx_vm, idx_fc, idx_fm, A_net_c, A_net_m, K_t
         return K_op_c, K_op_m
 
     # get the face voxel incidence matrix
-    (A_fv_net_c, idx_fvc) = _get_face_voxel_matrix(n, idx_vc, idx_fc, A_net_c)
-    (A_fv_net_m, idx_fvm) = _get_face_voxel_matrix(n, idx_vm, idx_fm, A_net_m)
+    (A_fv_net_c, idx_fvc) = _get_face_voxel_matrix(n, idx_vc, dir_fc, A_net_c)
+    (A_fv_net_m, idx_fvm) = _get_face_voxel_matrix(n, idx_vm, dir_fm, A_net_m)
+
+    # get the image tensors (voxels)
+    img = _get_image_data(K_image, sym_m, sym_c, True, True, False)
 
     # get the coupling operator (voxel to voxel)
-    (K_op_c_tmp, K_op_m_tmp) = matrix_multiply.get_operator_coupling(idx_fvc, idx_fvm, K_tsr, dense_options)
+    (K_op_c_tmp, K_op_m_tmp) = matrix_multiply.get_operator_coupling(idx_fvc, idx_fvm, K_tsr, img, dense_options)
 
     # function describing the coupling from the magnetic to the electric faces
     def K_op_c(var_fm):
@@ -253,3 +416,78 @@ def get_coupling_matrix(n, idx_vc, idx_vm, idx_fc, idx_fm, A_net_c, A_net_m, K_t
         return var_fm
 
     return K_op_c, K_op_m
+
+
+def get_field_matrix(n, idx_vc, idx_vm, F_tsr, F_image, sym_c, sym_m, dense_options):
+    """
+    Extract the magnetic field matrices (complete voxel grid).
+
+    The problem contains n_vc electric voxels.
+    The problem contains n_vm magnetic voxels.
+    The voxel structure has the following size: (nx, ny, nz).
+    The field tensor has the following size: (nx, ny, nz, 3).
+
+    For the electric contribution, the voxel currents are used (cross product with the kernel):
+        - Input size: (n_vc, 3).
+        - Output size: (nv, 3).
+
+    For the magnetic contribution, the voxel charges are used (product with the kernel):
+        - Input size: n_vm.
+        - Output size: (nv, 3).
+    """
+
+    # check if the matrix is required
+    if F_tsr is None:
+        return None, None
+
+    # get total size
+    nv = np.prod(n)
+
+    # get the operator size
+    LOGGER.debug("field / operator = (%d x %d)", 3 * nv, 3 * len(idx_vc))
+    LOGGER.debug("field / operator = (%d x %d)", 3 * nv, len(idx_vm))
+
+    # get the indices of the complete voxel grid (output)
+    idx_out = np.arange(3 * nv, dtype=np.int64)
+
+    # get the indices of the voxel currents (input)
+    idx_in_c = np.concatenate((idx_vc + 0 * nv, idx_vc + 1 * nv, idx_vc + 2 * nv))
+
+    # get the indices of the voxel charges (input)
+    idx_in_m = idx_vm
+
+    # get the tensor for the cross product (see the coupling matrix definition)
+    F_tsr_c = F_tsr * np.array([+1, -1, +1], dtype=np.float64)
+    F_image_c = [{**F_tmp, "mat": F_tmp["mat"] * np.array([+1, -1, +1], dtype=np.float64)} for F_tmp in F_image]
+
+    # get the image tensors (voxels)
+    img_c = _get_image_data(F_image_c, sym_c, sym_m, True, True, False)
+    img_m = _get_image_data(F_image, sym_m, sym_m, False, True, False)
+
+    # get the operators
+    if len(idx_vc) == 0:
+        F_op_c_tmp = None
+    else:
+        (F_op_c_tmp, _) = matrix_multiply.get_operator_coupling(idx_out, idx_in_c, F_tsr_c, img_c, dense_options)
+    if len(idx_vm) == 0:
+        F_op_m_tmp = None
+    else:
+        F_op_m_tmp = matrix_multiply.get_operator_gradient(idx_out, idx_in_m, F_tsr, img_m, dense_options)
+
+    # function describing the field created by the voxel currents
+    def F_op_c(var_vc):
+        if F_op_c_tmp is None:
+            return np.zeros((nv, 3), dtype=np.complex128)
+        var_v = F_op_c_tmp(var_vc.flatten(order="F"))
+        var_v = var_v.reshape((nv, 3), order="F")
+        return var_v
+
+    # function describing the field created by the voxel charges
+    def F_op_m(var_vm):
+        if F_op_m_tmp is None:
+            return np.zeros((nv, 3), dtype=np.complex128)
+        var_v = F_op_m_tmp(var_vm)
+        var_v = var_v.reshape((nv, 3), order="F")
+        return var_v
+
+    return F_op_c, F_op_m
@@ -2,12 +2,18 @@
 Get the dense matrices used for the PEEC problem:
     - The integrals of the Green functions (with 6D integrals).
     - The cross-coupling functions between the faces (with 5D integrals).
+
+For problems with symmetry planes, image tensors are computed:
+    - The image tensors describe the coupling with the mirrored voxels.
+    - A tensor is computed for each combination of symmetry planes.
+    - Along the mirrored dimensions, the tensors are indexed with the sum of the voxel indices.
 """
 
 __author__ = "Thomas Guillod"
 __copyright__ = "Thomas Guillod - Dartmouth College"
 __license__ = "Mozilla Public License Version 2.0"
 
+import itertools
 import numpy as np
 import numpy.linalg as lna
 from pypeec.lib_matrix import green_function
@@ -74,19 +80,13 @@ def _get_coupling(d, idx, method, dimension):
     return G
 
 
-def _get_voxel_indices(n):
+def _get_tensor_indices(idx_x, idx_y, idx_z):
     """
-    Compute the indices of the complete voxel structure.
+    Compute the indices of a tensor from the indices along the different dimensions.
     Return the indices as a matrix.
     """
 
-    # extract the voxel data
-    (nx, ny, nz) = n
-
     # get the indices array
-    idx_x = np.arange(nx, dtype=np.int64)
-    idx_y = np.arange(ny, dtype=np.int64)
-    idx_z = np.arange(nz, dtype=np.int64)
     [idx_x, idx_y, idx_z] = np.meshgrid(idx_x, idx_y, idx_z, indexing="ij")
 
     # flatten the indices into vectors
@@ -100,6 +100,73 @@ def _get_voxel_indices(n):
     return idx
 
 
+def _get_voxel_indices(n):
+    """
+    Compute the indices of the complete voxel structure.
+    Return the indices as a matrix.
+    """
+
+    # extract the voxel data
+    (nx, ny, nz) = n
+
+    # get the indices along the different dimensions
+    idx_x = np.arange(nx, dtype=np.int64)
+    idx_y = np.arange(ny, dtype=np.int64)
+    idx_z = np.arange(nz, dtype=np.int64)
+
+    # assemble the indices
+    idx = _get_tensor_indices(idx_x, idx_y, idx_z)
+
+    return idx
+
+
+def _get_image_indices(n, sym_axis, axis):
+    """
+    Compute the indices of an image tensor (for a combination of symmetry planes).
+    Return the indices as a matrix and the shape of the tensor.
+
+    Along the mirrored dimensions, the distance to the image voxel is the sum of the indices:
+        - The tensor has the following size: 2*n.
+        - The element i describes the distance i+offset (offset between the plane and the voxels).
+        - The last element describes the distance offset-1 (faces located at the plane).
+    """
+
+    # get the indices along the different dimensions
+    idx_list = []
+    for dim, n_dim in enumerate(n):
+        if dim in axis:
+            offset = sym_axis[dim]["offset"]
+            idx_tmp = np.arange(2 * n_dim - 1, dtype=np.int64) + offset
+            idx_tmp = np.append(idx_tmp, offset - 1)
+        else:
+            idx_tmp = np.arange(n_dim, dtype=np.int64)
+        idx_list.append(idx_tmp)
+
+    # get the shape of the tensor
+    shape = tuple(len(idx_tmp) for idx_tmp in idx_list)
+
+    # assemble the indices
+    idx = _get_tensor_indices(*idx_list)
+
+    return idx, shape
+
+
+def _get_image_list(sym_axis):
+    """
+    Get the combinations of symmetry planes (one image tensor per combination).
+    """
+
+    # get the mirrored dimensions
+    dim_list = sorted(sym_axis.keys())
+
+    # get all the non-empty combinations
+    axis_list = []
+    for n_axis in range(1, len(dim_list) + 1):
+        axis_list += list(itertools.combinations(dim_list, n_axis))
+
+    return axis_list
+
+
 def _get_voxel_distances(d, idx):
     """
     Compute the normalized distance between the voxels and the reference voxel at the origin.
@@ -130,26 +197,38 @@ def get_green_self(d):
     return G_self
 
 
-def get_green_tensor(n, d, integral_simplify):
+def _get_green_vector(d, idx, integral_simplify):
     """
-    Compute the Green functions for the complete voxel structure.
+    Compute the Green functions for the provided voxel indices.
     For the self-coefficient and the close mutual coefficients, an analytical solution is used.
     For the remote mutual coefficients, an approximation is used.
-
-    The voxel structure has the following size: (nx, ny, nz).
-    The created tensor has the following dimension: (nx, ny, nz, 1).
-    The self-coefficient is at the following location: (0, 0, 0, 0).
-    All the elements are computed with respect to the first voxel.
     """
 
-    # extract the voxel data
-    (nx, ny, nz) = n
+    # compute the normalized distance between the voxels and the reference voxel at the origin
+    n_cell = _get_voxel_distances(d, idx)
 
-    # get total size
-    nv = np.prod(n)
+    # check where the analytical solution should be used
+    idx_ana = n_cell <= integral_simplify
+    idx_num = np.invert(idx_ana)
 
-    # get the indices of the complete voxel structure (as a matrix)
-    idx = _get_voxel_indices(n)
+    # init the result vector
+    G_vec = np.empty(len(idx), dtype=np.float64)
+
+    # analytical solution
+    G_vec[idx_ana] = green_function.get_green_ana(d, idx[idx_ana], "6D")
+
+    # numerical solution
+    G_vec[idx_num] = green_function.get_green_num(d, idx[idx_num], "6D")
+
+    return G_vec
+
+
+def _get_coupling_vector(d, idx, integral_simplify):
+    """
+    Compute the coupling functions for the provided voxel indices.
+    For the close coefficients, an analytical solution is used.
+    For the remote coefficients, an approximation is used.
+    """
 
     # compute the normalized distance between the voxels and the reference voxel at the origin
     n_cell = _get_voxel_distances(d, idx)
@@ -159,13 +238,61 @@ def get_green_tensor(n, d, integral_simplify):
     idx_num = np.invert(idx_ana)
 
     # init the result vector
-    G_mutual = np.empty(nv, dtype=np.float64)
+    K_vec = np.empty((len(idx), 3), dtype=np.float64)
 
     # analytical solution
-    G_mutual[idx_ana] = green_function.get_green_ana(d, idx[idx_ana], "6D")
+    K_vec[idx_ana, 0] = _get_coupling(d, idx[idx_ana], "ana", "yz")
+    K_vec[idx_ana, 1] = _get_coupling(d, idx[idx_ana], "ana", "xz")
+    K_vec[idx_ana, 2] = _get_coupling(d, idx[idx_ana], "ana", "xy")
 
     # numerical solution
-    G_mutual[idx_num] = green_function.get_green_num(d, idx[idx_num], "6D")
+    K_vec[idx_num, 0] = _get_coupling(d, idx[idx_num], "num", "yz")
+    K_vec[idx_num, 1] = _get_coupling(d, idx[idx_num], "num", "xz")
+    K_vec[idx_num, 2] = _get_coupling(d, idx[idx_num], "num", "xy")
+
+    return K_vec
+
+
+def _get_field_vector(d, idx):
+    """
+    Compute the magnetic field functions for the provided voxel indices.
+    The point kernel (distance vector divided by the cubed distance) is used.
+    The self-coefficient is set to zero (singular kernel).
+    """
+
+    # compute the distance vectors between the voxels and the reference voxel at the origin
+    vec = d * idx
+
+    # compute the cubed distances (the self-coefficient is excluded)
+    nrm = lna.norm(vec, axis=1) ** 3
+    nrm[nrm == 0] = np.inf
+
+    # compute the point kernel
+    F_vec = vec / nrm[:, np.newaxis]
+
+    return F_vec
+
+
+def get_green_tensor(n, d, integral_simplify):
+    """
+    Compute the Green functions for the complete voxel structure.
+    For the self-coefficient and the close mutual coefficients, an analytical solution is used.
+    For the remote mutual coefficients, an approximation is used.
+
+    The voxel structure has the following size: (nx, ny, nz).
+    The created tensor has the following dimension: (nx, ny, nz, 1).
+    The self-coefficient is at the following location: (0, 0, 0, 0).
+    All the elements are computed with respect to the first voxel.
+    """
+
+    # extract the voxel data
+    (nx, ny, nz) = n
+
+    # get the indices of the complete voxel structure (as a matrix)
+    idx = _get_voxel_indices(n)
+
+    # compute the Green functions
+    G_mutual = _get_green_vector(d, idx, integral_simplify)
 
     # transform the vector into a tensor
     G_mutual = G_mutual.reshape((nx, ny, nz, 1), order="F")
@@ -187,9 +314,6 @@ def get_coupling_tensor(n, d, integral_simplify, has_magnetic):
     # extract the voxel data
     (nx, ny, nz) = n
 
-    # get total size
-    nv = np.prod(n)
-
     # check if the tensor is required
     if not has_magnetic:
         return None
@@ -197,28 +321,134 @@ def get_coupling_tensor(n, d, integral_simplify, has_magnetic):
     # get the indices of the complete voxel structure (as a matrix)
     idx = _get_voxel_indices(n)
 
-    # compute the normalized distance between the voxels and the reference voxel at the origin
-    n_cell = _get_voxel_distances(d, idx)
+    # compute the coupling functions
+    K_tsr = _get_coupling_vector(d, idx, integral_simplify)
 
-    # check where the analytical solution should be used
-    idx_ana = n_cell <= integral_simplify
-    idx_num = np.invert(idx_ana)
+    # transform the vector into a tensor
+    K_tsr = K_tsr.flatten(order="F")
+    K_tsr = K_tsr.reshape((nx, ny, nz, 3), order="F")
 
-    # init the result vector
-    K_tsr = np.empty((nv, 3), dtype=np.float64)
+    return K_tsr
 
-    # analytical solution
-    K_tsr[idx_ana, 0] = _get_coupling(d, idx[idx_ana], "ana", "yz")
-    K_tsr[idx_ana, 1] = _get_coupling(d, idx[idx_ana], "ana", "xz")
-    K_tsr[idx_ana, 2] = _get_coupling(d, idx[idx_ana], "ana", "xy")
 
-    # numerical solution
-    K_tsr[idx_num, 0] = _get_coupling(d, idx[idx_num], "num", "yz")
-    K_tsr[idx_num, 1] = _get_coupling(d, idx[idx_num], "num", "xz")
-    K_tsr[idx_num, 2] = _get_coupling(d, idx[idx_num], "num", "xy")
+def get_field_tensor(n, d, grid):
+    """
+    Compute the magnetic field functions for the complete voxel structure.
+    The functions are used for computing the magnetic field on the voxel grid.
+    The point kernel (distance vector divided by the cubed distance) is used.
+
+    The voxel structure has the following size: (nx, ny, nz).
+    The created tensor has the following dimension: (nx, ny, nz, 3).
+    All the elements are computed with respect to the first voxel.
+    The self-coefficient is set to zero (singular kernel).
+    """
+
+    # extract the voxel data
+    (nx, ny, nz) = n
+
+    # check if the tensor is required
+    if not grid:
+        return None
+
+    # get the indices of the complete voxel structure (as a matrix)
+    idx = _get_voxel_indices(n)
+
+    # compute the point kernel
+    F_tsr = _get_field_vector(d, idx)
 
     # transform the vector into a tensor
-    K_tsr = K_tsr.flatten(order="F")
-    K_tsr = K_tsr.reshape((nx, ny, nz, 3), order="F")
+    F_tsr = F_tsr.flatten(order="F")
+    F_tsr = F_tsr.reshape((nx, ny, nz, 3), order="F")
 
-    return K_tsr
+    return F_tsr
+
+
+def get_green_image(n, d, integral_simplify, sym_axis):
+    """
+    Compute the Green functions between the voxels and the mirrored voxels.
+    A tensor is computed for each combination of symmetry planes.
+
+    The voxel structure has the following size: (nx, ny, nz).
+    The created tensors have the following dimension: (nx, ny, nz, 1).
+    Along the mirrored dimensions, the size of the tensors is doubled.
+    """
+
+    G_image = []
+    for axis in _get_image_list(sym_axis):
+        # get the indices of the image tensor (as a matrix)
+        (idx, shape) = _get_image_indices(n, sym_axis, axis)
+
+        # compute the Green functions
+        G_tmp = _get_green_vector(d, idx, integral_simplify)
+
+        # transform the vector into a tensor
+        G_tmp = G_tmp.reshape((*shape, 1), order="F")
+
+        # add the tensor
+        G_image.append({"axis": axis, "mat": G_tmp})
+
+    return G_image
+
+
+def get_coupling_image(n, d, integral_simplify, has_magnetic, sym_axis):
+    """
+    Compute the coupling functions between the voxels and the mirrored voxels.
+    A tensor is computed for each combination of symmetry planes.
+
+    The voxel structure has the following size: (nx, ny, nz).
+    The created tensors have the following dimension: (nx, ny, nz, 3).
+    Along the mirrored dimensions, the size of the tensors is doubled.
+    """
+
+    # check if the tensors are required
+    if not has_magnetic:
+        return None
+
+    K_image = []
+    for axis in _get_image_list(sym_axis):
+        # get the indices of the image tensor (as a matrix)
+        (idx, shape) = _get_image_indices(n, sym_axis, axis)
+
+        # compute the coupling functions
+        K_tmp = _get_coupling_vector(d, idx, integral_simplify)
+
+        # transform the vector into a tensor
+        K_tmp = K_tmp.flatten(order="F")
+        K_tmp = K_tmp.reshape((*shape, 3), order="F")
+
+        # add the tensor
+        K_image.append({"axis": axis, "mat": K_tmp})
+
+    return K_image
+
+
+def get_field_image(n, d, grid, sym_axis):
+    """
+    Compute the magnetic field functions between the voxels and the mirrored voxels.
+    A tensor is computed for each combination of symmetry planes.
+
+    The voxel structure has the following size: (nx, ny, nz).
+    The created tensors have the following dimension: (nx, ny, nz, 3).
+    Along the mirrored dimensions, the size of the tensors is doubled.
+    """
+
+    # check if the tensors are required
+    if not grid:
+        return None
+
+    F_image = []
+    for axis in _get_image_list(sym_axis):
+        # get the indices of the image tensor (as a matrix)
+        (idx, shape) = _get_image_indices(n, sym_axis, axis)
+
+        # compute the point kernel
+        F_tmp = _get_field_vector(d, idx)
+
+        # transform the vector into a tensor
+        F_tmp = F_tmp.flatten(order="F")
+        F_tmp = F_tmp.reshape((*shape, 3), order="F")
+
+        # add the tensor
+        F_image.append({"axis": axis, "mat": F_tmp})
+
+    return F_image
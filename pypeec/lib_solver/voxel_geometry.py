@@ -1,6 +1,16 @@
 """
 Different functions for dealing the voxel data.
 Compute the voxel coordinates and the incidence matrix.
+
+The data are only computed for the non-empty voxels:
+    - The complete voxel structure is never materialized.
+    - The memory and the computational cost scale with the number of non-empty voxels.
+    - The neighboring voxels are found with a lookup in the sorted voxel indices.
+
+For problems with symmetry planes, the faces are modified along the mirrored dimensions:
+    - The faces are owned by the voxel with the upper index (the lower voxel can be mirrored).
+    - For antisymmetric potentials, the faces located on the symmetry planes are added.
+    - The faces on the symmetry planes are only connected to a single voxel.
 """
 
 __author__ = "Thomas Guillod"
@@ -11,13 +21,43 @@ import numpy as np
 import scipy.sparse as sps
 
 
-def get_voxel_coordinate(n, d, c):
+def _get_neighbor(n, idx_v, idx_crd, dim):
+    """
+    Find the neighbors of the non-empty voxels (in the positive direction).
+    Return the voxels with a non-empty neighbor and the position of the neighbor.
+    """
+
+    # get the index offset between neighboring voxels
+    step = np.prod(n[:dim], dtype=np.int64)
+
+    # sort the voxel indices for the lookup
+    idx_sort = np.argsort(idx_v, kind="stable")
+    idx_v_sort = idx_v[idx_sort]
+
+    # get the neighbor indices (the voxels at the boundary have no neighbors)
+    idx_valid = np.flatnonzero(idx_crd[dim] < (n[dim] - 1))
+    idx_nbr = idx_v[idx_valid] + step
+
+    # lookup of the neighbors in the sorted indices
+    idx_pos = np.searchsorted(idx_v_sort, idx_nbr)
+    idx_pos = np.minimum(idx_pos, len(idx_v_sort) - 1)
+
+    # keep the neighbors that are non-empty voxels
+    idx_found = idx_v_sort[idx_pos] == idx_nbr
+    idx_pos = idx_sort[idx_pos[idx_found]]
+    idx_valid = idx_valid[idx_found]
+
+    return idx_valid, idx_pos
+
+
+def get_voxel_coordinate(n, d, c, idx_v):
     """
-    Get the coordinate of the different voxels.
+    Get the coordinate of the non-empty voxels.
     The center voxel center is at the specified origin coordinate.
 
     The voxel structure has the following size: (nx, ny, nz).
-    The array has the following dimension: (nx*ny*nz, 3).
+    The problem contains n_v non-empty voxels.
+    The array has the following dimension: (n_v, 3).
     """
 
     # cast to array
@@ -25,14 +65,8 @@ def get_voxel_coordinate(n, d, c):
     d = np.array(d, dtype=np.float64)
     n = np.array(n, dtype=np.int64)
 
-    # get total size
-    nv = np.prod(n)
-
-    # all the indices
-    idx_linear = np.arange(0, nv, dtype=np.int64)
-
     # convert linear indices into tensor indices
-    (idx_x, idx_y, idx_z) = np.unravel_index(idx_linear, n, order="F")
+    (idx_x, idx_y, idx_z) = np.unravel_index(idx_v, n, order="F")
 
     # assemble the coordinate array
     idx_vox = np.stack((idx_x, idx_y, idx_z), axis=1)
@@ -41,63 +75,136 @@ def get_voxel_coordinate(n, d, c):
     o = c - (n * d) / 2
 
     # assemble the coordinate array
-    pts_vox = o + d / 2 + d * idx_vox
+    pts_net = o + d / 2 + d * idx_vox
 
-    return pts_vox
+    return pts_net
 
 
-def get_incidence_matrix(n):
+def get_incidence_matrix(n, idx_v, sym_axis, sym_sign):
     """
-    Get the incidence matrix of the voxel structure.
-    This matrix describes the relation between the voxels and the faces.
+    Get the incidence matrix of the non-empty voxels.
+    This matrix describes the relation between the voxels and the internal faces.
+    The internal faces are the faces between two non-empty voxels.
+    The faces located on the symmetry planes (mirrored voxels) are also included.
 
     The voxel structure has the following size: (nx, ny, nz).
-    The matrix has the following dimension: (nx*ny*nz, 3*nx*ny*nz).
+    The problem contains n_v non-empty voxels and n_f internal faces.
+    The matrix has the following dimension: (n_v, n_f).
     The columns represent the face with the following order: x, y, and, z.
-    The rows represent the voxels.
+    The rows represent the voxels (same order as the voxel indices).
+    The indices of the internal faces are also computed (global face indices, 0:3*nx*ny*nz).
+    """
+
+    # cast to array
+    n = np.array(n, dtype=np.int64)
+    idx_v = np.array(idx_v, dtype=np.int64)
+
+    # get total size
+    nv = np.prod(n)
+
+    # convert linear indices into tensor indices
+    idx_crd = np.unravel_index(idx_v, n, order="F")
+
+    # init the face indices and the matrix entries
+    idx_f = []
+    idx_row_p = []
+    idx_row_n = []
+
+    # find the internal faces (the face is owned by the voxel with the lower index)
+    #   - along the mirrored dimensions, the face is owned by the voxel with the upper index
+    #   - for antisymmetric potentials, the faces between the voxels and the mirrored voxels are added
+    if len(idx_v) > 0:
+        for dim in range(3):
+            (idx_valid, idx_pos) = _get_neighbor(n, idx_v, idx_crd, dim)
+            if dim in sym_axis:
+                idx_f.append(dim * nv + idx_v[idx_pos])
+            else:
+                idx_f.append(dim * nv + idx_v[idx_valid])
+            idx_row_p.append(idx_valid)
+            idx_row_n.append(idx_pos)
+
+            if (dim in sym_axis) and (sym_sign[dim] < 0) and (sym_axis[dim]["offset"] == 1):
+                idx_plane = np.flatnonzero(idx_crd[dim] == 0)
+                idx_f.append(dim * nv + idx_v[idx_plane])
+                idx_row_p.append(np.full(len(idx_plane), -1, dtype=np.int64))
+                idx_row_n.append(idx_plane)
+
+    # assemble the face indices and the matrix entries
+    idx_f = np.concatenate(idx_f, dtype=np.int64) if idx_f else np.empty(0, dtype=np.int64)
+    idx_row_p = np.concatenate(idx_row_p, dtype=np.int64) if idx_row_p else np.empty(0, dtype=np.int64)
+    idx_row_n = np.concatenate(idx_row_n, dtype=np.int64) if idx_row_n else np.empty(0, dtype=np.int64)
+
+    # sort the faces (the faces with the same direction are contiguous)
+    idx_sort = np.argsort(idx_f)
+    idx_f = idx_f[idx_sort]
+    idx_row_p = idx_row_p[idx_sort]
+    idx_row_n = idx_row_n[idx_sort]
+
+    # get the matrix size
+    n_v = len(idx_v)
+    n_f = len(idx_f)
+
+    # each face is connected to two voxels (positive and negative directions)
+    #   - the faces on the symmetry planes are only connected in the negative direction
+    #   - the positive direction is connected to a mirrored voxel (not included)
+    idx_col = np.arange(n_f, dtype=np.int64)
+    idx_row = np.concatenate((idx_row_p, idx_row_n))
+    idx_col = np.concatenate((idx_col, idx_col))
+    data = np.concatenate((np.ones(n_f, dtype=np.int64), -np.ones(n_f, dtype=np.int64)))
+
+    # remove the mirrored voxels
+    idx_ok = idx_row >= 0
+    idx_row = idx_row[idx_ok]
+    idx_col = idx_col[idx_ok]
+    data = data[idx_ok]
+
+    # create the sparse matrix
+    A_net = sps.csc_matrix((data, (idx_row, idx_col)), shape=(n_v, n_f), dtype=np.int64)
+
+    return A_net, idx_f
+
+
+def get_face_direction(n, idx_f, A_net):
     """
+    Get the direction data of the faces (computed once and shared across the solver).
 
-    # extract the voxel data
-    (nx, ny, nz) = n
+    The face indices are sorted:
+        - The faces with the same direction are contiguous.
+        - The faces with a given direction are described with a slice.
+
+    The following data are computed:
+        - slc_x, slc_y, slc_z: slices with the faces of the different directions.
+        - idx_dir: direction of the faces (0 for x, 1 for y, and 2 for z).
+        - idx_crd: tensor indices of the voxels associated with the faces.
+        - idx_plane: indices of the faces located on the symmetry planes.
+    """
 
     # get total size
     nv = np.prod(n)
 
-    # voxel index array
-    x = np.arange(nx, dtype=np.int64)
-    y = np.arange(ny, dtype=np.int64)
-    z = np.arange(nz, dtype=np.int64)
-    (idx_x, idx_y, idx_z) = np.meshgrid(x, y, z, indexing="ij")
+    # get the direction of the faces
+    idx_dir = idx_f // nv
 
-    # voxel index number
-    idx = idx_x + idx_y * nx + idx_z * nx * ny
+    # get the slices for the different directions (sorted indices)
+    idx_bnd = np.searchsorted(idx_f, np.arange(4, dtype=np.int64) * nv)
+    slc_x = slice(idx_bnd[0], idx_bnd[1])
+    slc_y = slice(idx_bnd[1], idx_bnd[2])
+    slc_z = slice(idx_bnd[2], idx_bnd[3])
 
-    # create the sparse matrix
-    A_vox = sps.csc_matrix((nv, 3 * nv), dtype=np.int64)
-
-    # assign the diagonal, each voxel is connected to three faces with positive indices
-    data = np.ones(nv, dtype=np.int64)
-    idx_row_col = np.arange(nv, dtype=np.int64)
-    A_vox += sps.csc_matrix((data, (idx_row_col, 0 * nv + idx_row_col)), shape=(nv, 3 * nv), dtype=np.int64)
-    A_vox += sps.csc_matrix((data, (idx_row_col, 1 * nv + idx_row_col)), shape=(nv, 3 * nv), dtype=np.int64)
-    A_vox += sps.csc_matrix((data, (idx_row_col, 2 * nv + idx_row_col)), shape=(nv, 3 * nv), dtype=np.int64)
-
-    # faces along x direction (faces with negative indices)
-    idx_col = idx[:-1, :, :].flatten()
-    idx_row = idx[+1:, :, :].flatten()
-    data = -np.ones((nx - 1) * ny * nz, dtype=np.int64)
-    A_vox += sps.csc_matrix((data, (idx_row, 0 * nv + idx_col)), shape=(nv, 3 * nv), dtype=np.int64)
-
-    # faces along y direction (faces with negative indices)
-    idx_col = idx[:, :-1, :].flatten()
-    idx_row = idx[:, +1:, :].flatten()
-    data = -np.ones(nx * (ny - 1) * nz, dtype=np.int64)
-    A_vox += sps.csc_matrix((data, (idx_row, 1 * nv + idx_col)), shape=(nv, 3 * nv), dtype=np.int64)
-
-    # faces along z direction (faces with negative indices)
-    idx_col = idx[:, :, :-1].flatten()
-    idx_row = idx[:, :, +1:].flatten()
-    data = -np.ones(nx * ny * (nz - 1), dtype=np.int64)
-    A_vox += sps.csc_matrix((data, (idx_row, 2 * nv + idx_col)), shape=(nv, 3 * nv), dtype=np.int64)
-
-    return A_vox
+    # get the tensor indices of the faces
+    idx_crd = np.unravel_index(idx_f % nv, n, order="F")
+
+    # get the faces on the symmetry planes (connected to a single voxel)
+    idx_plane = np.flatnonzero(A_net.getnnz(axis=0) == 1)
+
+    # assign the data
+    dir_f = {
+        "slc_x": slc_x,
+        "slc_y": slc_y,
+        "slc_z": slc_z,
+        "idx_dir": idx_dir,
+        "idx_crd": idx_crd,
+        "idx_plane": idx_plane,
+    }
+
+    return dir_f
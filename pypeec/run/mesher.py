@@ -16,7 +16,6 @@ __author__ = "Thomas Guillod"
 __copyright__ = "Thomas Guillod - Dartmouth College"
 __license__ = "Mozilla Public License Version 2.0"
 
-import copy
 import scilogger
 from pypeec.lib_mesher import voxel_point
 from pypeec.lib_mesher import voxel_conflict
@@ -24,6 +23,7 @@ from pypeec.lib_mesher import voxel_resampling
 from pypeec.lib_mesher import voxel_integrity
 from pypeec.lib_mesher import voxel_summary
 from pypeec.lib_check import check_data_format
+from pypeec.utils import readonly
 
 # get a logger
 LOGGER = scilogger.get_logger(__name__, "pypeec")
@@ -226,8 +226,8 @@ def run(data_geometry):
     Handle invalid data with exceptions.
     """
 
-    # make copies of input data
-    data_geometry = copy.deepcopy(data_geometry)
+    # protect the input data (read-only views instead of copies)
+    data_geometry = readonly.get_read_only(data_geometry)
 
     # check the input data
     LOGGER.info("check the input data")
@@ -6,6 +6,7 @@ Plot the following features:
     - The scalar variable for the non-empty voxels or the point cloud.
     - The phasor variable for the non-empty voxels or the point cloud.
     - The vector variable for the non-empty voxels or the point cloud.
+    - The magnetic field for the complete voxel grid (VTK data).
     - The solver convergence and residuum.
 
 Several plot modes are available:
@@ -29,6 +30,7 @@ from pypeec.lib_plot import manage_matplotlib
 from pypeec.lib_plot import manage_plotgui
 from pypeec.lib_check import check_data_format
 from pypeec.lib_check import check_data_options
+from pypeec.utils import readonly
 
 # get a logger
 LOGGER = scilogger.get_logger(__name__, "pypeec")
@@ -85,6 +87,8 @@ def _get_grid_voxel(data_init, data_sweep):
             voxel = parse_plotter.set_voxel_vector(voxel, idx, idx_vm, var, name)
         elif cat == "cloud":
             point = parse_plotter.set_point_cloud(point, var, name)
+        elif cat == "grid":
+            grid = parse_plotter.set_grid_vector(grid, var, name)
         else:
             raise ValueError("invalid variable type")
 
@@ -173,6 +177,10 @@ def run(
     Handle invalid data with exceptions.
     """
 
+    # protect the input data (read-only views instead of copies)
+    data_solution = readonly.get_read_only(data_solution)
+    data_plotter = readonly.get_read_only(data_plotter)
+
     # check the solution data
     LOGGER.info("check the solution data")
     (data_init, data_sweep) = _run_extract_solution(data_solution)
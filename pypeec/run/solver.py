@@ -11,19 +11,22 @@ __author__ = "Thomas Guillod"
 __copyright__ = "Thomas Guillod - Dartmouth College"
 __license__ = "Mozilla Public License Version 2.0"
 
-import copy
 import scilogger
 from pypeec.lib_solver import sweep_joblib
+from pypeec.lib_solver import sweep_checkpoint
 from pypeec.lib_solver import voxel_geometry
 from pypeec.lib_solver import system_tensor
 from pypeec.lib_solver import problem_geometry
 from pypeec.lib_solver import problem_value
 from pypeec.lib_solver import system_matrix
+from pypeec.lib_solver import system_coarse
 from pypeec.lib_solver import equation_system
 from pypeec.lib_solver import equation_solver
 from pypeec.lib_solver import extract_solution
 from pypeec.lib_solver import extract_convergence
+from pypeec.lib_solver import monitor_resource
 from pypeec.lib_check import check_data_format
+from pypeec.utils import readonly
 
 
 # get a logger
@@ -34,8 +37,8 @@ def _run_solver_init(data_solver):
     """
     Initialize the solver (independent of the solver sweeps):
         - Load and configure the optional libraries.
+        - Parse the problem geometry (materials, sources, and symmetries).
         - Get the voxel geometry and the incidence matrix.
-        - Parse the problem geometry (materials and sources).
         - Compute the Green functions.
         - Get the dense operators.
     """
@@ -46,30 +49,23 @@ def _run_solver_init(data_solver):
     c = data_solver["c"]
     parallel_sweep = data_solver["parallel_sweep"]
     integral_simplify = data_solver["integral_simplify"]
+    near_field = data_solver["near_field"]
+    multilevel_options = data_solver["multilevel_options"]
+    field_options = data_solver["field_options"]
     dense_options = data_solver["dense_options"]
     source_def = data_solver["source_def"]
     material_def = data_solver["material_def"]
     domain_def = data_solver["domain_def"]
     component_def = data_solver["component_def"]
+    symmetry_def = data_solver["symmetry_def"]
     pts_cloud = data_solver["pts_cloud"]
     sweep_solver = data_solver["sweep_solver"]
 
-    # get the voxel geometry and the incidence matrix
-    with LOGGER.BlockTimer("voxel_geometry"):
-        # get the coordinate of the voxels
-        pts_vox = voxel_geometry.get_voxel_coordinate(
-            n,
-            d,
-            c,
-        )
+    # init the performance record (time and memory of the stages)
+    performance = {}
 
-        # compute the incidence matrix
-        A_vox = voxel_geometry.get_incidence_matrix(
-            n,
-        )
-
-    # parse the problem geometry (materials and sources)
-    with LOGGER.BlockTimer("problem_geometry"):
+    # parse the problem geometry (materials, sources, and symmetries)
+    with LOGGER.BlockTimer("problem_geometry"), monitor_resource.get_stage(performance, "problem_geometry"):
         # get indices
         (idx_vc, idx_vm, material_idx) = problem_geometry.get_material_idx(
             material_def,
@@ -102,21 +98,55 @@ def _run_solver_init(data_solver):
             component_def,
         )
 
-        # reduce the incidence matrix to the non-empty voxels and compute face indices
-        (pts_net_c, A_net_c, idx_fc) = problem_geometry.get_reduce_matrix(
-            pts_vox,
-            A_vox,
+        # get the symmetry planes
+        (sym_axis, sym_c, sym_m) = problem_geometry.get_symmetry(
+            n,
+            d,
+            c,
+            symmetry_def,
+        )
+
+    # get the voxel geometry and the incidence matrix (only for the non-empty voxels)
+    with LOGGER.BlockTimer("voxel_geometry"), monitor_resource.get_stage(performance, "voxel_geometry"):
+        # get the coordinate of the voxels
+        pts_net_c = voxel_geometry.get_voxel_coordinate(
+            n,
+            d,
+            c,
+            idx_vc,
+        )
+        pts_net_m = voxel_geometry.get_voxel_coordinate(
+            n,
+            d,
+            c,
+            idx_vm,
+        )
+
+        # compute the incidence matrix and the face indices
+        (A_net_c, idx_fc) = voxel_geometry.get_incidence_matrix(
+            n,
             idx_vc,
+            sym_axis,
+            sym_c,
         )
-        (pts_net_m, A_net_m, idx_fm) = problem_geometry.get_reduce_matrix(
-            pts_vox,
-            A_vox,
+        (A_net_m, idx_fm) = voxel_geometry.get_incidence_matrix(
+            n,
             idx_vm,
+            sym_axis,
+            sym_m,
         )
 
-        # free memory
-        del pts_vox
-        del A_vox
+        # get the direction data of the faces
+        dir_fc = voxel_geometry.get_face_direction(
+            n,
+            idx_fc,
+            A_net_c,
+        )
+        dir_fm = voxel_geometry.get_face_direction(
+            n,
+            idx_fm,
+            A_net_m,
+        )
 
         # get a summary of the problem size
         problem_status = problem_geometry.get_status(
@@ -130,7 +160,7 @@ def _run_solver_init(data_solver):
         )
 
     # compute the Green functions
-    with LOGGER.BlockTimer("system_tensor"):
+    with LOGGER.BlockTimer("system_tensor"), monitor_resource.get_stage(performance, "system_tensor"):
         # Green function self-coefficient
         G_self = system_tensor.get_green_self(
             d,
@@ -151,15 +181,51 @@ def _run_solver_init(data_solver):
             has_magnetic,
         )
 
+        # magnetic field functions (voxel grid)
+        F_tsr = system_tensor.get_field_tensor(
+            n,
+            d,
+            field_options["grid"],
+        )
+
+        # Green function image coefficients (symmetry planes)
+        G_image = system_tensor.get_green_image(
+            n,
+            d,
+            integral_simplify,
+            sym_axis,
+        )
+
+        # coupling function image coefficients (symmetry planes)
+        K_image = system_tensor.get_coupling_image(
+            n,
+            d,
+            integral_simplify,
+            has_magnetic,
+            sym_axis,
+        )
+
+        # magnetic field image functions (symmetry planes)
+        F_image = system_tensor.get_field_image(
+            n,
+            d,
+            field_options["grid"],
+            sym_axis,
+        )
+
     # get the dense operators
-    with LOGGER.BlockTimer("system_matrix"):
+    with LOGGER.BlockTimer("system_matrix"), monitor_resource.get_stage(performance, "system_matrix"):
         # get the inductance tensor (preconditioner and full problem)
         (L_c, L_op_c) = system_matrix.get_inductance_matrix(
             n,
             d,
             idx_fc,
+            dir_fc,
             G_self,
             G_mutual,
+            G_image,
+            sym_c,
+            near_field,
             dense_options,
         )
 
@@ -169,12 +235,26 @@ def _run_solver_init(data_solver):
             idx_vm,
             G_self,
             G_mutual,
+            G_image,
+            sym_m,
             dense_options,
         )
 
+        # get the coarse system (multilevel preconditioner)
+        coarse_data = system_coarse.get_coarse_system(
+            n,
+            d,
+            idx_vc,
+            idx_fc,
+            A_net_c,
+            G_mutual,
+            multilevel_options,
+        )
+
         # free memory
         del G_self
         del G_mutual
+        del G_image
 
         # get the coupling matrices
         (K_op_c, K_op_m) = system_matrix.get_coupling_matrix(
@@ -183,14 +263,36 @@ def _run_solver_init(data_solver):
             idx_vm,
             idx_fc,
             idx_fm,
+            dir_fc,
+            dir_fm,
             A_net_c,
             A_net_m,
             K_tsr,
+            K_image,
+            sym_c,
+            sym_m,
             dense_options,
         )
 
         # free memory
         del K_tsr
+        del K_image
+
+        # get the magnetic field matrices (voxel grid)
+        (F_op_c, F_op_m) = system_matrix.get_field_matrix(
+            n,
+            idx_vc,
+            idx_vm,
+            F_tsr,
+            F_image,
+            sym_c,
+            sym_m,
+            dense_options,
+        )
+
+        # free memory
+        del F_tsr
+        del F_image
 
     # assign the results (internal data required to solve the problem)
     data_internal = {
@@ -198,6 +300,8 @@ def _run_solver_init(data_solver):
         "idx_vm": idx_vm,
         "idx_fc": idx_fc,
         "idx_fm": idx_fm,
+        "dir_fc": dir_fc,
+        "dir_fm": dir_fm,
         "idx_src_c": idx_src_c,
         "idx_src_v": idx_src_v,
         "A_net_c": A_net_c,
@@ -208,10 +312,16 @@ def _run_solver_init(data_solver):
         "P_op_m": P_op_m,
         "K_op_c": K_op_c,
         "K_op_m": K_op_m,
+        "F_op_c": F_op_c,
+        "F_op_m": F_op_m,
+        "coarse_data": coarse_data,
         "material_idx": material_idx,
         "source_idx": source_idx,
         "pts_net_c": pts_net_c,
         "pts_net_m": pts_net_m,
+        "sym_axis": sym_axis,
+        "sym_c": sym_c,
+        "sym_m": sym_m,
     }
 
     # assign the results (will be merged in the solver output)
@@ -229,12 +339,13 @@ def _run_solver_init(data_solver):
         "pts_cloud": pts_cloud,
         "pts_net_c": pts_net_c,
         "pts_net_m": pts_net_m,
+        "performance": performance,
     }
 
     return data_init, data_internal, sweep_solver, parallel_sweep
 
 
-def _run_solver_sweep(data_solver, data_internal, data_param, sol_init):
+def _run_solver_sweep(data_solver, data_internal, data_param, sol_init, checkpoint):
     """
     Solve the problem (for a given solver sweep):
         - Load and configure the numerical libraries.
@@ -245,9 +356,10 @@ def _run_solver_sweep(data_solver, data_internal, data_param, sol_init):
     """
 
     # extract the data
-    n = data_solver["n"]
     d = data_solver["d"]
     biot_savart = data_solver["biot_savart"]
+    field_options = data_solver["field_options"]
+    output_options = data_solver["output_options"]
     factorization_options = data_solver["factorization_options"]
     condition_options = data_solver["condition_options"]
     solver_options = data_solver["solver_options"]
@@ -258,6 +370,8 @@ def _run_solver_sweep(data_solver, data_internal, data_param, sol_init):
     idx_vm = data_internal["idx_vm"]
     idx_fc = data_internal["idx_fc"]
     idx_fm = data_internal["idx_fm"]
+    dir_fc = data_internal["dir_fc"]
+    dir_fm = data_internal["dir_fm"]
     idx_src_c = data_internal["idx_src_c"]
     idx_src_v = data_internal["idx_src_v"]
     A_net_c = data_internal["A_net_c"]
@@ -268,18 +382,27 @@ def _run_solver_sweep(data_solver, data_internal, data_param, sol_init):
     P_op_m = data_internal["P_op_m"]
     K_op_c = data_internal["K_op_c"]
     K_op_m = data_internal["K_op_m"]
+    F_op_c = data_internal["F_op_c"]
+    F_op_m = data_internal["F_op_m"]
+    coarse_data = data_internal["coarse_data"]
     material_idx = data_internal["material_idx"]
     source_idx = data_internal["source_idx"]
     pts_net_c = data_internal["pts_net_c"]
     pts_net_m = data_internal["pts_net_m"]
+    sym_axis = data_internal["sym_axis"]
+    sym_c = data_internal["sym_c"]
+    sym_m = data_internal["sym_m"]
 
     # extract the data
     freq = data_param["freq"]
     material_val = data_param["material_val"]
     source_val = data_param["source_val"]
 
+    # init the performance record (time and memory of the stages)
+    performance = {}
+
     # get the material and source values
-    with LOGGER.BlockTimer("problem_value"):
+    with LOGGER.BlockTimer("problem_value"), monitor_resource.get_stage(performance, "problem_value"):
         # complete value
         material_all = problem_value.get_material_value(
             material_val,
@@ -305,22 +428,20 @@ def _run_solver_sweep(data_solver, data_internal, data_param, sol_init):
 
         # get the resistance vector
         R_c = problem_value.get_resistance_vector(
-            n,
             d,
             A_net_c,
-            idx_fc,
+            dir_fc,
             rho_vc,
         )
         R_m = problem_value.get_resistance_vector(
-            n,
             d,
             A_net_m,
-            idx_fm,
+            dir_fm,
             rho_vm,
         )
 
     # assemble the equation system
-    with LOGGER.BlockTimer("equation_system"):
+    with LOGGER.BlockTimer("equation_system"), monitor_resource.get_stage(performance, "equation_system"):
         # get the source connection matrices
         (A_src, n_src) = equation_system.get_source_matrix(
             idx_vc,
@@ -361,6 +482,18 @@ def _run_solver_sweep(data_solver, data_internal, data_param, sol_init):
             P_m,
         )
 
+        # get the coarse system for the multilevel preconditioner
+        coarse_mat = system_coarse.get_coarse_matrix(
+            freq,
+            R_c,
+            A_src,
+            coarse_data,
+        )
+
+        # cache the last products of the dense operators (shared with the solution extraction)
+        L_op_c = equation_system.get_operator_cache(L_op_c)
+        K_op_c = equation_system.get_operator_cache(K_op_c)
+
         # get the linear operator for the full system (matrix-vector multiplication)
         fct_sys_cm = equation_system.get_system_operator(
             freq,
@@ -373,6 +506,14 @@ def _run_solver_sweep(data_solver, data_internal, data_param, sol_init):
             P_op_m,
         )
 
+        # check if the preconditioner is an exact representation of the system
+        sys_exact = equation_system.get_system_exact(
+            freq,
+            n_vm,
+            n_fm,
+            factorization_options,
+        )
+
         # get the linear operator for the electric-magnetic coupling
         fct_cpl_cm = equation_system.get_coupling_operator(
             freq,
@@ -386,7 +527,7 @@ def _run_solver_sweep(data_solver, data_internal, data_param, sol_init):
         )
 
     # get a function to evaluate the solver convergence
-    with LOGGER.BlockTimer("extract_convergence"):
+    with LOGGER.BlockTimer("extract_convergence"), monitor_resource.get_stage(performance, "extract_convergence"):
         fct_conv = extract_convergence.get_fct_conv(
             freq,
             source_all,
@@ -394,7 +535,7 @@ def _run_solver_sweep(data_solver, data_internal, data_param, sol_init):
         )
 
     # solve the equation system
-    with LOGGER.BlockTimer("equation_solver"):
+    with LOGGER.BlockTimer("equation_solver"), monitor_resource.get_stage(performance, "equation_solver"):
         # factorization of the preconditioner (sparse matrices)
         (fct_pcd_cm, cond_mat_cm) = equation_solver.get_factorization(
             pcd_mat_cm,
@@ -404,6 +545,12 @@ def _run_solver_sweep(data_solver, data_internal, data_param, sol_init):
         # free memory
         del pcd_mat_cm
 
+        # factorization of the coarse system (multilevel preconditioner)
+        fct_coarse = equation_solver.get_multilevel(coarse_mat)
+
+        # free memory
+        del coarse_mat
+
         # estimate the condition number of the problem (to detect quasi-singular problem)
         (condition_ok, condition_status) = equation_solver.get_condition(
             cond_mat_cm,
@@ -419,13 +566,17 @@ def _run_solver_sweep(data_solver, data_internal, data_param, sol_init):
             fct_cpl_cm,
             fct_sys_cm,
             fct_pcd_cm,
+            fct_coarse,
             rhs_cm,
+            sys_exact,
             fct_conv,
+            checkpoint,
             solver_options,
         )
 
         # free memory
         del fct_pcd_cm
+        del fct_coarse
         del fct_cpl_cm
         del fct_sys_cm
         del fct_conv
@@ -433,8 +584,11 @@ def _run_solver_sweep(data_solver, data_internal, data_param, sol_init):
         # compute convergence
         solution_ok = solver_ok and condition_ok
 
+    # get the field variables to be extracted
+    (field_select, keep_solution) = extract_solution.get_output_select(output_options)
+
     # extract the solution
-    with LOGGER.BlockTimer("extract_solution"):
+    with LOGGER.BlockTimer("extract_solution"), monitor_resource.get_stage(performance, "extract_solution"):
         # split the solution vector to get the face currents, the voxel potentials, and the sources
         (I_fc, V_vc, I_fm, V_vm, I_src) = extract_solution.get_sol_extract(
             sol,
@@ -457,46 +611,6 @@ def _run_solver_sweep(data_solver, data_internal, data_param, sol_init):
             K_op_c,
         )
 
-        # get the voxel flow densities from the face flows
-        J_vc = extract_solution.get_vector_density(
-            n,
-            d,
-            idx_fc,
-            A_net_c,
-            I_fc,
-        )
-        B_vm = extract_solution.get_vector_density(
-            n,
-            d,
-            idx_fm,
-            A_net_m,
-            I_fm,
-        )
-
-        # get the voxel loss densities from the face losses
-        P_vc = extract_solution.get_scalar_density(
-            d,
-            A_net_c,
-            P_fc,
-        )
-        P_vm = extract_solution.get_scalar_density(
-            d,
-            A_net_m,
-            P_fm,
-        )
-
-        # get the divergence of the face flows
-        S_vc = extract_solution.get_divergence_density(
-            d,
-            A_net_c,
-            I_fc,
-        )
-        Q_vm = extract_solution.get_divergence_density(
-            d,
-            A_net_m,
-            I_fm,
-        )
-
         # get the domain losses for the different materials
         material_losses = extract_solution.get_material(
             material_all,
@@ -523,38 +637,114 @@ def _run_solver_sweep(data_solver, data_internal, data_param, sol_init):
             S_total,
         )
 
-        # get the cloud point magnetic field (contributions of the electric domains)
-        H_pts_c = extract_solution.get_magnetic_field_electric(
-            n,
-            d,
-            idx_fc,
-            A_net_c,
-            I_fc,
-            pts_net_c,
-            pts_cloud,
-            biot_savart,
-        )
+        # init the field variables
+        field_values = {}
 
-        # get the cloud point magnetic field (contributions of the magnetic domains)
-        H_pts_m = extract_solution.get_magnetic_field_magnetic(
-            A_net_m,
-            I_fm,
-            pts_net_m,
-            pts_cloud,
-        )
-
-    # assemble solution
-    field_values = {
-        "V_c": {"var": V_vc, "cat": "scalar_electric"},
-        "P_c": {"var": P_vc, "cat": "scalar_electric"},
-        "S_c": {"var": S_vc, "cat": "scalar_electric"},
-        "J_c": {"var": J_vc, "cat": "vector_electric"},
-        "V_m": {"var": V_vm, "cat": "scalar_magnetic"},
-        "P_m": {"var": P_vm, "cat": "scalar_magnetic"},
-        "Q_m": {"var": Q_vm, "cat": "scalar_magnetic"},
-        "B_m": {"var": B_vm, "cat": "vector_magnetic"},
-        "H_p": {"var": H_pts_c + H_pts_m, "cat": "cloud"},
-    }
+        # get the voxel potentials
+        if "V_c" in field_select:
+            field_values["V_c"] = {"var": V_vc, "cat": "scalar_electric"}
+        if "V_m" in field_select:
+            field_values["V_m"] = {"var": V_vm, "cat": "scalar_magnetic"}
+
+        # get the voxel flow densities from the face flows
+        if "J_c" in field_select:
+            J_vc = extract_solution.get_vector_density(
+                d,
+                dir_fc,
+                A_net_c,
+                I_fc,
+            )
+            field_values["J_c"] = {"var": J_vc, "cat": "vector_electric"}
+        if "B_m" in field_select:
+            B_vm = extract_solution.get_vector_density(
+                d,
+                dir_fm,
+                A_net_m,
+                I_fm,
+            )
+            field_values["B_m"] = {"var": B_vm, "cat": "vector_magnetic"}
+
+        # get the voxel loss densities from the face losses
+        if "P_c" in field_select:
+            P_vc = extract_solution.get_scalar_density(
+                d,
+                A_net_c,
+                P_fc,
+            )
+            field_values["P_c"] = {"var": P_vc, "cat": "scalar_electric"}
+        if "P_m" in field_select:
+            P_vm = extract_solution.get_scalar_density(
+                d,
+                A_net_m,
+                P_fm,
+            )
+            field_values["P_m"] = {"var": P_vm, "cat": "scalar_magnetic"}
+
+        # get the divergence of the face flows
+        if "S_c" in field_select:
+            S_vc = extract_solution.get_divergence_density(
+                d,
+                A_net_c,
+                I_fc,
+            )
+            field_values["S_c"] = {"var": S_vc, "cat": "scalar_electric"}
+        if "Q_m" in field_select:
+            Q_vm = extract_solution.get_divergence_density(
+                d,
+                A_net_m,
+                I_fm,
+            )
+            field_values["Q_m"] = {"var": Q_vm, "cat": "scalar_magnetic"}
+
+        # get the cloud point magnetic field
+        if "H_p" in field_select:
+            # contributions of the electric domains
+            H_pts_c = extract_solution.get_magnetic_field_electric(
+                d,
+                dir_fc,
+                A_net_c,
+                I_fc,
+                pts_net_c,
+                pts_cloud,
+                sym_axis,
+                sym_c,
+                biot_savart,
+                field_options,
+            )
+
+            # contributions of the magnetic domains
+            H_pts_m = extract_solution.get_magnetic_field_magnetic(
+                A_net_m,
+                I_fm,
+                pts_net_m,
+                pts_cloud,
+                sym_axis,
+                sym_m,
+                field_options,
+            )
+
+            # assemble the contributions
+            field_values["H_p"] = {"var": H_pts_c + H_pts_m, "cat": "cloud"}
+
+        # get the voxel grid magnetic field (contributions of the electric and magnetic domains)
+        if ("H_g" in field_select) and field_options["grid"]:
+            H_grid = extract_solution.get_magnetic_field_grid(
+                d,
+                dir_fc,
+                A_net_c,
+                A_net_m,
+                I_fc,
+                I_fm,
+                F_op_c,
+                F_op_m,
+            )
+            field_values["H_g"] = {"var": H_grid, "cat": "grid"}
+
+        # get the raw solution vector
+        if keep_solution:
+            solution_vector = sol
+        else:
+            solution_vector = None
 
     # assign the results (will be merged in the solver output)
     data_sweep = {
@@ -569,18 +759,43 @@ def _run_solver_sweep(data_solver, data_internal, data_param, sol_init):
         "material_losses": material_losses,  # dict with the losses in the different materials
         "source_values": source_values,  # dict with the terminal current, voltage, and power
         "field_values": field_values,  # dict with the field variables
+        "solution_vector": solution_vector,  # raw solution vector (if selected)
+        "performance": performance,  # dict with the time and memory of the stages
     }
 
     return data_sweep, sol
 
 
-def _run_parallel_sweep(tag, sol_init, data_solver, data_internal, data_param):
+def _run_parallel_sweep(tag, init_chain, data_solver, data_internal, data_param):
     """
     Wrapper to solve a sweep in parallel (ensure that everything can be serialized).
     """
 
+    # extract the data
+    checkpoint_options = data_solver["checkpoint_options"]
+    extrapolation_options = data_solver["extrapolation_options"]
+    freq = data_param["freq"]
+
+    # get a key identifying the sweep (for the checkpoints)
+    key = sweep_checkpoint.get_key(tag, data_solver, data_param)
+
     with LOGGER.BlockTimer("sweep / %s" % tag):
-        (data_sweep, sol) = _run_solver_sweep(data_solver, data_internal, data_param, sol_init)
+        # load the completed sweep (if available)
+        data_load = sweep_checkpoint.get_sweep_load(tag, key, checkpoint_options)
+        if data_load is not None:
+            return data_load
+
+        # get the initial solution (from the parent sweeps)
+        sol_init = equation_solver.get_extrapolate(freq, init_chain, extrapolation_options)
+
+        # get the iteration checkpoint (for restarting the solver)
+        checkpoint = sweep_checkpoint.get_iter_checkpoint(tag, key, checkpoint_options)
+
+        # solve the sweep
+        (data_sweep, sol) = _run_solver_sweep(data_solver, data_internal, data_param, sol_init, checkpoint)
+
+        # save the completed sweep
+        sweep_checkpoint.get_sweep_save(tag, key, data_sweep, sol, checkpoint_options)
 
     return data_sweep, sol
 
@@ -615,15 +830,15 @@ def run(data_voxel, data_problem, data_tolerance):
     Handle invalid data with exceptions.
     """
 
-    # make copies of inputs
-    data_voxel = copy.deepcopy(data_voxel)
-    data_problem = copy.deepcopy(data_problem)
-    data_tolerance = copy.deepcopy(data_tolerance)
+    # protect the inputs (read-only views instead of copies)
+    data_voxel = readonly.get_read_only(data_voxel)
+    data_problem = readonly.get_read_only(data_problem)
+    data_tolerance = readonly.get_read_only(data_tolerance)
 
     # check the input data
     LOGGER.info("check the input data")
-    check_data_format.check_data_problem(data_problem)
-    check_data_format.check_data_tolerance(data_tolerance)
+    data_problem = check_data_format.check_data_problem(data_problem)
+    data_tolerance = check_data_format.check_data_tolerance(data_tolerance)
 
     # combine the problem and voxel data
     LOGGER.info("combine the input data")
@@ -634,11 +849,14 @@ def run(data_voxel, data_problem, data_tolerance):
         (data_init, data_internal, sweep_solver, parallel_sweep) = _run_solver_init(data_solver)
 
     # function for solving a single sweep
-    def fct_compute(tag, data_param, sol_init):
-        return _run_parallel_sweep(tag, sol_init, data_solver, data_internal, data_param)
+    def fct_compute(tag, data_param, init_chain):
+        return _run_parallel_sweep(tag, init_chain, data_solver, data_internal, data_param)
+
+    # get the length of the chain of parent sweeps (for the extrapolation)
+    n_chain = data_solver["extrapolation_options"]["order"] + 1
 
     # solve the different sweeps
-    data_sweep = sweep_joblib.get_run_sweep(parallel_sweep, sweep_solver, fct_compute)
+    data_sweep = sweep_joblib.get_run_sweep(parallel_sweep, sweep_solver, fct_compute, n_chain)
 
     # get the gloval status
     data_solution = _run_assemble_solution(data_init, data_sweep)
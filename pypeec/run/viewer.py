@@ -28,6 +28,7 @@ from pypeec.lib_plot import manage_matplotlib
 from pypeec.lib_plot import manage_plotgui
 from pypeec.lib_check import check_data_format
 from pypeec.lib_check import check_data_options
+from pypeec.utils import readonly
 
 # get a logger
 LOGGER = scilogger.get_logger(__name__, "pypeec")
@@ -108,6 +109,10 @@ def run(
     Handle invalid data with exceptions.
     """
 
+    # protect the input data (read-only views instead of copies)
+    data_voxel = readonly.get_read_only(data_voxel)
+    data_viewer = readonly.get_read_only(data_viewer)
+
     # check the input data
     LOGGER.info("check the input data")
     check_data_format.check_data_viewer(data_viewer)
@@ -0,0 +1,66 @@
+"""
+Module for computing keys identifying data (hash of the content).
+
+The keys are used to identify inputs with identical content:
+    - The hash is computed with the content of arrays and sparse matrices.
+    - The dicts, lists, and tuples are hashed recursively.
+    - The other objects (scalars and strings) are hashed with their representation.
+    - The tag of the key is used to separate different types of data.
+"""
+
+__author__ = "Thomas Guillod"
+__copyright__ = "Thomas Guillod - Dartmouth College"
+__license__ = "Mozilla Public License Version 2.0"
+
+import hashlib
+import numpy as np
+import scipy.sparse as sps
+
+
+def _get_hash_update(hsh, data):
+    """
+    Update a hash with the provided data (recursive function).
+    """
+
+    if isinstance(data, dict):
+        hsh.update(b"dict")
+        for tag in sorted(data.keys()):
+            hsh.update(repr(tag).encode())
+            _get_hash_update(hsh, data[tag])
+    elif isinstance(data, (list, tuple)):
+        hsh.update(b"list")
+        for data_tmp in data:
+            _get_hash_update(hsh, data_tmp)
+    elif sps.issparse(data):
+        data = data.tocsc()
+        hsh.update(repr(("sparse", data.shape, data.dtype.str)).encode())
+        hsh.update(np.ascontiguousarray(data.data).tobytes())
+        hsh.update(np.ascontiguousarray(data.indices).tobytes())
+        hsh.update(np.ascontiguousarray(data.indptr).tobytes())
+    elif isinstance(data, np.ndarray):
+        hsh.update(repr(("array", data.shape, data.dtype.str)).encode())
+        hsh.update(np.ascontiguousarray(data).tobytes())
+    else:
+        hsh.update(repr(("scalar", data)).encode())
+
+    return hsh
+
+
+def get_key(tag, data):
+    """
+    Get a key identifying the provided data.
+    The data can contain arrays, sparse matrices, scalars, lists, and dicts.
+    Hashing large matrices is expensive, the key should only be computed if required.
+    """
+
+    # init the hash
+    hsh = hashlib.sha256()
+
+    # hash the data
+    hsh.update(tag.encode())
+    hsh = _get_hash_update(hsh, data)
+
+    # get the key
+    key = (tag, hsh.hexdigest())
+
+    return key
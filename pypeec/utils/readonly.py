@@ -0,0 +1,46 @@
+"""
+Module for protecting the user provided data (without copying the data).
+
+The input data are not copied (deep copies are expensive for large arrays):
+    - The containers (dicts, lists, and tuples) are recreated (shallow copies).
+    - The arrays are replaced by views which are marked as non-writeable.
+    - The immutable objects (scalars and strings) are shared.
+    - The other objects (e.g., meshes) are copied (deep copies).
+
+With this method, the data of the caller are never mutated:
+    - Adding/removing/replacing entries only affects the recreated containers.
+    - Any in-place modification of the arrays raises an exception.
+    - The arrays of the caller remain writeable (only the views are protected).
+"""
+
+__author__ = "Thomas Guillod"
+__copyright__ = "Thomas Guillod - Dartmouth College"
+__license__ = "Mozilla Public License Version 2.0"
+
+import copy
+import numpy as np
+
+# immutable objects (shared with the caller)
+IMMUTABLE = (type(None), bool, int, float, complex, str, bytes, np.generic)
+
+
+def get_read_only(data):
+    """
+    Get a read-only version of the provided data (recursive).
+    The containers are recreated and the arrays are replaced by non-writeable views.
+    The mutable objects which are not arrays are copied.
+    """
+
+    if isinstance(data, dict):
+        data = {key: get_read_only(val) for key, val in data.items()}
+    elif isinstance(data, list):
+        data = [get_read_only(val) for val in data]
+    elif isinstance(data, tuple):
+        data = tuple(get_read_only(val) for val in data)
+    elif isinstance(data, np.ndarray):
+        data = data.view()
+        data.flags.writeable = False
+    elif not isinstance(data, IMMUTABLE):
+        data = copy.deepcopy(data)
+
+    return data
@@ -25,12 +25,12 @@ scilogger.disable()
 PATH_ROOT = os.path.dirname(__file__)
 
 
-def _create_temp_file():
+def _create_temp_file(suffix=".mpk"):
     """
     Get a temporary file.
     """
 
-    (_, filename) = tempfile.mkstemp(suffix=".mpk")
+    (_, filename) = tempfile.mkstemp(suffix=suffix)
 
     return filename
 
@@ -46,6 +46,37 @@ def _delete_temp_file(filename):
         pass
 
 
+def _get_merge(data, data_update):
+    """
+    Merge (recursively) the content of a dict into another dict.
+    """
+
+    for key, value in data_update.items():
+        if isinstance(value, dict) and isinstance(data.get(key), dict):
+            _get_merge(data[key], value)
+        else:
+            data[key] = value
+
+
+def _get_tolerance(file_tolerance, tolerance):
+    """
+    Get a tolerance file with custom numerical options.
+    The custom options are merged into the default tolerance file.
+    """
+
+    # load the default tolerance file
+    data_tolerance = scisave.load_config(file_tolerance)
+
+    # merge the custom options
+    _get_merge(data_tolerance, tolerance)
+
+    # write the custom tolerance file
+    file_tolerance = _create_temp_file(".json")
+    scisave.write_data(file_tolerance, data_tolerance)
+
+    return file_tolerance
+
+
 def _get_run_mesher(use_script, file_geometry, file_voxel):
     """
     Run the mesher.
@@ -158,7 +189,7 @@ def _get_run_plotter(use_script, file_plotter, file_solution):
         )
 
 
-def run_workflow(name, use_script):
+def run_workflow(name, use_script, tolerance, plot=True):
     """
     Run the complete workflow:
         - Run the mesher.
@@ -172,6 +203,9 @@ def run_workflow(name, use_script):
     The workflow can be run with two modes:
         - With the command line script (pypeec.script).
         - With the API (pypeec.main).
+
+    Custom numerical options can be merged into the default tolerance file.
+    The plotter and the viewer can be disabled (only the mesher and the solver are run).
     """
 
     # construct the folder path for the examples
@@ -190,13 +224,18 @@ def run_workflow(name, use_script):
     file_voxel = _create_temp_file()
     file_solution = _create_temp_file()
 
+    # get the custom tolerance file
+    if tolerance is not None:
+        file_tolerance = _get_tolerance(file_tolerance, tolerance)
+
     # run the workflow and load the results
     try:
         # run the workflow
         _get_run_mesher(use_script, file_geometry, file_voxel)
         _get_run_solver(use_script, file_problem, file_tolerance, file_voxel, file_solution)
-        _get_run_plotter(use_script, file_plotter, file_solution)
-        _get_run_viewer(use_script, file_viewer, file_voxel)
+        if plot:
+            _get_run_plotter(use_script, file_plotter, file_solution)
+            _get_run_viewer(use_script, file_viewer, file_voxel)
 
         # load the files
         data_voxel = scisave.load_data(file_voxel)
@@ -205,5 +244,7 @@ def run_workflow(name, use_script):
         # delete the temporary files
         _delete_temp_file(file_voxel)
         _delete_temp_file(file_solution)
+        if tolerance is not None:
+            _delete_temp_file(file_tolerance)
 
     return data_voxel, data_solution
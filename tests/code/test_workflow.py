@@ -77,7 +77,7 @@ class TestWorkflow(unittest.TestCase):
         for solver_tmp, solver_ref_tmp in zip(solver.values(), solver_ref.values(), strict=True):
             self._check_solver(solver_tmp, solver_ref_tmp, test_tol)
 
-    def run_test(self, tag, name, use_script):
+    def run_test(self, tag, name, use_script, tolerance):
         """
         Run the workflow and check the results.
         """
@@ -98,7 +98,7 @@ class TestWorkflow(unittest.TestCase):
         test_set = bool(int(test_set))
 
         # generate the results
-        (data_voxel, data_solution) = test_pypeec.run_workflow(name, use_script)
+        (data_voxel, data_solution) = test_pypeec.run_workflow(name, use_script, tolerance)
 
         # parse the obtained results
         (mesher, solver) = test_generate.generate_results(data_voxel, data_solution)
@@ -113,14 +113,15 @@ class TestWorkflow(unittest.TestCase):
             self._check_results(mesher, solver, mesher_ref, solver_ref, test_tol)
 
 
-def set_test(test_class, tag, name, use_script):
+def set_test(test_class, tag, name, use_script, tolerance=None):
     """
     Add a test case to the test class.
+    The default tolerance file can be updated with custom numerical options.
     """
 
     # function describing the test
     def get(self):
-        return test_class.run_test(self, tag, name, use_script)
+        return test_class.run_test(self, tag, name, use_script, tolerance)
 
     # dynamically add the method as an attribute
     setattr(test_class, "test/" + tag, get)
@@ -0,0 +1,181 @@
+"""
+Test the matrix computations (dense multiplication and iterative solvers).
+"""
+
+__author__ = "Thomas Guillod"
+__copyright__ = "Thomas Guillod - Dartmouth College"
+__license__ = "Mozilla Public License Version 2.0"
+
+import unittest
+import numpy as np
+import scipy.sparse.linalg as sla
+from pypeec.lib_matrix import multiply_box
+from pypeec.lib_matrix import multiply_fft
+from pypeec.lib_matrix import matrix_iterative
+
+# options for the FFT library
+FFT_OPTIONS = {
+    "library": "NumPy",
+    "scipy_worker": 1,
+    "fftw_thread": 1,
+    "fftw_cache": False,
+    "fftw_timeout": 1.0,
+    "fftw_byte_align": 8,
+}
+
+# options for the sub-box decomposition
+BOX_SINGLE = {"decompose": False, "fill_min": 0.5, "volume_min": 1}
+BOX_DECOMPOSE = {"decompose": True, "fill_min": 0.5, "volume_min": 1}
+
+# options for the iterative solvers
+ITER_OPTIONS = {
+    "rel_tol": 1e-10,
+    "abs_tol": 1e-14,
+    "n_inner": 10,
+    "n_outer": 50,
+    "n_callback": 1,
+    "size_max": None,
+}
+
+
+def _get_sparse_geometry(n):
+    """
+    Get a sparse voxel structure (two thin layers separated by a large gap).
+    """
+
+    # get the occupied voxels
+    occupancy = np.zeros(n, dtype=bool)
+    occupancy[:, :, 0:2] = True
+    occupancy[2:-2, 2:-2, -2:] = True
+
+    # get the voxel indices
+    idx_vox = np.flatnonzero(occupancy.flatten(order="F"))
+
+    return idx_vox
+
+
+def _get_system(n_dof):
+    """
+    Get a small non-Hermitian complex equation system and a Jacobi preconditioner.
+    """
+
+    # get the random generator
+    rng = np.random.default_rng(1234)
+
+    # get the diagonally dominant matrix
+    mat = rng.standard_normal((n_dof, n_dof)) + 1j * rng.standard_normal((n_dof, n_dof))
+    mat += np.diag(2 * np.sqrt(n_dof) * (1.0 + rng.random(n_dof)))
+
+    # get the rhs
+    rhs = rng.standard_normal(n_dof) + 1j * rng.standard_normal(n_dof)
+
+    # get the operators
+    op_sys = sla.LinearOperator((n_dof, n_dof), matvec=lambda x: mat @ x, dtype=np.complex128)
+    op_pcd = sla.LinearOperator((n_dof, n_dof), matvec=lambda x: x / np.diag(mat), dtype=np.complex128)
+
+    return mat, rhs, op_sys, op_pcd
+
+
+def _get_multiply(name, idx_out, idx_in, mat, vec, split, box_options, flip):
+    """
+    Compute a matrix-vector multiplication with the FFT circulant tensors.
+    """
+
+    data = multiply_fft.get_prepare(name, idx_out, idx_in, mat, [], split, box_options, FFT_OPTIONS)
+    res = multiply_fft.get_multiply(data, vec, split, FFT_OPTIONS, flip)
+
+    return res
+
+
+class TestMatrix(unittest.TestCase):
+    """
+    Test the matrix computations.
+    """
+
+    def test_box_decomposition(self):
+        """
+        Compare the decomposed and the single box multiplications for a sparse geometry.
+        """
+
+        # get the random generator
+        rng = np.random.default_rng(1234)
+
+        # get the sparse geometry
+        n = (12, 10, 24)
+        nv = np.prod(n)
+        idx_vox = _get_sparse_geometry(n)
+
+        # check that the decomposition is used
+        (box_list, box_pair) = multiply_box.get_box_decomposition(n, idx_vox, idx_vox, BOX_DECOMPOSE)
+        self.assertGreater(len(box_list), 1, "invalid decomposition")
+
+        # check the different operators (name, tensor dimension, input dimension, output dimension)
+        for name, nd_mat, nd_in, nd_out in [
+            ("potential", 1, 1, 1),
+            ("inductance", 1, 3, 3),
+            ("coupling", 3, 3, 3),
+            ("gradient", 3, 1, 3),
+        ]:
+            # get the indices and the tensor
+            idx_in = np.concatenate([idx_vox + i * nv for i in range(nd_in)])
+            idx_out = np.concatenate([idx_vox + i * nv for i in range(nd_out)])
+            mat = rng.standard_normal((*n, nd_mat))
+
+            # get the input vectors
+            vec_in = rng.standard_normal(len(idx_in))
+            vec_out = rng.standard_normal(len(idx_out))
+
+            for split in [False, True]:
+                # compare the operator
+                res_single = _get_multiply(name, idx_out, idx_in, mat, vec_in, split, BOX_SINGLE, False)
+                res_decompose = _get_multiply(name, idx_out, idx_in, mat, vec_in, split, BOX_DECOMPOSE, False)
+                self.assertTrue(np.allclose(res_single, res_decompose, rtol=1e-10, atol=1e-10), "invalid operator")
+
+                # compare the flipped operator
+                if name == "coupling":
+                    res_single = _get_multiply(name, idx_out, idx_in, mat, vec_out, split, BOX_SINGLE, True)
+                    res_decompose = _get_multiply(name, idx_out, idx_in, mat, vec_out, split, BOX_DECOMPOSE, True)
+                    self.assertTrue(np.allclose(res_single, res_decompose, rtol=1e-10, atol=1e-10), "invalid operator")
+
+    def test_fgmres(self):
+        """
+        Compare the FGMRES solver with the GMRES solver (SciPy) for a non-Hermitian system.
+        """
+
+        # get the equation system
+        n_dof = 60
+        (mat, rhs, op_sys, op_pcd) = _get_system(n_dof)
+        sol_init = np.zeros(n_dof, dtype=np.complex128)
+        sol_ref = np.linalg.solve(mat, rhs)
+
+        # solve with GMRES (SciPy)
+        iter_options = {**ITER_OPTIONS, "solver": "gmres"}
+        (status_gmres, sol_gmres) = matrix_iterative.get_solve(sol_init, op_sys, op_pcd, rhs, None, iter_options)
+
+        # solve with FGMRES (with the callback and with a restart due to the memory budget)
+        for size_max in [None, 0.005]:
+            sol_callback = []
+            res_callback = []
+
+            def fct_callback(sol_tmp, res_tmp):
+                sol_callback.append(sol_tmp)
+                res_callback.append(res_tmp)
+
+            iter_options = {**ITER_OPTIONS, "solver": "fgmres", "size_max": size_max}
+            (status_fgmres, sol_fgmres) = matrix_iterative.get_solve(sol_init, op_sys, op_pcd, rhs, fct_callback, iter_options)
+
+            # check the solutions
+            self.assertTrue(status_gmres, "invalid convergence")
+            self.assertTrue(status_fgmres, "invalid convergence")
+            self.assertTrue(np.allclose(sol_gmres, sol_ref, rtol=1e-8, atol=1e-8), "invalid solution")
+            self.assertTrue(np.allclose(sol_fgmres, sol_ref, rtol=1e-8, atol=1e-8), "invalid solution")
+            self.assertTrue(np.allclose(sol_callback[-1], sol_fgmres), "invalid callback")
+
+            # check the residuum estimates provided to the callback (Givens rotations)
+            for sol_tmp, res_tmp in zip(sol_callback, res_callback):
+                res = np.linalg.norm(rhs - mat @ sol_tmp)
+                self.assertTrue(np.isclose(res_tmp, res, rtol=1e-6, atol=1e-12), "invalid residuum estimate")
+
+            # check the residuum
+            res = np.linalg.norm(rhs - mat @ sol_fgmres)
+            self.assertLessEqual(res, ITER_OPTIONS["rel_tol"] * np.linalg.norm(rhs) * 1.01, "invalid residuum")
@@ -0,0 +1,120 @@
+"""
+Test the examples with custom numerical options.
+The custom options are merged into the default tolerance file.
+"""
+
+__author__ = "Thomas Guillod"
+__copyright__ = "Thomas Guillod - Dartmouth College"
+__license__ = "Mozilla Public License Version 2.0"
+
+import os
+import tempfile
+from tests.code import test_pypeec
+from tests.code import test_workflow
+from tests.code import test_generate
+from tests.code import test_read_write
+
+
+# duplicate of the test class
+class TestOption(test_workflow.TestWorkflow):
+    """
+    Test class insuring the test discovery (with the checkpoint and output tests).
+    """
+
+    def test_output(self):
+        """
+        Check that the unselected field variables are not stored (the global quantities are kept).
+        """
+
+        # select the field variables and keep the solution vector
+        tolerance = {"output_options": {"field_select": ["V_c", "J_c"], "keep_solution": True}}
+
+        # run the mesher and the solver (the plotter requires the unselected variables)
+        (data_voxel, data_solution) = test_pypeec.run_workflow("examples_voxel/core", False, tolerance, plot=False)
+
+        # check the stored variables
+        for data_sweep in data_solution["data"]["data_sweep"].values():
+            n_dof_total = data_sweep["solver_status"]["n_dof_total"]
+            self.assertEqual(set(data_sweep["field_values"]), {"V_c", "J_c"}, "invalid field selection")
+            self.assertEqual(len(data_sweep["solution_vector"]), n_dof_total, "invalid solution vector")
+
+        # check the global quantities (same as the complete example)
+        (mesher, solver) = test_generate.generate_results(data_voxel, data_solution)
+        (mesher_ref, solver_ref) = test_read_write.read_results("examples_voxel/core")
+        self._check_results(mesher, solver, mesher_ref, solver_ref, 1e-4)
+
+    def test_checkpoint(self):
+        """
+        Write the checkpoints and restart the solver from them (temporary folder).
+        """
+
+        with tempfile.TemporaryDirectory() as folder:
+            # checkpoint options
+            tolerance = {"checkpoint_options": {"checkpoint": True, "folder": folder, "n_iter": 1}}
+
+            # write the checkpoints
+            self.run_test("options/checkpoint_init", "examples_voxel/core", False, tolerance)
+
+            # get the checkpoints of the completed sweeps
+            filename_list = sorted(os.listdir(folder))
+            time_list = [os.stat(os.path.join(folder, filename)).st_mtime_ns for filename in filename_list]
+            self.assertEqual(filename_list, ["sim_ac_sweep.mpk", "sim_dc_sweep.mpk"], "invalid checkpoint")
+
+            # restart the solver (the completed sweeps are loaded and not written again)
+            self.run_test("options/checkpoint_restart", "examples_voxel/core", False, tolerance)
+            time_restart = [os.stat(os.path.join(folder, filename)).st_mtime_ns for filename in filename_list]
+            self.assertEqual(time_list, time_restart, "invalid restart")
+
+
+# name of the tests, name of the examples, and custom numerical options
+option_list = [
+    (
+        "options/multilevel",
+        "examples_shape/busbar",
+        {"multilevel_options": {"multilevel": True, "coarse_factor": 2}},
+    ),
+    (
+        "options/sparse_bypass",
+        "examples_shape/busbar",
+        {"solver_options": {"sparse_bypass": True}},
+    ),
+    (
+        "options/segregated",
+        "examples_png/shield",
+        {"solver_options": {"coupling": "segregated", "segregated_options": {"anderson_depth": 3, "adapt_factor": 0.1}}},
+    ),
+    (
+        "options/refinement",
+        "examples_png/shield",
+        {"solver_options": {"coupling": "refinement", "refinement_options": {"anderson_depth": 10, "relax": 1.0}}},
+    ),
+    (
+        "options/fgmres",
+        "examples_png/shield",
+        {"solver_options": {"direct_options": {"solver": "fgmres", "size_max": 2.5}}},
+    ),
+    (
+        "options/extrapolation",
+        "examples_shape/busbar",
+        {"extrapolation_options": {"order": 2}},
+    ),
+    (
+        "options/tree",
+        "examples_png/shield",
+        {"field_options": {"method": "tree", "tree_options": {"theta": 0.3, "n_leaf": 16}}},
+    ),
+    (
+        "options/grid",
+        "examples_png/shield",
+        {"field_options": {"grid": True}},
+    ),
+    (
+        "options/box",
+        "examples_png/shield",
+        {"dense_options": {"box_options": {"decompose": True, "fill_min": 0.5, "volume_min": 64}}},
+    ),
+]
+
+# add the tests
+for tag, name, tolerance in option_list:
+    test_workflow.set_test(TestOption, tag, name, False, tolerance)
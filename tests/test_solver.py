@@ -0,0 +1,532 @@
+"""
+Test the solver components (preconditioner, operators, and solver options).
+"""
+
+__author__ = "Thomas Guillod"
+__copyright__ = "Thomas Guillod - Dartmouth College"
+__license__ = "Mozilla Public License Version 2.0"
+
+import copy
+import time
+import tempfile
+import threading
+import unittest
+import unittest.mock
+import numpy as np
+import scipy.sparse as sps
+from pypeec.lib_matrix import matrix_factorization
+from pypeec.utils import readonly
+from pypeec.lib_solver import equation_solver
+from pypeec.lib_solver import equation_system
+from pypeec.lib_solver import monitor_resource
+from pypeec.lib_solver import sweep_checkpoint
+from pypeec.lib_solver import problem_geometry
+from pypeec.lib_solver import voxel_geometry
+from pypeec.lib_solver import system_tensor
+from pypeec.lib_solver import system_matrix
+from pypeec.lib_solver import system_coarse
+
+# options for the dense matrix multiplication
+DENSE_OPTIONS = {
+    "method": "fft",
+    "split": False,
+    "box_options": {"decompose": False, "fill_min": 0.5, "volume_min": 1},
+    "fft_options": {
+        "library": "NumPy",
+        "scipy_worker": 1,
+        "fftw_thread": 1,
+        "fftw_cache": False,
+        "fftw_timeout": 1.0,
+        "fftw_byte_align": 8,
+    },
+}
+
+# options for the iterative solvers
+ITER_OPTIONS = {
+    "solver": "gmres",
+    "rel_tol": 1e-10,
+    "abs_tol": 1e-14,
+    "n_inner": 20,
+    "n_outer": 20,
+    "n_callback": 1,
+    "size_max": None,
+}
+
+# options for the equation system solver
+SOLVER_OPTIONS = {
+    "coupling": "direct",
+    "sparse_bypass": False,
+    "concurrent": False,
+    "status_options": {"ignore_status": False, "ignore_res": False, "rel_tol": 1e-8, "abs_tol": 1e-14},
+    "power_options": {"stop": False, "n_min": 4, "n_cmp": 3, "rel_tol": 1e-4, "abs_tol": 1e-10},
+    "direct_options": ITER_OPTIONS,
+    "inner_options": {"inner": False, "iter_options": {**ITER_OPTIONS, "rel_tol": 1e-1, "n_inner": 5, "n_outer": 1}},
+    "segregated_options": {
+        "rel_tol": 1e-10,
+        "abs_tol": 1e-14,
+        "relax_electric": 1.0,
+        "relax_magnetic": 1.0,
+        "anderson_depth": 0,
+        "adapt_factor": 0.0,
+        "n_min": 2,
+        "n_max": 50,
+        "iter_electric_options": ITER_OPTIONS,
+        "iter_magnetic_options": ITER_OPTIONS,
+    },
+    "refinement_options": {"rel_tol": 1e-10, "abs_tol": 1e-14, "relax": 1.0, "anderson_depth": 10, "n_min": 1, "n_max": 100},
+}
+
+# options for the sparse factorization
+FACTORIZATION_OPTIONS = {
+    "library": "SuperLU",
+    "schur": False,
+    "concurrent": False,
+    "pyamg_options": None,
+    "pardiso_options": None,
+    "cache_options": {"cache": False, "n_max": 8, "size_max": 1024.0},
+}
+
+
+def _get_solver_options(**kwargs):
+    """
+    Get the equation system solver options (with custom values).
+    """
+
+    solver_options = copy.deepcopy(SOLVER_OPTIONS)
+    for key, value in kwargs.items():
+        if isinstance(value, dict):
+            solver_options[key].update(value)
+        else:
+            solver_options[key] = value
+
+    return solver_options
+
+
+def _get_system():
+    """
+    Get a coupled electric-magnetic equation system (random non-Hermitian matrices).
+    The preconditioner is the inverse of the diagonal blocks without the off-diagonal terms.
+    """
+
+    # get the random generator
+    rng = np.random.default_rng(1234)
+
+    # get the matrices
+    (n_dof_c, n_dof_m) = (30, 20)
+    mat_c = np.diag(rng.uniform(1.0, 2.0, n_dof_c)) + 0.05 * rng.standard_normal((n_dof_c, n_dof_c)) + 0.05j * rng.standard_normal((n_dof_c, n_dof_c))
+    mat_m = np.diag(rng.uniform(1.0, 2.0, n_dof_m)) + 0.05 * rng.standard_normal((n_dof_m, n_dof_m)) + 0.05j * rng.standard_normal((n_dof_m, n_dof_m))
+    cpl_c = 0.05 * rng.standard_normal((n_dof_c, n_dof_m))
+    cpl_m = 0.05 * rng.standard_normal((n_dof_m, n_dof_c))
+    pcd_c = np.linalg.inv(np.diag(np.diag(mat_c)))
+    pcd_m = np.linalg.inv(np.diag(np.diag(mat_m)))
+
+    # get the right-hand side
+    rhs_c = rng.standard_normal(n_dof_c) + 1j * rng.standard_normal(n_dof_c)
+    rhs_m = rng.standard_normal(n_dof_m) + 1j * rng.standard_normal(n_dof_m)
+
+    # get the operators
+    fct_sys_cm = (lambda x: mat_c @ x, lambda x: mat_m @ x)
+    fct_cpl_cm = (lambda x: cpl_c @ x, lambda x: cpl_m @ x)
+    fct_pcd_cm = (lambda x: pcd_c @ x, lambda x: pcd_m @ x)
+    rhs_cm = (rhs_c, rhs_m)
+
+    # get the reference solution
+    mat = np.block([[mat_c, cpl_c], [cpl_m, mat_m]])
+    sol_ref = np.linalg.solve(mat, np.concatenate((rhs_c, rhs_m)))
+
+    return fct_sys_cm, fct_cpl_cm, fct_pcd_cm, rhs_cm, sol_ref
+
+
+def _get_sparse(n_dof_11, n_dof_22, seed):
+    """
+    Get a sparse matrix split into blocks (format of the factorization).
+    """
+
+    # get the random generator
+    rng = np.random.default_rng(seed)
+
+    # get the blocks
+    mat_11 = sps.diags(rng.uniform(1.0, 2.0, n_dof_11), format="csc")
+    mat_22 = sps.diags(rng.uniform(1.0, 2.0, n_dof_22), format="csc")
+    mat_12 = sps.random(n_dof_11, n_dof_22, density=0.2, format="csc", random_state=seed)
+    mat_21 = sps.random(n_dof_22, n_dof_11, density=0.2, format="csc", random_state=seed + 1)
+
+    # assemble the blocks
+    mat = {
+        "mat_11": sps.csc_matrix(mat_11, dtype=np.complex128),
+        "mat_22": sps.csc_matrix(mat_22, dtype=np.complex128),
+        "mat_12": sps.csc_matrix(mat_12, dtype=np.complex128),
+        "mat_21": sps.csc_matrix(mat_21, dtype=np.complex128),
+    }
+
+    return mat
+
+
+def _get_solve(solver_options, checkpoint=None, sol_init=None, sys_exact=False):
+    """
+    Solve the coupled equation system with the equation system solver.
+    The complex power is replaced by the projection of the solution on the right-hand side.
+    """
+
+    # get the equation system
+    (fct_sys_cm, fct_cpl_cm, fct_pcd_cm, rhs_cm, sol_ref) = _get_system()
+    rhs = np.concatenate(rhs_cm)
+
+    # function describing the convergence metric
+    def fct_conv(sol):
+        return np.vdot(rhs, sol)
+
+    # solve the equation system
+    (sol, status, solver_convergence, solver_status) = equation_solver.get_solver(
+        sol_init,
+        fct_cpl_cm,
+        fct_sys_cm,
+        fct_pcd_cm,
+        None,
+        rhs_cm,
+        sys_exact,
+        fct_conv,
+        checkpoint,
+        solver_options,
+    )
+
+    return sol, sol_ref, status, solver_convergence, solver_status
+
+
+def _get_geometry():
+    """
+    Get a small voxel structure (slab with a hole) and the face data.
+    """
+
+    # get the voxel structure
+    n = (5, 4, 3)
+    d = (1.0e-3, 2.0e-3, 1.5e-3)
+    c = (0.0, 0.0, 0.0)
+
+    # get the occupied voxels
+    occupancy = np.ones(n, dtype=bool)
+    occupancy[2, 1:3, 1] = False
+    idx_v = np.flatnonzero(occupancy.flatten(order="F"))
+
+    # get the incidence matrix and the face data (without symmetry planes)
+    (sym_axis, sym_c, _) = problem_geometry.get_symmetry(n, d, c, {})
+    (A_net, idx_f) = voxel_geometry.get_incidence_matrix(n, idx_v, sym_axis, sym_c)
+    dir_f = voxel_geometry.get_face_direction(n, idx_f, A_net)
+
+    return n, d, idx_v, idx_f, A_net, dir_f, sym_axis, sym_c
+
+
+def _get_operator_matrix(op, n_dof):
+    """
+    Get the dense matrix of a linear operator (multiplication with the unit vectors).
+    """
+
+    mat = np.zeros((n_dof, n_dof), dtype=np.complex128)
+    for i in range(n_dof):
+        vec = np.zeros(n_dof, dtype=np.complex128)
+        vec[i] = 1.0
+        mat[:, i] = op(vec)
+
+    return mat
+
+
+class TestSolver(unittest.TestCase):
+    """
+    Test the solver components.
+    """
+
+    def test_near_field(self):
+        """
+        Compare the near-field sparse inductance matrix with the FFT inductance operator.
+        """
+
+        # get the geometry and the Green functions
+        (n, d, _, idx_f, _, dir_f, sym_axis, sym_c) = _get_geometry()
+        G_self = system_tensor.get_green_self(d)
+        G_mutual = system_tensor.get_green_tensor(n, d, 20.0)
+        G_image = system_tensor.get_green_image(n, d, 20.0, sym_axis)
+
+        # get the self-inductances and the complete inductance matrix (FFT operator)
+        (L_self, L_op) = system_matrix.get_inductance_matrix(n, d, idx_f, dir_f, G_self, G_mutual, G_image, sym_c, 0.0, DENSE_OPTIONS)
+        L_full = _get_operator_matrix(L_op, len(idx_f))
+
+        # check the self-inductances (diagonal matrix)
+        self.assertEqual(L_self.nnz, len(idx_f), "invalid sparsity")
+        self.assertTrue(np.allclose(L_self.diagonal(), np.diag(L_full), rtol=1e-10, atol=0.0), "invalid self-inductance")
+
+        # check the near-field inductances (the non-zero entries are matching the complete matrix)
+        (L_near, _) = system_matrix.get_inductance_matrix(n, d, idx_f, dir_f, G_self, G_mutual, G_image, sym_c, 1.5, DENSE_OPTIONS)
+        (idx_row, idx_col) = L_near.nonzero()
+        self.assertGreater(L_near.nnz, L_self.nnz, "invalid sparsity")
+        self.assertTrue(np.allclose(L_near.toarray()[idx_row, idx_col], L_full[idx_row, idx_col], rtol=1e-10, atol=0.0), "invalid near-field")
+
+        # check the complete inductance matrix (large near-field radius)
+        (L_all, _) = system_matrix.get_inductance_matrix(n, d, idx_f, dir_f, G_self, G_mutual, G_image, sym_c, 10.0, DENSE_OPTIONS)
+        self.assertTrue(np.allclose(L_all.toarray(), L_full, rtol=1e-10, atol=0.0), "invalid near-field")
+
+    def test_coarse_size(self):
+        """
+        Check that the size of the coarse system is bounded (multilevel preconditioner).
+        """
+
+        # get the geometry and the Green functions
+        (n, d, idx_v, idx_f, A_net, _, _, _) = _get_geometry()
+        G_mutual = system_tensor.get_green_tensor(n, d, 20.0)
+
+        # get the coarse system without bound
+        multilevel_options = {"multilevel": True, "coarse_factor": 2, "n_max": 5000}
+        coarse_data = system_coarse.get_coarse_system(n, d, idx_v, idx_f, A_net, G_mutual, multilevel_options)
+        (n_v_c, n_f_c) = coarse_data["A_net_c"].shape
+        n_c = n_v_c + n_f_c
+
+        # check the dense inductance matrix
+        self.assertIsInstance(coarse_data["L_c"], np.ndarray, "invalid matrix type")
+        self.assertEqual(coarse_data["L_c"].shape, (n_f_c, n_f_c), "invalid matrix size")
+
+        # get the coarse system with a bound (the coarsening factor is increased)
+        multilevel_options = {"multilevel": True, "coarse_factor": 2, "n_max": n_c - 1}
+        coarse_data = system_coarse.get_coarse_system(n, d, idx_v, idx_f, A_net, G_mutual, multilevel_options)
+        (n_v_c, n_f_c) = coarse_data["A_net_c"].shape
+        self.assertLessEqual(n_v_c + n_f_c, n_c - 1, "invalid coarse size")
+
+    def test_inner(self):
+        """
+        Check the inner iterative preconditioner (flexible outer solver required).
+        """
+
+        # solve with the inner preconditioner and the FGMRES solver
+        solver_options = _get_solver_options(
+            direct_options={"solver": "fgmres"},
+            inner_options={"inner": True},
+        )
+        (sol, sol_ref, status, _, solver_status) = _get_solve(solver_options)
+        self.assertTrue(status, "invalid convergence")
+        self.assertTrue(np.allclose(sol, sol_ref, rtol=1e-8, atol=1e-8), "invalid solution")
+
+        # solve without the inner preconditioner (reference number of evaluations)
+        solver_options = _get_solver_options(direct_options={"solver": "fgmres"})
+        (_, _, _, _, solver_status_ref) = _get_solve(solver_options)
+        self.assertLess(solver_status["n_iter"], solver_status_ref["n_iter"], "invalid inner preconditioner")
+
+        # the inner preconditioner is rejected with a non-flexible solver
+        solver_options = _get_solver_options(
+            direct_options={"solver": "gmres"},
+            inner_options={"inner": True},
+        )
+        with self.assertRaises(ValueError):
+            _get_solve(solver_options)
+
+    def test_sparse_bypass(self):
+        """
+        Check that the iterative solver is bypassed for exact preconditioners (if enabled).
+        """
+
+        # with the bypass, a single preconditioner evaluation is done
+        solver_options = _get_solver_options(sparse_bypass=True)
+        (_, _, _, _, solver_status) = _get_solve(solver_options, sys_exact=True)
+        self.assertEqual(solver_status["n_pcd_eval"], 1, "invalid bypass")
+        self.assertEqual(solver_status["n_sys_eval"], 0, "invalid bypass")
+
+        # without the bypass, the iterative solver is used
+        solver_options = _get_solver_options(sparse_bypass=False)
+        (sol, sol_ref, status, _, solver_status) = _get_solve(solver_options, sys_exact=True)
+        self.assertGreater(solver_status["n_sys_eval"], 0, "invalid bypass")
+        self.assertTrue(status, "invalid convergence")
+        self.assertTrue(np.allclose(sol, sol_ref, rtol=1e-8, atol=1e-8), "invalid solution")
+
+    def test_concurrent(self):
+        """
+        Check the concurrent evaluation of the electric and magnetic branches (thread pool).
+        """
+
+        # solve sequentially and concurrently
+        for coupling in ["direct", "refinement"]:
+            solver_options = _get_solver_options(coupling=coupling, concurrent=False)
+            (sol_seq, sol_ref, status_seq, _, _) = _get_solve(solver_options)
+            solver_options = _get_solver_options(coupling=coupling, concurrent=True)
+            (sol_cur, _, status_cur, _, _) = _get_solve(solver_options)
+
+            # check the solutions
+            self.assertTrue(status_seq, "invalid convergence")
+            self.assertTrue(status_cur, "invalid convergence")
+            self.assertTrue(np.allclose(sol_seq, sol_ref, rtol=1e-8, atol=1e-8), "invalid solution")
+            self.assertTrue(np.allclose(sol_cur, sol_seq, rtol=1e-10, atol=1e-10), "invalid solution")
+
+        # function interrupting the solver (after the first iteration)
+        def fct_save(_):
+            raise RuntimeError("interrupted solver")
+
+        # the thread pool is released if the solver raises an exception
+        n_thread = threading.active_count()
+        solver_options = _get_solver_options(concurrent=True)
+        with self.assertRaises(RuntimeError):
+            _get_solve(solver_options, checkpoint={"fct_save": fct_save, "restart": None})
+        self.assertEqual(threading.active_count(), n_thread, "invalid thread pool release")
+
+    def test_factorization(self):
+        """
+        Check the concurrent factorization of the electric and magnetic preconditioners.
+        """
+
+        # get the electric and magnetic matrices
+        pcd_mat_cm = (_get_sparse(20, 10, 1), _get_sparse(15, 5, 3))
+        rhs_c = np.ones(30, dtype=np.complex128)
+        rhs_m = np.ones(20, dtype=np.complex128)
+
+        # factorize sequentially and concurrently
+        factorization_options = {**FACTORIZATION_OPTIONS, "concurrent": False}
+        ((fct_seq_c, fct_seq_m), _) = equation_solver.get_factorization(pcd_mat_cm, factorization_options)
+        factorization_options = {**FACTORIZATION_OPTIONS, "concurrent": True}
+        ((fct_cur_c, fct_cur_m), _) = equation_solver.get_factorization(pcd_mat_cm, factorization_options)
+
+        # check the solutions
+        self.assertTrue(np.allclose(fct_seq_c(rhs_c), fct_cur_c(rhs_c), rtol=1e-12, atol=0.0), "invalid factorization")
+        self.assertTrue(np.allclose(fct_seq_m(rhs_m), fct_cur_m(rhs_m), rtol=1e-12, atol=0.0), "invalid factorization")
+
+        # function recording the threads of the factorizations
+        thread_list = []
+
+        def fct_factorize(mat, factorization_options):
+            thread_list.append(threading.get_ident())
+            return None, None, None
+
+        # the PARDISO factorizations are computed sequentially (by the calling thread)
+        factorization_options = {**FACTORIZATION_OPTIONS, "concurrent": True, "library": "PARDISO"}
+        with unittest.mock.patch.object(matrix_factorization, "get_factorize", fct_factorize):
+            equation_solver.get_factorization(pcd_mat_cm, factorization_options)
+        self.assertEqual(thread_list, [threading.get_ident()] * 2, "invalid sequential factorization")
+
+    def test_iter_restart(self):
+        """
+        Interrupt the solver after some iterations and restart from the iteration checkpoint.
+        """
+
+        # solve without interruption (reference)
+        solver_options = _get_solver_options(direct_options={"n_inner": 5})
+        (_, _, _, _, solver_status_ref) = _get_solve(solver_options)
+
+        with tempfile.TemporaryDirectory() as folder:
+            # get the checkpoint
+            checkpoint_options = {"checkpoint": True, "folder": folder, "n_iter": 1}
+            key = sweep_checkpoint.get_key("sim", {"tag": "data"}, {"freq": 0.0})
+            checkpoint = sweep_checkpoint.get_iter_checkpoint("sim", key, checkpoint_options)
+            self.assertIsNone(checkpoint["restart"], "invalid restart")
+
+            # function interrupting the solver after some iterations
+            n_iter_stop = 3
+            fct_save = checkpoint["fct_save"]
+
+            def fct_save_stop(state):
+                fct_save(state)
+                if state["n_iter"] == n_iter_stop:
+                    raise KeyboardInterrupt("interrupted solver")
+
+            # run the solver until the interruption
+            with self.assertRaises(KeyboardInterrupt):
+                _get_solve(solver_options, checkpoint={"fct_save": fct_save_stop, "restart": None})
+
+            # restart the solver from the iteration checkpoint
+            checkpoint = sweep_checkpoint.get_iter_checkpoint("sim", key, checkpoint_options)
+            self.assertEqual(checkpoint["restart"]["n_iter"], n_iter_stop, "invalid restart")
+            (sol, sol_ref, status, solver_convergence, solver_status) = _get_solve(solver_options, checkpoint=checkpoint)
+
+        # check the solution and the iteration history
+        self.assertTrue(status, "invalid convergence")
+        self.assertTrue(np.allclose(sol, sol_ref, rtol=1e-8, atol=1e-8), "invalid solution")
+        self.assertGreater(solver_status["n_iter"], n_iter_stop, "invalid iteration count")
+        self.assertEqual(len(solver_convergence["power_vec"]), solver_status["n_iter"], "invalid convergence history")
+        self.assertLess(solver_status["n_sys_eval"], solver_status_ref["n_sys_eval"], "invalid restart")
+
+    def test_monitor(self):
+        """
+        Check the resources recorded for a solver stage (time and memory).
+        """
+
+        # record a stage
+        performance = {}
+        with monitor_resource.get_stage(performance, "stage"):
+            time.sleep(0.05)
+
+        # check the metrics
+        metrics = performance["stage"]
+        self.assertEqual(set(metrics), {"wall_time", "cpu_time", "memory_start", "memory_end", "memory_peak"}, "invalid metrics")
+        self.assertGreaterEqual(metrics["wall_time"], 0.05, "invalid wall time")
+        self.assertGreaterEqual(metrics["cpu_time"], 0.0, "invalid CPU time")
+        self.assertTrue(np.isfinite(metrics["memory_start"]), "invalid memory")
+        self.assertGreaterEqual(metrics["memory_peak"], max(metrics["memory_start"], metrics["memory_end"]), "invalid peak memory")
+
+        # without the proc filesystem (non-Linux systems), the memory is not available
+        performance = {}
+        with unittest.mock.patch.object(monitor_resource, "open", create=True, side_effect=OSError):
+            with monitor_resource.get_stage(performance, "stage"):
+                pass
+
+        # check the metrics
+        metrics = performance["stage"]
+        self.assertTrue(np.isfinite(metrics["wall_time"]), "invalid wall time")
+        self.assertTrue(np.isnan(metrics["memory_start"]), "invalid memory")
+        self.assertTrue(np.isnan(metrics["memory_end"]), "invalid memory")
+        self.assertTrue(np.isnan(metrics["memory_peak"]), "invalid memory")
+
+    def test_operator_cache(self):
+        """
+        Check that repeated products with the same input vector are not recomputed.
+        """
+
+        # operator counting the evaluations
+        n_eval = [0]
+
+        def op(vec):
+            n_eval[0] += 1
+            return 2.0 * vec
+
+        # get the cached operator
+        op_cache = equation_system.get_operator_cache(op)
+        vec = np.arange(5, dtype=np.complex128)
+
+        # the repeated call (same values) skips the operator and returns a read-only product
+        out_1 = op_cache(vec)
+        out_2 = op_cache(np.copy(vec))
+        self.assertEqual(n_eval[0], 1, "invalid cache")
+        self.assertTrue(np.array_equal(out_2, 2.0 * vec), "invalid product")
+        with self.assertRaises(ValueError):
+            out_1[0] = 0.0
+
+        # a read-only input vector is identified without comparing the values
+        vec_ro = np.ones(5, dtype=np.complex128)
+        vec_ro.flags.writeable = False
+        op_cache(vec_ro)
+        op_cache(vec_ro)
+        self.assertEqual(n_eval[0], 2, "invalid cache")
+
+        # a modified input vector is recomputed
+        vec[0] = 10.0
+        out_3 = op_cache(vec)
+        self.assertEqual(n_eval[0], 3, "invalid cache")
+        self.assertTrue(np.array_equal(out_3, 2.0 * vec), "invalid product")
+
+    def test_read_only(self):
+        """
+        Check the protection of the input data (read-only views without copies).
+        """
+
+        # get the input data
+        vec = np.arange(5, dtype=np.float64)
+        data = {"vec": vec, "list": [vec, 1.0], "tuple": (vec, "name")}
+
+        # get the read-only data
+        data_ro = readonly.get_read_only(data)
+
+        # writing into the returned arrays raises an exception
+        with self.assertRaises(ValueError):
+            data_ro["vec"][0] = 10.0
+        with self.assertRaises(ValueError):
+            data_ro["list"][0][0] = 10.0
+        with self.assertRaises(ValueError):
+            data_ro["tuple"][0][0] = 10.0
+
+        # the arrays are not copied and the data of the caller are not modified
+        data_ro["list"].append(2.0)
+        self.assertTrue(np.shares_memory(data_ro["vec"], vec), "invalid view")
+        self.assertTrue(vec.flags.writeable, "invalid caller data")
+        self.assertEqual(len(data["list"]), 2, "invalid caller data")
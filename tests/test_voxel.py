@@ -26,6 +26,7 @@ name_list = [
     "examples_voxel/anisotropic",
     "examples_voxel/distributed",
     "examples_voxel/logo",
+    "examples_voxel/symmetry",
 ]
 
 # add the tests